@@ -0,0 +1,38 @@
+"""Tâches de fond des comptes : notifications Web Push (VAPID)."""
+import json
+import logging
+from django.conf import settings
+from apps.jobs import queue
+from .models import PushSubscription
+
+logger = logging.getLogger(__name__)
+
+
+@queue.handler('push.send')
+def send_push(user_id, title, body, url='/dashboard/'):
+    """Notifie tous les appareils abonnés de l'utilisateur ; les abonnements expirés sont supprimés."""
+    if not settings.VAPID_PRIVATE_KEY:
+        return
+    try:
+        from pywebpush import webpush, WebPushException
+    except ImportError:
+        return
+    data   = json.dumps({'title': title, 'body': body, 'url': url})
+    claims = {'sub': f'mailto:{settings.VAPID_CLAIMS_EMAIL}'}
+    sent, errors = 0, []
+    for sub in PushSubscription.objects.filter(user_id=user_id):
+        try:
+            webpush(subscription_info={'endpoint': sub.endpoint, 'keys': {'p256dh': sub.p256dh, 'auth': sub.auth}},
+                    data=data, vapid_private_key=settings.VAPID_PRIVATE_KEY, vapid_claims=dict(claims))
+            sent += 1
+        except WebPushException as exc:
+            status = getattr(exc.response, 'status_code', None)
+            if status in (404, 410):
+                sub.delete()
+            else:
+                errors.append(exc)
+    # Nouvel essai seulement si aucun appareil n'a été joint (pas de notification en double)
+    if errors and not sent:
+        raise errors[0]
+    for exc in errors:
+        logger.warning('Push utilisateur %s : %s', user_id, exc)
@@ -0,0 +1,54 @@
+"""
+Cache des réponses IA versionné par les données.
+
+Une réponse est rangée avec l'empreinte (SHA-256) du contexte exact envoyé au modèle : profil, stats
+du mois, score, fuites — plus le modèle et la fonctionnalité. Tant que l'empreinte ne change pas,
+aucune nouvelle opération ni modification du profil, la réponse est resservie sans appel à l'API :
+  • fraîche pendant ``max_age`` secondes ;
+  • puis, pendant ``stale`` secondes, encore servie mais recalculée en arrière-plan
+    (stale-while-revalidate, par le worker de tâches).
+Durées par fonctionnalité : settings.AI_CACHE. Les réponses sont rangées en base (AIAnswer, une ligne
+par utilisateur et fonctionnalité) et non dans le cache Django, propre à chaque processus sans Redis :
+ce que calcule le worker de tâches doit être lu par les processus web.
+"""
+import hashlib
+from django.conf import settings
+from django.utils import timezone
+from .models import AIAnswer
+
+FRESH = 'fresh'
+STALE = 'stale'
+MISS  = 'miss'
+
+
+def digest(feature, context):
+    return hashlib.sha256(f'{settings.AI_MODEL}\0{feature}\0{context}'.encode()).hexdigest()
+
+
+def _policy(feature):
+    policy = settings.AI_CACHE.get(feature, {})
+    return policy.get('max_age', 0), policy.get('stale', 0)
+
+
+def get(feature, user, context):
+    """(FRESH | STALE | MISS, réponse ou None) pour le contexte ``context`` de ``user``."""
+    entry = (AIAnswer.objects.filter(user=user, feature=feature)
+             .values_list('digest', 'value', 'created_at').first())
+    if not entry or entry[0] != digest(feature, context):
+        return MISS, None
+    max_age, stale = _policy(feature)
+    age = (timezone.now() - entry[2]).total_seconds()
+    if age <= max_age:
+        return FRESH, entry[1]
+    if age <= max_age + stale:
+        return STALE, entry[1]
+    return MISS, None
+
+
+def put(feature, user, context, value):
+    max_age, stale = _policy(feature)
+    if max_age + stale <= 0:
+        return
+    AIAnswer.objects.update_or_create(user=user, feature=feature, defaults={
+        'digest': digest(feature, context), 'value': value, 'created_at': timezone.now(),
+    })
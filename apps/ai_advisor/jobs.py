@@ -0,0 +1,29 @@
+"""Tâches de fond du conseiller IA (exécutées par run_worker, voir apps/jobs)."""
+import datetime
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from apps.jobs import queue
+from apps.jobs.models import Job
+from .models import AIReport
+from .services import weekly_report, predictions
+
+
+@queue.handler('ai.weekly_report')
+def generate_weekly_report(user_id, week_start):
+    user = get_user_model().objects.filter(pk=user_id).first()
+    if user is None:
+        return
+    # Sans repli : en cas d'échec la tâche est retentée, et aucun texte de repli n'occupe la semaine
+    AIReport.objects.update_or_create(user=user, week_start=datetime.date.fromisoformat(week_start),
+                                      defaults={'content': weekly_report(user, fallback=False)})
+    if user.push_subscriptions.exists():
+        queue.enqueue('push.send', {'user_id': user.pk, 'title': 'Rapport de la semaine',
+                                    'body': 'Ton rapport CFO hebdomadaire est prêt.', 'url': reverse('ai_advisor:home')},
+                      priority=Job.PRIORITY_LOW)
+
+
+@queue.handler('ai.predictions')
+def compute_predictions(user_id):
+    user = get_user_model().objects.filter(pk=user_id).first()
+    if user is not None:
+        predictions(user, fallback=False)   # rangées dans ai_cache sous l'empreinte des données
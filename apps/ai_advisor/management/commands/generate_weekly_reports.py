@@ -0,0 +1,47 @@
+"""
+Management command : précalcule le rapport IA de la semaine pour tous les utilisateurs actifs.
+À lancer le lundi matin (cron) ; relancer après une interruption reprend là où le lot s'est arrêté.
+Usage : python manage.py generate_weekly_reports [--concurrency 4] [--rpm 50] [--active-days 30] [--limit 1000]
+"""
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from apps.ai_advisor import reports
+
+
+class Command(BaseCommand):
+    help = 'Génère les rapports hebdomadaires IA manquants, avec concurrence et débit bornés'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=4, help='Appels simultanés à l’API')
+        parser.add_argument('--rpm', type=int, default=50, help='Appels par minute au plus (0 : sans limite)')
+        parser.add_argument('--active-days', type=int, default=30,
+                            help='Utilisateurs ayant une opération depuis N jours (0 : tous les comptes actifs)')
+        parser.add_argument('--limit', type=int, default=0, help='Nombre maximal de rapports de ce passage')
+        parser.add_argument('--every', type=int, default=10, help='Avancement affiché tous les N rapports')
+
+    def handle(self, *args, **options):
+        if not settings.ANTHROPIC_API_KEY:
+            # Sans clé, chaque « rapport » serait le texte de repli, enregistré pour la semaine
+            raise CommandError('ANTHROPIC_API_KEY absente : aucun rapport généré.')
+        week  = reports.week_start()
+        users = reports.pending_users(week, active_days=options['active_days'])
+        if options['limit']:
+            users = users[:options['limit']]
+        users = list(users)
+        self.stdout.write(f'Semaine du {week:%d/%m/%Y} : {len(users)} rapport(s) à générer.')
+
+        every = max(1, options['every'])
+
+        def on_progress(progress):
+            if progress.done % every == 0 or progress.done == progress.total:
+                self.stdout.write(str(progress))
+
+        # async_to_sync : l'ORM (sync_to_async) reste sur le thread et la connexion de la commande
+        result = async_to_sync(reports.generate_all)(
+            users, week, concurrency=options['concurrency'], per_minute=options['rpm'], on_progress=on_progress,
+        )
+        for username, error in result.errors:
+            self.stdout.write(self.style.WARNING(f'{username} : {error}'))
+        style = self.style.WARNING if result.failed else self.style.SUCCESS
+        self.stdout.write(style(f'✅ {result}'))
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:21
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_advisor', '0002_chatmessage_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AIAnswer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('feature', models.CharField(max_length=30)),
+                ('digest', models.CharField(max_length=64)),
+                ('value', models.JSONField()),
+                ('created_at', models.DateTimeField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ai_answers', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Réponse IA',
+                'constraints': [models.UniqueConstraint(fields=('user', 'feature'), name='ai_answer_user_feature_uniq')],
+            },
+        ),
+    ]
@@ -15,6 +15,7 @@ class ChatMessage(models.Model):
     class Meta:
         ordering     = ['created_at']
         verbose_name = 'Message chat'
+        indexes      = [models.Index(fields=['user', 'created_at'], name='chat_user_created_idx')]
 
     def __str__(self):
         return f'[{self.role}] {self.content[:60]}'
@@ -32,3 +33,24 @@ class AIReport(models.Model):
 
     def __str__(self):
         return f'Rapport {self.user} — {self.week_start}'
+
+
+class AIAnswer(models.Model):
+    """
+    Dernière réponse IA d'une fonctionnalité (prédictions, rapport…), rangée avec l'empreinte du
+    contexte envoyé au modèle (ai_cache.py). En base : partagée par tous les processus web et le worker.
+    """
+    user       = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='ai_answers')
+    feature    = models.CharField(max_length=30)
+    digest     = models.CharField(max_length=64)
+    value      = models.JSONField()
+    created_at = models.DateTimeField()
+
+    class Meta:
+        verbose_name = 'Réponse IA'
+        constraints  = [
+            models.UniqueConstraint(fields=['user', 'feature'], name='ai_answer_user_feature_uniq'),
+        ]
+
+    def __str__(self):
+        return f'{self.feature} — {self.user} ({self.created_at:%d/%m/%Y %H:%M})'
@@ -0,0 +1,106 @@
+"""
+Génération en lot des rapports hebdomadaires (commande generate_weekly_reports).
+
+Le lundi matin, les rapports de la semaine sont précalculés pour tous les utilisateurs actifs :
+``concurrency`` appels simultanés au plus, ``per_minute`` départs par minute au plus (quota de l'API).
+Chaque rapport est enregistré dès sa génération ; relancer après une interruption ne traite que
+les utilisateurs restants.
+"""
+import asyncio
+import datetime
+import time
+from django.contrib.auth import get_user_model
+from django.db.models import Exists, OuterRef
+from apps.transactions.models import Transaction
+from .models import AIReport
+from .services import aweekly_report
+
+
+def week_start(today=None):
+    today = today or datetime.date.today()
+    return today - datetime.timedelta(days=today.weekday())
+
+
+def pending_users(week, active_days=30, today=None):
+    """Comptes actifs sans rapport pour ``week`` ; avec ``active_days``, ayant saisi une opération récemment."""
+    qs = get_user_model().objects.filter(is_active=True).exclude(ai_reports__week_start=week)
+    if active_days:
+        since = (today or datetime.date.today()) - datetime.timedelta(days=active_days)
+        qs = qs.filter(Exists(Transaction.objects.filter(user=OuterRef('pk'), date__gte=since)))
+    return qs.order_by('pk')
+
+
+class RateLimiter:
+    """Au plus ``per_minute`` départs par minute, régulièrement espacés (0 : pas de limite)."""
+
+    def __init__(self, per_minute):
+        self.interval = 60 / per_minute if per_minute else 0
+        self._next    = 0.0
+        self._lock    = asyncio.Lock()
+
+    async def wait(self):
+        if not self.interval:
+            return
+        async with self._lock:
+            now        = time.monotonic()
+            delay      = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class BatchProgress:
+    """Avancement d'un lot : rapports créés, déjà présents, en échec, débit."""
+
+    MAX_ERRORS = 50
+
+    def __init__(self, total):
+        self.total   = total
+        self.created = 0
+        self.skipped = 0
+        self.failed  = 0
+        self.errors  = []
+        self.started = time.monotonic()
+
+    @property
+    def done(self):
+        return self.created + self.skipped + self.failed
+
+    @property
+    def per_minute(self):
+        elapsed = time.monotonic() - self.started
+        return self.done * 60 / elapsed if elapsed else 0.0
+
+    def __str__(self):
+        return (f'{self.done}/{self.total} · {self.created} créé(s) · {self.skipped} déjà présent(s) · '
+                f'{self.failed} échec(s) · {self.per_minute:.1f}/min')
+
+
+async def generate_all(users, week, concurrency=4, per_minute=50, on_progress=None):
+    """Génère le rapport de ``week`` pour chaque utilisateur de ``users`` (liste). Retourne un BatchProgress."""
+    progress = BatchProgress(len(users))
+    limiter  = RateLimiter(per_minute)
+    todo     = iter(users)
+
+    async def worker():
+        for user in todo:                 # itérateur partagé : chaque utilisateur est pris une fois
+            await limiter.wait()
+            try:
+                content = await aweekly_report(user, fallback=False)
+                # Rapport créé entre-temps (visite, worker de tâches) : conservé
+                _, created = await AIReport.objects.aget_or_create(user=user, week_start=week,
+                                                                   defaults={'content': content})
+            except Exception as exc:
+                progress.failed += 1
+                if len(progress.errors) < progress.MAX_ERRORS:
+                    progress.errors.append((user.username, str(exc)[:200]))
+            else:
+                if created:
+                    progress.created += 1
+                else:
+                    progress.skipped += 1
+            if on_progress:
+                on_progress(progress)
+
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    return progress
@@ -1,7 +1,22 @@
-"""FIN.AI — Service IA (Claude API)."""
+"""
+FIN.AI — Service IA (Claude API).
+
+Chaque appel existe en deux versions : synchrone (worker de tâches, commandes) et asynchrone, préfixée
+« a » (aweekly_report, achat…), pour les vues async. Servies en ASGI (finai/asgi.py, optionnel), un
+worker continue de servir les autres requêtes pendant l'appel à l'API ; l'ORM est appelé via
+sync_to_async. En production O2switch (Passenger, WSGI) ces vues tournent dans une boucle par requête.
+Rapport hebdomadaire et prédictions sont préparés hors requête par le worker (jobs.py) et resservis
+tant que le contexte envoyé au modèle ne change pas (ai_cache.py).
+"""
+import asyncio
 import json
+import weakref
+from asgiref.sync import sync_to_async
 from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from apps.jobs import queue
 from apps.transactions.services import get_monthly_stats, detect_leaks, compute_score
+from . import ai_cache
 
 
 def _client():
@@ -14,9 +29,26 @@ def _client():
         return None
 
 
+_async_clients = weakref.WeakKeyDictionary()   # boucle d'événements → AsyncAnthropic
+
+
+def _async_client():
+    """Client asynchrone partagé par la boucle courante (pool de connexions HTTP réutilisé)."""
+    if not settings.ANTHROPIC_API_KEY:
+        return None
+    try:
+        import anthropic
+    except ImportError:
+        return None
+    loop = asyncio.get_running_loop()
+    if loop not in _async_clients:
+        _async_clients[loop] = anthropic.AsyncAnthropic(api_key=settings.ANTHROPIC_API_KEY)
+    return _async_clients[loop]
+
+
 def _context(user):
     stats = get_monthly_stats(user)
-    score = compute_score(user)
+    score = compute_score(user, stats)
     leaks = detect_leaks(user)
     leaks_txt = '\n'.join(f"  - {l['category']}: -{l['amount']:,} FCFA" for l in leaks) or '  - Aucune détectée'
     return f"""PROFIL DE {user.get_full_name() or user.username} ({user.city}, {user.country})
@@ -38,23 +70,129 @@ FUITES DÉTECTÉES:
 Contexte: Afrique Centrale, FCFA, BVMAC disponible."""
 
 
-def weekly_report(user):
-    """Rapport hebdomadaire IA personnalisé."""
-    c = _client()
-    if not c:
-        return _fallback_report(user)
-    try:
-        r = c.messages.create(
-            model=settings.AI_MODEL,
-            max_tokens=settings.AI_MAX_TOKENS,
-            messages=[{'role': 'user', 'content': f"""{_context(user)}
+# ── Résultats préparés par le worker (apps/jobs) ─────────────────────────────
+
+# Tâche IA en échec définitif (API en panne…) : pas de nouvelle tâche avant ce délai
+RETRY_AFTER = 3600
+
+
+def schedule_weekly_report(user, week_start):
+    """Rapport de la semaine demandé au worker (une seule tâche en file par utilisateur et semaine)."""
+    if not settings.ANTHROPIC_API_KEY:
+        return None                    # rien à préparer : la page affiche l'invitation à configurer la clé
+    return queue.enqueue('ai.weekly_report', {'user_id': user.pk, 'week_start': week_start.isoformat()},
+                         key=f'ai.weekly_report:{user.pk}:{week_start.isoformat()}', cooldown=RETRY_AFTER)
+
+
+def cached_predictions(user):
+    """
+    Prédictions calculées pour les données actuelles. Périmées : servies et recalculées par le worker ;
+    absentes (ou données modifiées depuis) : estimation locale (_fallback_preds) en attendant.
+    """
+    if not settings.ANTHROPIC_API_KEY:
+        return _fallback_preds(user)
+    state, preds = ai_cache.get('predictions', user, _context(user))
+    if state != ai_cache.FRESH:
+        queue.enqueue('ai.predictions', {'user_id': user.pk}, key=f'ai.predictions:{user.pk}',
+                      cooldown=RETRY_AFTER)
+    return preds if state != ai_cache.MISS else _fallback_preds(user)
+
+
+# ── Requêtes (communes aux versions sync et async) ───────────────────────────
+
+def _report_request(context):
+    return dict(
+        model=settings.AI_MODEL,
+        max_tokens=settings.AI_MAX_TOKENS,
+        messages=[{'role': 'user', 'content': f"""{context}
 
 Rédigez un rapport CFO hebdomadaire en français, personnel et direct (tutoyer).
 3 paragraphes courts: bilan semaine, alerte principale, recommandation concrète.
 Max 180 mots. Pas de titres."""}]
-        )
-        return r.content[0].text
+    )
+
+
+def _chat_request(user, question, history):
+    msgs = list(history or [])
+    msgs.append({'role': 'user', 'content': question})
+    return dict(
+        model=settings.AI_MODEL,
+        max_tokens=settings.AI_MAX_TOKENS,
+        system=f"""Tu es le CFO personnel de {user.get_full_name() or user.username}.
+{_context(user)}
+Réponds en français, max 150 mots, ancré dans la réalité (FCFA, BVMAC, MoMo).
+Ne garantis pas de rendements. Sois direct et pratique.""",
+        messages=msgs
+    )
+
+
+def _sms_request(sms_text):
+    return dict(
+        model=settings.AI_MODEL,
+        max_tokens=200,
+        messages=[{'role': 'user', 'content': f"""Extrais les infos de ce SMS Mobile Money camerounais.
+Réponds UNIQUEMENT en JSON valide, sans texte autour.
+SMS: "{sms_text}"
+JSON: {{"amount":<int FCFA>,"type":"income"|"expense","description":"<court>","network":"MTN MoMo"|"Orange Money"|"Mobile Money","date":"<YYYY-MM-DD>|null"}}"""}]
+    )
+
+
+def _predictions_request(context):
+    return dict(
+        model=settings.AI_MODEL,
+        max_tokens=300,
+        messages=[{'role': 'user', 'content': f"""{context}
+Génère des prédictions 30 jours. JSON uniquement:
+{{"predicted_balance":<int>,"balance_change":<int>,"risk_level":"Faible"|"Moyen"|"Élevé","risk_detail":"<court>","best_invest_date":"<YYYY-MM-DD>","best_invest_reason":"<court>"}}"""}]
+    )
+
+
+def _json_answer(r):
+    return json.loads(r.content[0].text.strip().replace('```json','').replace('```','').strip())
+
+
+def _parse_sms_local(user, sms_text):
+    """Grammaires regex et catégorisation locale — (résultat ou None, catégoriseur)."""
+    from apps.transactions.services import parse_sms
+    from apps.transactions.rules import Categorizer
+    guess  = Categorizer(user)
+    parsed = parse_sms(sms_text)
+    if parsed:
+        parsed['category'] = guess.slug(parsed['description'], sms_text)
+    return parsed, guess
+
+
+def _sms_answer(r, sms_text, guess):
+    data = _json_answer(r)
+    data['source']   = 'ai'
+    data['raw_sms']  = sms_text
+    data['category'] = guess.slug(data.get('description', ''), sms_text)
+    return data
+
+
+# ── Version synchrone ────────────────────────────────────────────────────────
+
+def weekly_report(user, fallback=True):
+    """
+    Rapport hebdomadaire IA personnalisé (resservi si les données n'ont pas changé).
+    ``fallback=False`` : comme aweekly_report, erreur propagée au lieu du rapport de repli.
+    """
+    c = _client()
+    if not c:
+        if not fallback:
+            raise ImproperlyConfigured('Client Anthropic indisponible (ANTHROPIC_API_KEY ou paquet anthropic).')
+        return _fallback_report(user)
+    try:
+        context       = _context(user)
+        state, cached = ai_cache.get('weekly_report', user, context)
+        if state == ai_cache.FRESH:
+            return cached
+        text = c.messages.create(**_report_request(context)).content[0].text
+        ai_cache.put('weekly_report', user, context, text)
+        return text
     except Exception:
+        if not fallback:
+            raise
         return _fallback_report(user)
 
 
@@ -63,67 +201,163 @@ def chat(user, question, history=None):
     c = _client()
     if not c:
         return _fallback_chat()
-    msgs = list(history or [])
-    msgs.append({'role': 'user', 'content': question})
     try:
-        r = c.messages.create(
-            model=settings.AI_MODEL,
-            max_tokens=settings.AI_MAX_TOKENS,
-            system=f"""Tu es le CFO personnel de {user.get_full_name() or user.username}.
-{_context(user)}
-Réponds en français, max 150 mots, ancré dans la réalité (FCFA, BVMAC, MoMo).
-Ne garantis pas de rendements. Sois direct et pratique.""",
-            messages=msgs
-        )
+        r = c.messages.create(**_chat_request(user, question, history))
         return r.content[0].text
     except Exception:
         return _fallback_chat()
 
 
+def chat_stream(user, question, history=None):
+    """
+    Version synchrone d'achat_stream (vue servie en WSGI) : mêmes fragments, même repli
+    avant le premier fragment.
+    """
+    c = _client()
+    if not c:
+        yield _fallback_chat()
+        return
+    sent = False
+    try:
+        with c.messages.stream(**_chat_request(user, question, history)) as stream:
+            for text in stream.text_stream:
+                sent = True
+                yield text
+    except Exception:
+        if not sent:
+            yield _fallback_chat()
+
+
 def parse_sms_ai(user, sms_text):
-    """Parse SMS avec IA (fallback regex si IA indisponible)."""
+    """Parse SMS : grammaires regex d'abord, IA seulement si la confiance est insuffisante."""
+    parsed, guess = _parse_sms_local(user, sms_text)
+    if parsed and parsed['confidence'] >= settings.SMS_AI_MIN_CONFIDENCE:
+        return parsed
+    c = _client()
+    if not c:
+        return parsed
+    try:
+        return _sms_answer(c.messages.create(**_sms_request(sms_text)), sms_text, guess)
+    except Exception:
+        return parsed
+
+
+def categorize_ai(description, categories):
+    """Catégorie (nom parmi ``categories``) proposée par l'IA pour une description, ou None."""
     c = _client()
     if not c:
-        from apps.transactions.services import parse_sms
-        return parse_sms(sms_text)
+        return None
     try:
         r = c.messages.create(
             model=settings.AI_MODEL,
-            max_tokens=200,
-            messages=[{'role': 'user', 'content': f"""Extrais les infos de ce SMS Mobile Money camerounais.
-Réponds UNIQUEMENT en JSON valide, sans texte autour.
-SMS: "{sms_text}"
-JSON: {{"amount":<int FCFA>,"type":"income"|"expense","description":"<court>","network":"MTN MoMo"|"Orange Money"|"Mobile Money","date":"<YYYY-MM-DD>|null"}}"""}]
+            max_tokens=20,
+            messages=[{'role': 'user', 'content': f"""Catégorie de cette transaction Mobile Money camerounaise : "{description}".
+Réponds UNIQUEMENT par un nom de cette liste : {', '.join(categories)}."""}]
         )
-        text = r.content[0].text.strip().replace('```json','').replace('```','').strip()
-        data = json.loads(text)
-        data['source']  = 'ai'
-        data['raw_sms'] = sms_text
-        return data
+        answer = r.content[0].text.strip().strip('."\'').lower()
+        return next((name for name in categories if name.lower() == answer), None)
     except Exception:
-        from apps.transactions.services import parse_sms
-        return parse_sms(sms_text)
+        return None
 
 
-def predictions(user):
-    """Prédictions 30 jours."""
+def predictions(user, fallback=True):
+    """
+    Prédictions 30 jours (resservies si les données n'ont pas changé).
+    ``fallback=False`` (worker) : erreur propagée, pour que la tâche soit retentée puis mise en échec.
+    """
     c = _client()
     if not c:
+        if not fallback:
+            raise ImproperlyConfigured('Client Anthropic indisponible (ANTHROPIC_API_KEY ou paquet anthropic).')
         return _fallback_preds(user)
     try:
-        r = c.messages.create(
-            model=settings.AI_MODEL,
-            max_tokens=300,
-            messages=[{'role': 'user', 'content': f"""{_context(user)}
-Génère des prédictions 30 jours. JSON uniquement:
-{{"predicted_balance":<int>,"balance_change":<int>,"risk_level":"Faible"|"Moyen"|"Élevé","risk_detail":"<court>","best_invest_date":"<YYYY-MM-DD>","best_invest_reason":"<court>"}}"""}]
-        )
-        text = r.content[0].text.strip().replace('```json','').replace('```','').strip()
-        return json.loads(text)
+        context       = _context(user)
+        state, cached = ai_cache.get('predictions', user, context)
+        if state == ai_cache.FRESH:
+            return cached
+        preds = _json_answer(c.messages.create(**_predictions_request(context)))
+        ai_cache.put('predictions', user, context, preds)
+        return preds
     except Exception:
+        if not fallback:
+            raise
         return _fallback_preds(user)
 
 
+# ── Version asynchrone (vues ASGI) ───────────────────────────────────────────
+
+async def aweekly_report(user, fallback=True, force=False):
+    """
+    ``fallback=False`` : une erreur de l'API, ou l'absence de client, est propagée au lieu du rapport
+    de repli (génération en lot).
+    ``force`` : nouveau rapport même si les données n'ont pas changé (bouton « Actualiser »).
+    """
+    c = _async_client()
+    if not c:
+        if not fallback:
+            raise ImproperlyConfigured('Client Anthropic indisponible (ANTHROPIC_API_KEY ou paquet anthropic).')
+        return await sync_to_async(_fallback_report)(user)
+    try:
+        context = await sync_to_async(_context)(user)
+        if not force:
+            state, cached = await sync_to_async(ai_cache.get)('weekly_report', user, context)
+            if state == ai_cache.FRESH:
+                return cached
+        text = (await c.messages.create(**_report_request(context))).content[0].text
+        await sync_to_async(ai_cache.put)('weekly_report', user, context, text)
+        return text
+    except Exception:
+        if not fallback:
+            raise
+        return await sync_to_async(_fallback_report)(user)
+
+
+async def achat(user, question, history=None):
+    c = _async_client()
+    if not c:
+        return _fallback_chat()
+    try:
+        r = await c.messages.create(**await sync_to_async(_chat_request)(user, question, history))
+        return r.content[0].text
+    except Exception:
+        return _fallback_chat()
+
+
+async def achat_stream(user, question, history=None):
+    """
+    Réponse au fil de la génération (API de streaming) : fragments de texte, dès le premier token.
+    Erreur avant le premier fragment : réponse de repli ; après, le flux s'arrête là.
+    """
+    c = _async_client()
+    if not c:
+        yield _fallback_chat()
+        return
+    sent = False
+    try:
+        request = await sync_to_async(_chat_request)(user, question, history)
+        async with c.messages.stream(**request) as stream:
+            async for text in stream.text_stream:
+                sent = True
+                yield text
+    except Exception:
+        if not sent:
+            yield _fallback_chat()
+
+
+async def aparse_sms_ai(user, sms_text):
+    parsed, guess = await sync_to_async(_parse_sms_local)(user, sms_text)
+    if parsed and parsed['confidence'] >= settings.SMS_AI_MIN_CONFIDENCE:
+        return parsed
+    c = _async_client()
+    if not c:
+        return parsed
+    try:
+        r = await c.messages.create(**_sms_request(sms_text))
+        return await sync_to_async(_sms_answer)(r, sms_text, guess)
+    except Exception:
+        return parsed
+
+
 # ── Fallbacks ─────────────────────────────────────────────────────────────────
 
 def _fallback_report(user):
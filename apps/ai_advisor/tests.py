@@ -1,5 +1,7 @@
 """Tests — app ai_advisor."""
-from django.test import TestCase, Client
+from django.core.cache import cache
+from django.test import TestCase, Client, override_settings
+from django.utils import timezone
 from django.urls import reverse
 from apps.accounts.models import User
 from .models import ChatMessage, AIReport
@@ -22,9 +24,25 @@ class AIAdvisorViewsTest(TestCase):
         r = self.client.get(reverse('ai_advisor:home'))
         self.assertEqual(r.status_code, 302)
 
+    @override_settings(ANTHROPIC_API_KEY='test')
     def test_advisor_home_creates_report(self):
+        from types import SimpleNamespace
+        from unittest import mock
+        from apps.jobs import queue
         self.client.get(reverse('ai_advisor:home'))
-        self.assertTrue(AIReport.objects.filter(user=self.user).exists())
+        # Rapport préparé hors requête, par le worker
+        self.assertFalse(AIReport.objects.filter(user=self.user).exists())
+        client = mock.Mock()
+        client.messages.create.return_value = SimpleNamespace(content=[SimpleNamespace(text='Rapport IA')])
+        with mock.patch('apps.ai_advisor.services._client', return_value=client):
+            queue.work()
+        self.assertEqual(AIReport.objects.get(user=self.user).content, 'Rapport IA')
+
+    def test_no_report_job_without_api_key(self):
+        from apps.jobs.models import Job
+        with override_settings(ANTHROPIC_API_KEY=''):
+            self.client.get(reverse('ai_advisor:home'))
+        self.assertFalse(Job.objects.filter(type='ai.weekly_report').exists())
 
     def test_chat_view_requires_post(self):
         r = self.client.get(reverse('ai_advisor:chat'))
@@ -76,6 +94,357 @@ class AIAdvisorViewsTest(TestCase):
         self.assertEqual(data['status'], 'ok')
 
 
+    @override_settings(ANTHROPIC_API_KEY='test')
+    def test_parse_sms_high_confidence_skips_llm(self):
+        from unittest import mock
+        from .services import parse_sms_ai
+        sms = ('Vous avez reçu 25000 FCFA de JEAN MBARGA le 2024-03-05 14:22:10. Votre nouveau solde est de '
+               '125000 FCFA. ID de transaction: 7412589630. MTN MoMo')
+        with mock.patch('apps.ai_advisor.services._client') as client:
+            result = parse_sms_ai(self.user, sms)
+        client.assert_not_called()
+        self.assertEqual((result['source'], result['amount'], result['date']), ('sms', 25000, '2024-03-05'))
+
+
+class _FakeAsyncClient:
+    """
+    Client AsyncAnthropic factice : chaque appel « dure » ``delay`` secondes ;
+    ``messages.stream`` rend le texte mot par mot, comme l'API de streaming.
+    """
+
+    def __init__(self, text, delay=0, fail_after=None):
+        self.calls    = 0
+        self.messages = self
+        self._text, self._delay, self._fail_after = text, delay, fail_after
+
+    async def create(self, **kwargs):
+        import asyncio
+        from types import SimpleNamespace
+        self.calls += 1
+        await asyncio.sleep(self._delay)
+        return SimpleNamespace(content=[SimpleNamespace(text=self._text)])
+
+    def stream(self, **kwargs):
+        self.calls += 1
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    @property
+    async def text_stream(self):
+        import asyncio
+        for i, word in enumerate(self._text.split(' ')):
+            if i == self._fail_after:
+                raise ConnectionError('flux interrompu')
+            await asyncio.sleep(self._delay)
+            yield word if i == 0 else ' ' + word
+
+
+class _FakeClient(_FakeAsyncClient):
+    """Pendant synchrone (client Anthropic) : ``messages.stream`` utilisé par la vue servie en WSGI."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    @property
+    def text_stream(self):
+        for i, word in enumerate(self._text.split(' ')):
+            if i == self._fail_after:
+                raise ConnectionError('flux interrompu')
+            yield word if i == 0 else ' ' + word
+
+
+@override_settings(ANTHROPIC_API_KEY='test')
+class AsyncAdvisorTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.user = User.objects.create_user(username='alice', password='pass123')
+        self.client.login(username='alice', password='pass123')
+
+    async def test_concurrent_chats_do_not_block(self):
+        import asyncio, time
+        from unittest import mock
+        from .services import achat
+        fake = _FakeAsyncClient('Épargne 10 %.', delay=0.3)
+        with mock.patch('apps.ai_advisor.services._async_client', return_value=fake):
+            start   = time.monotonic()
+            answers = await asyncio.gather(*(achat(self.user, f'Question {i}') for i in range(5)))
+        self.assertEqual(answers, ['Épargne 10 %.'] * 5)
+        self.assertLess(time.monotonic() - start, 1.2)
+
+    def test_chat_view_uses_async_client(self):
+        import json
+        from unittest import mock
+        fake = _FakeAsyncClient('Réponse IA')
+        with mock.patch('apps.ai_advisor.services._async_client', return_value=fake):
+            r = self.client.post(reverse('ai_advisor:chat'), data=json.dumps({'message': 'Bonjour'}),
+                                 content_type='application/json')
+        self.assertEqual(r.json(), {'status': 'ok', 'answer': 'Réponse IA'})
+        self.assertEqual(list(ChatMessage.objects.values_list('role', 'content')),
+                         [('user', 'Bonjour'), ('assistant', 'Réponse IA')])
+
+    def test_home_queues_ai_work(self):
+        from types import SimpleNamespace
+        from unittest import mock
+        from apps.jobs import queue
+        from apps.jobs.models import Job
+        reply  = SimpleNamespace(content=[SimpleNamespace(text='{"predicted_balance": 4242, "risk_level": "Moyen"}')])
+        client = mock.Mock()
+        client.messages.create.return_value = reply
+        self.client.get(reverse('ai_advisor:home'))
+        self.client.get(reverse('dashboard:home'))
+        # Une seule tâche par clé, quel que soit le nombre de visites
+        self.assertEqual(sorted(Job.objects.values_list('type', flat=True)), ['ai.predictions', 'ai.weekly_report'])
+        with mock.patch('apps.ai_advisor.services._client', return_value=client):
+            self.assertEqual(queue.work(), {'done': 2})
+        # Le worker est un autre processus : rien ne doit transiter par son cache mémoire
+        cache.clear()
+        r = self.client.get(reverse('ai_advisor:home'))
+        self.assertEqual(r.context['predictions']['predicted_balance'], 4242)
+        self.assertEqual(r.context['report'], reply.content[0].text)
+        self.assertEqual(client.messages.create.call_count, 2)
+        self.assertFalse(Job.objects.filter(status=Job.STATUS_PENDING).exists())
+
+    async def test_chat_stream_sends_events_then_saves(self):
+        from unittest import mock
+        await self.async_client.aforce_login(self.user)
+        fake = _FakeAsyncClient('Épargne 10 % chaque mois')
+        with mock.patch('apps.ai_advisor.services._async_client', return_value=fake):
+            r    = await self.async_client.post(reverse('ai_advisor:chat_stream'), {'message': 'Conseil ?'},
+                                                content_type='application/json')
+            body = b''.join([chunk async for chunk in r.streaming_content]).decode()
+        self.assertEqual(r['Content-Type'], 'text/event-stream')
+        events = [e.split('\n') for e in body.strip().split('\n\n')]
+        self.assertEqual([e[0] for e in events], ['event: token'] * 5 + ['event: done'])
+        self.assertEqual(events[0][1], 'data: {"text": "Épargne"}')
+        self.assertEqual(events[-1][1], 'data: {"answer": "Épargne 10 % chaque mois"}')
+        saved = [(m.role, m.content) async for m in ChatMessage.objects.filter(user=self.user)]
+        self.assertEqual(saved, [('user', 'Conseil ?'), ('assistant', 'Épargne 10 % chaque mois')])
+
+    async def test_chat_stream_failure(self):
+        from unittest import mock
+        from .services import achat_stream, _fallback_chat
+        # Panne avant le premier token : réponse de repli ; en cours de flux : texte déjà reçu
+        with mock.patch('apps.ai_advisor.services._async_client',
+                        return_value=_FakeAsyncClient('Un deux trois', fail_after=0)):
+            self.assertEqual([t async for t in achat_stream(self.user, 'Q')], [_fallback_chat()])
+        with mock.patch('apps.ai_advisor.services._async_client',
+                        return_value=_FakeAsyncClient('Un deux trois', fail_after=2)):
+            self.assertEqual([t async for t in achat_stream(self.user, 'Q')], ['Un', ' deux'])
+
+    def test_chat_stream_under_wsgi_is_incremental(self):
+        from unittest import mock
+        from .services import chat_stream, _fallback_chat
+        fake = _FakeClient('Épargne 10 % chaque mois')
+        with mock.patch('apps.ai_advisor.services._client', return_value=fake):
+            r      = self.client.post(reverse('ai_advisor:chat_stream'), {'message': 'Conseil ?'},
+                                      content_type='application/json')
+            chunks = iter(r.streaming_content)
+            first  = next(chunks).decode()
+            # Premier évènement envoyé avant la fin de la génération
+            self.assertFalse(ChatMessage.objects.exists())
+            body = first + b''.join(chunks).decode()
+        self.assertEqual(first, 'event: token\ndata: {"text": "Épargne"}\n\n')
+        self.assertTrue(body.endswith('data: {"answer": "Épargne 10 % chaque mois"}\n\n'))
+        self.assertEqual(list(ChatMessage.objects.values_list('role', 'content')),
+                         [('user', 'Conseil ?'), ('assistant', 'Épargne 10 % chaque mois')])
+        with mock.patch('apps.ai_advisor.services._client', return_value=_FakeClient('Un deux', fail_after=0)):
+            self.assertEqual(list(chat_stream(self.user, 'Q')), [_fallback_chat()])
+
+    def test_chat_stream_empty_message(self):
+        r = self.client.post(reverse('ai_advisor:chat_stream'), data={'message': ' '},
+                             content_type='application/json')
+        self.assertEqual(r.status_code, 400)
+
+    def test_asgi_application(self):
+        from django.core.handlers.asgi import ASGIHandler
+        from finai.asgi import application
+        self.assertIsInstance(application, ASGIHandler)
+
+
+@override_settings(ANTHROPIC_API_KEY='test')
+class WeeklyReportBatchTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        from apps.transactions.models import Transaction
+        self.users = [User.objects.create_user(username=f'u{i}', password='pass123') for i in range(4)]
+        for user in self.users:
+            Transaction.objects.create(user=user, amount=1000, type='expense', description='Taxi',
+                                       date=datetime.date.today())
+        User.objects.create_user(username='dormant', password='pass123')
+        self.week = datetime.date.today() - datetime.timedelta(days=datetime.date.today().weekday())
+        AIReport.objects.create(user=self.users[0], week_start=self.week, content='Déjà là')
+
+    def _run(self, fake, **options):
+        from io import StringIO
+        from unittest import mock
+        from django.core.management import call_command
+        out = StringIO()
+        with mock.patch('apps.ai_advisor.services._async_client', return_value=fake):
+            call_command('generate_weekly_reports', stdout=out, **options)
+        return out.getvalue()
+
+    def test_requires_api_key(self):
+        from asgiref.sync import async_to_sync
+        from django.core.exceptions import ImproperlyConfigured
+        from django.core.management import CommandError
+        from .services import aweekly_report
+        with override_settings(ANTHROPIC_API_KEY=''):
+            with self.assertRaises(CommandError):
+                self._run(None)
+            with self.assertRaises(ImproperlyConfigured):
+                async_to_sync(aweekly_report)(self.users[1], fallback=False)
+        self.assertEqual(AIReport.objects.count(), 1)
+
+    def test_generates_missing_reports_once(self):
+        fake = _FakeAsyncClient('Rapport IA', delay=0.05)
+        out  = self._run(fake, concurrency=2, rpm=0, every=1)
+        self.assertIn('3 rapport(s) à générer', out)
+        self.assertIn('3/3 · 3 créé(s)', out)
+        self.assertEqual(AIReport.objects.filter(week_start=self.week, content='Rapport IA').count(), 3)
+        self.assertEqual(AIReport.objects.get(user=self.users[0]).content, 'Déjà là')
+        self.assertFalse(AIReport.objects.filter(user__username='dormant').exists())
+        # Relance : plus rien à faire
+        self.assertIn('0 rapport(s) à générer', self._run(fake))
+        self.assertEqual(fake.calls, 3)
+
+    def test_failures_are_not_saved_and_resumable(self):
+        class Failing(_FakeAsyncClient):
+            async def create(self, **kwargs):
+                raise ConnectionError('API indisponible')
+        out = self._run(Failing(''), rpm=0)
+        self.assertIn('3 échec(s)', out)
+        self.assertIn('API indisponible', out)
+        self.assertEqual(AIReport.objects.count(), 1)
+        self._run(_FakeAsyncClient('Rapport IA'), rpm=0, limit=2)
+        self.assertEqual(AIReport.objects.count(), 3)
+
+    def test_rate_limiter_spaces_calls(self):
+        import asyncio, time
+        from .reports import RateLimiter
+
+        async def burst():
+            limiter = RateLimiter(per_minute=600)       # un départ toutes les 0,1 s
+            start   = time.monotonic()
+            await asyncio.gather(*(limiter.wait() for _ in range(4)))
+            return time.monotonic() - start
+
+        self.assertGreaterEqual(asyncio.run(burst()), 0.29)
+
+
+@override_settings(ANTHROPIC_API_KEY='test')
+class AICacheTest(TestCase):
+
+    def setUp(self):
+        from types import SimpleNamespace
+        from unittest import mock
+        cache.clear()
+        self.user   = User.objects.create_user(username='alice', password='pass123')
+        self.client_ = mock.Mock()
+        self.client_.messages.create.return_value = SimpleNamespace(
+            content=[SimpleNamespace(text='{"predicted_balance": 1000}')])
+        patcher = mock.patch('apps.ai_advisor.services._client', return_value=self.client_)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _add_expense(self):
+        from apps.transactions.models import Transaction
+        Transaction.objects.create(user=self.user, amount=5000, type='expense', description='Taxi',
+                                   date=datetime.date.today())
+
+    def test_served_until_data_changes(self):
+        from .services import predictions, weekly_report
+        for _ in range(3):
+            self.assertEqual(predictions(self.user), {'predicted_balance': 1000})
+        self.assertEqual(self.client_.messages.create.call_count, 1)
+        self._add_expense()
+        predictions(self.user)
+        self.assertEqual(self.client_.messages.create.call_count, 2)
+        # Fonctionnalités distinctes : empreintes distinctes
+        weekly_report(self.user)
+        weekly_report(self.user)
+        self.assertEqual(self.client_.messages.create.call_count, 3)
+
+    def test_failed_generation_is_not_stored(self):
+        from unittest import mock
+        from apps.jobs import queue
+        from .reports import week_start
+        from .services import schedule_weekly_report, _fallback_report
+        client = mock.Mock()
+        client.messages.create.side_effect = ConnectionError('API indisponible')
+        schedule_weekly_report(self.user, week_start())
+        with mock.patch('apps.ai_advisor.services._client', return_value=client), \
+                self.assertLogs('apps.jobs.queue', 'WARNING'):
+            self.assertEqual(queue.work(), {'pending': 1})          # nouvel essai plus tard
+        self.assertFalse(AIReport.objects.exists())
+
+        fake = _FakeAsyncClient('Rapport IA')
+        fake.create = mock.AsyncMock(side_effect=ConnectionError('API indisponible'))
+        self.client.force_login(self.user)
+        with mock.patch('apps.ai_advisor.services._async_client', return_value=fake):
+            r = self.client.get(reverse('ai_advisor:refresh_report'))
+        self.assertEqual(r.json()['report'], _fallback_report(self.user))
+        self.assertFalse(AIReport.objects.exists())
+
+    def test_failing_api_does_not_queue_a_job_per_view(self):
+        from datetime import timedelta
+        from apps.jobs import queue
+        from apps.jobs.models import Job
+        from .services import cached_predictions, RETRY_AFTER
+        self.client_.messages.create.side_effect = ConnectionError('API indisponible')
+        cached_predictions(self.user)
+        Job.objects.update(max_attempts=1)
+        with self.assertLogs('apps.jobs.queue', 'WARNING'):
+            self.assertEqual(queue.work(), {'failed': 1})
+        for _ in range(3):
+            cached_predictions(self.user)
+        self.assertEqual(Job.objects.count(), 1)
+        # Délai écoulé : nouvel essai
+        Job.objects.update(finished_at=timezone.now() - timedelta(seconds=RETRY_AFTER + 1))
+        cached_predictions(self.user)
+        self.assertEqual(Job.objects.filter(status=Job.STATUS_PENDING).count(), 1)
+
+    def test_refresh_bypasses_cache(self):
+        from unittest import mock
+        fake = _FakeAsyncClient('Rapport IA')
+        with mock.patch('apps.ai_advisor.services._async_client', return_value=fake):
+            self.client.force_login(self.user)
+            for _ in range(2):
+                r = self.client.get(reverse('ai_advisor:refresh_report'))
+        self.assertEqual(r.json()['report'], 'Rapport IA')
+        self.assertEqual(fake.calls, 2)
+
+    def test_stale_while_revalidate(self):
+        from unittest import mock
+        from apps.jobs.models import Job
+        from .services import predictions, cached_predictions
+        predictions(self.user)
+        policy = {'predictions': {'max_age': 60, 'stale': 600}}
+        later  = timezone.now()
+        with override_settings(AI_CACHE=policy):
+            self.assertEqual(cached_predictions(self.user), {'predicted_balance': 1000})
+            self.assertFalse(Job.objects.exists())
+            with mock.patch('apps.ai_advisor.ai_cache.timezone.now', return_value=later + datetime.timedelta(seconds=120)):
+                # Périmée : servie, et recalcul mis en file
+                self.assertEqual(cached_predictions(self.user), {'predicted_balance': 1000})
+                self.assertTrue(Job.objects.filter(type='ai.predictions').exists())
+            with mock.patch('apps.ai_advisor.ai_cache.timezone.now', return_value=later + datetime.timedelta(hours=1)):
+                self.assertEqual(cached_predictions(self.user)['risk_detail'], 'Basé sur vos habitudes récentes')
+        self._add_expense()
+        # Données modifiées : estimation locale en attendant le worker
+        self.assertNotEqual(cached_predictions(self.user), {'predicted_balance': 1000})
+
+
 class AIReportModelTest(TestCase):
 
     def setUp(self):
@@ -93,3 +462,14 @@ class AIReportModelTest(TestCase):
         AIReport.objects.create(user=self.user, content='v1', week_start=today)
         with self.assertRaises(Exception):
             AIReport.objects.create(user=self.user, content='v2', week_start=today)
+
+
+class ChatMessageQueryPlanTest(TestCase):
+
+    def test_recent_history_uses_index(self):
+        from django.db import connection
+        user = User.objects.create_user(username='alice', password='pass123')
+        qs   = ChatMessage.objects.filter(user=user).order_by('-created_at')[:6]
+        if connection.vendor != 'sqlite':
+            self.skipTest('EXPLAIN QUERY PLAN propre à SQLite')
+        self.assertIn('chat_user_created_idx', qs.explain())
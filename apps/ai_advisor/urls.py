@@ -6,6 +6,7 @@ app_name = 'ai_advisor'
 urlpatterns = [
     path('',              views.advisor_home,  name='home'),
     path('chat/',         views.chat_view,     name='chat'),
+    path('chat/flux/',    views.chat_stream,   name='chat_stream'),
     path('parse-sms/',    views.parse_sms_ia,  name='parse_sms'),
     path('rapport/sync/', views.refresh_report, name='refresh_report'),
 ]
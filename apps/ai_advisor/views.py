@@ -1,12 +1,17 @@
 import json
-import datetime
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views.decorators.http import require_POST
 from django.conf import settings
 from .models import ChatMessage, AIReport
-from .services import weekly_report, chat, predictions, parse_sms_ai
+from .reports import week_start
+from .services import (
+    aweekly_report, achat, achat_stream, aparse_sms_ai, cached_predictions, schedule_weekly_report,
+    chat_stream as chat_stream_sync, _fallback_report,
+)
 
 
 def _is_mobile(request):
@@ -17,56 +22,118 @@ def _is_mobile(request):
     return any(k in ua for k in ('mobile', 'android', 'iphone', 'ipad'))
 
 
+# Vues asynchrones : pendant un appel à l'API Claude, le worker ASGI sert les autres requêtes.
+# request.user est lu avec auser() et le gabarit rendu hors de la boucle (sync_to_async).
+
 @login_required
-def advisor_home(request):
-    week_start = datetime.date.today() - datetime.timedelta(days=datetime.date.today().weekday())
-    report_obj, _ = AIReport.objects.get_or_create(
-        user=request.user, week_start=week_start,
-        defaults={'content': weekly_report(request.user)}
-    )
-    history = list(ChatMessage.objects.filter(user=request.user).order_by('-created_at')[:10])
-    preds   = predictions(request.user)
+async def advisor_home(request):
+    # Aucun appel à l'API ici : rapport précalculé (generate_weekly_reports) ou, à défaut,
+    # mis en file pour le worker ; prédictions préparées par le worker
+    user   = await request.auser()
+    week   = week_start()
+    report = await AIReport.objects.filter(user=user, week_start=week).afirst()
+    if report is None:
+        await sync_to_async(schedule_weekly_report)(user, week)
+    preds    = await sync_to_async(cached_predictions)(user)
+    history  = [m async for m in ChatMessage.objects.filter(user=user).order_by('-created_at')[:10]]
     template = 'ai_advisor/advisor_pwa.html' if _is_mobile(request) else 'ai_advisor/advisor.html'
-    return render(request, template, {
-        'report':      report_obj.content,
+    return await sync_to_async(render)(request, template, {
+        'report':      report.content if report else None,
         'history':     reversed(history),
         'predictions': preds,
         'has_api_key': bool(settings.ANTHROPIC_API_KEY),
     })
 
 
+async def _recent_history(user):
+    recent = [m async for m in ChatMessage.objects.filter(user=user).order_by('-created_at')[:6]]
+    return [{'role': m.role, 'content': m.content} for m in reversed(recent)]
+
+
+def _save_exchange(user, question, answer):
+    ChatMessage.objects.create(user=user, role='user',      content=question)
+    ChatMessage.objects.create(user=user, role='assistant', content=answer)
+
+
 @login_required
 @require_POST
-def chat_view(request):
+async def chat_view(request):
     data     = json.loads(request.body)
     question = data.get('message', '').strip()
     if not question:
         return JsonResponse({'status': 'error'}, status=400)
-    recent  = list(ChatMessage.objects.filter(user=request.user).order_by('-created_at')[:6])
-    history = [{'role': m.role, 'content': m.content} for m in reversed(recent)]
-    answer  = chat(request.user, question, history)
-    ChatMessage.objects.create(user=request.user, role='user',      content=question)
-    ChatMessage.objects.create(user=request.user, role='assistant', content=answer)
+    user    = await request.auser()
+    answer  = await achat(user, question, await _recent_history(user))
+    await sync_to_async(_save_exchange)(user, question, answer)
     return JsonResponse({'status': 'ok', 'answer': answer})
 
 
+def _sse(event, data):
+    return f'event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n'
+
+
+@login_required
+@require_POST
+async def chat_stream(request):
+    """
+    Chat en Server-Sent Events : un évènement ``token`` par fragment reçu de l'API,
+    puis ``done`` (réponse complète) une fois l'échange enregistré.
+    En WSGI (Passenger) le serveur consommerait un générateur async en entier avant
+    d'envoyer quoi que ce soit : le flux passe alors par le client synchrone.
+    """
+    data     = json.loads(request.body)
+    question = data.get('message', '').strip()
+    if not question:
+        return JsonResponse({'status': 'error'}, status=400)
+    user    = await request.auser()
+    history = await _recent_history(user)
+
+    async def aevents():
+        parts = []
+        async for text in achat_stream(user, question, history):
+            parts.append(text)
+            yield _sse('token', {'text': text})
+        answer = ''.join(parts)
+        await sync_to_async(_save_exchange)(user, question, answer)
+        yield _sse('done', {'answer': answer})
+
+    def events():
+        parts = []
+        for text in chat_stream_sync(user, question, history):
+            parts.append(text)
+            yield _sse('token', {'text': text})
+        answer = ''.join(parts)
+        _save_exchange(user, question, answer)
+        yield _sse('done', {'answer': answer})
+
+    stream   = aevents() if isinstance(request, ASGIRequest) else events()
+    response = StreamingHttpResponse(stream, content_type='text/event-stream')
+    response['Cache-Control']     = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'          # pas de mise en tampon par le reverse proxy
+    return response
+
+
 @login_required
 @require_POST
-def parse_sms_ia(request):
+async def parse_sms_ia(request):
     data   = json.loads(request.body)
     sms    = data.get('sms', '').strip()
     if not sms:
         return JsonResponse({'status': 'error', 'message': 'SMS vide'}, status=400)
-    result = parse_sms_ai(request.user, sms)
+    result = await aparse_sms_ai(await request.auser(), sms)
     if result:
         return JsonResponse({'status': 'ok', 'data': result})
     return JsonResponse({'status': 'error', 'message': 'SMS non reconnu'}, status=400)
 
 
 @login_required
-def refresh_report(request):
-    week_start = datetime.date.today() - datetime.timedelta(days=datetime.date.today().weekday())
-    AIReport.objects.filter(user=request.user, week_start=week_start).delete()
-    content = weekly_report(request.user)
-    AIReport.objects.create(user=request.user, week_start=week_start, content=content)
+async def refresh_report(request):
+    user = await request.auser()
+    try:
+        # Demande explicite : pas de réponse en cache
+        content = await aweekly_report(user, fallback=False, force=True)
+    except Exception:
+        # Repli affiché mais pas enregistré : le rapport de la semaine reste à générer
+        return JsonResponse({'status': 'ok', 'report': await sync_to_async(_fallback_report)(user)})
+    await AIReport.objects.aupdate_or_create(user=user, week_start=week_start(), defaults={'content': content})
     return JsonResponse({'status': 'ok', 'report': content})
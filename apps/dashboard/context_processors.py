@@ -7,7 +7,7 @@ def finai_context(request):
     if not request.user.is_authenticated:
         return {'vapid_public_key': getattr(settings, 'VAPID_PUBLIC_KEY', '')}
     stats  = get_monthly_stats(request.user)
-    score  = compute_score(request.user)
+    score  = compute_score(request.user, stats)
     alerts = get_budget_alerts(request.user)
     return {
         'global_stats':    stats,
@@ -1,5 +1,5 @@
 """Tests — app dashboard."""
-from django.test import TestCase, Client
+from django.test import TestCase, Client, override_settings
 from django.urls import reverse
 from apps.accounts.models import User
 
@@ -34,3 +34,19 @@ class DashboardViewsTest(TestCase):
         self.client.login(username='alice', password='pass123')
         r = self.client.get(reverse('dashboard:pwa'))
         self.assertEqual(r.status_code, 200)
+
+    @override_settings(DEBUG=True)
+    def test_services_memoized_within_request(self):
+        self.client.login(username='alice', password='pass123')
+        r = self.client.get(reverse('dashboard:home'))
+        counters = dict(part.split('=') for part in r['X-FinAI-Memo'].split('; '))
+        self.assertGreater(int(counters['hits']), 0)
+
+    def test_cache_stats_staff_only(self):
+        self.client.login(username='alice', password='pass123')
+        r = self.client.get(reverse('dashboard:cache_stats'))
+        self.assertEqual(r.status_code, 302)
+        self.user.is_staff = True
+        self.user.save()
+        r = self.client.get(reverse('dashboard:cache_stats'))
+        self.assertIn('hit_ratio', r.json())
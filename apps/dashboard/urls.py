@@ -10,4 +10,5 @@ urlpatterns = [
     path('mobile/',      views.pwa_force,   name='pwa'),
     path('offline/',     views.offline,     name='offline'),
     path('simulateur/',  views.simulateur,  name='simulateur'),
+    path('sante/cache/', views.cache_stats, name='cache_stats'),
 ]
@@ -1,12 +1,14 @@
 import json
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse
 from apps.transactions.models import Transaction
 from apps.transactions.services import (
     get_monthly_stats, get_monthly_series,
     get_expense_by_category, detect_leaks, compute_score
 )
-from apps.ai_advisor.services import predictions
+from apps.ai_advisor.services import cached_predictions
 
 
 def _is_mobile(request):
@@ -23,12 +25,12 @@ def home(request):
     mobile = _is_mobile(request)
 
     stats      = get_monthly_stats(request.user)
-    score      = compute_score(request.user)
+    score      = compute_score(request.user, stats)
     series     = get_monthly_series(request.user)
     leaks      = detect_leaks(request.user)
     cat_rows   = list(get_expense_by_category(request.user))
     recent_txs = Transaction.objects.filter(user=request.user).select_related('category')[:6]
-    preds      = predictions(request.user)
+    preds      = cached_predictions(request.user)   # calculées par le worker (apps/jobs)
 
     score_offset = int(239 - (score['total'] / 100 * 239))
     cat_data = [{'label': r['category__name'] or 'Divers', 'total': int(r['total'])} for r in cat_rows]
@@ -49,7 +51,7 @@ def home(request):
 @login_required
 def pwa_force(request):
     stats  = get_monthly_stats(request.user)
-    score  = compute_score(request.user)
+    score  = compute_score(request.user, stats)
     series = get_monthly_series(request.user)
     leaks  = detect_leaks(request.user)
     return render(request, 'dashboard/pwa.html', {
@@ -70,3 +72,10 @@ def simulateur(request):
     return render(request, template, {
         'invest_capacity': int(stats['invest_capacity']),
     })
+
+
+@staff_member_required
+def cache_stats(request):
+    """Supervision : taux de succès du cache des stats (tous workers confondus)."""
+    from apps.transactions.stats_cache import hit_ratio
+    return JsonResponse(hit_ratio())
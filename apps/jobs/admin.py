@@ -0,0 +1,25 @@
+from django.contrib import admin, messages
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display  = ('id', 'type', 'status', 'priority', 'attempts', 'run_at', 'locked_by', 'finished_at')
+    list_filter   = ('status', 'type')
+    search_fields = ('type', 'key')
+    actions       = ['retry']
+
+    @admin.action(description='Relancer les tâches sélectionnées')
+    def retry(self, request, queryset):
+        try:
+            with transaction.atomic():
+                n = queryset.exclude(status=Job.STATUS_RUNNING).update(
+                    status=Job.STATUS_PENDING, active_key=F('key'), attempts=0, run_at=timezone.now(),
+                    locked_by='', locked_at=None, finished_at=None)
+        except IntegrityError:
+            self.message_user(request, 'Une tâche de même clé est déjà en file.', messages.ERROR)
+            return
+        self.message_user(request, f'{n} tâche(s) remise(s) en file.')
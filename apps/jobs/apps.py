@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+from django.utils.module_loading import autodiscover_modules
+
+
+class JobsConfig(AppConfig):
+    name         = 'apps.jobs'
+    verbose_name = 'Tâches de fond'
+
+    def ready(self):
+        # Gestionnaires déclarés dans le module jobs.py de chaque application
+        autodiscover_modules('jobs')
@@ -0,0 +1,47 @@
+"""
+Management command : exécute les tâches de fond en file (modèle Job).
+Plusieurs workers peuvent tourner en parallèle, sur une ou plusieurs machines.
+Usage : python manage.py run_worker [--once] [--batch 10] [--sleep 2] [--types ai.weekly_report,ai.predictions]
+"""
+import signal
+import time
+from django.core.management.base import BaseCommand
+from apps.jobs import queue
+
+
+class Command(BaseCommand):
+    help = 'Exécute les tâches de fond en attente'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Vide la file puis s'arrête")
+        parser.add_argument('--batch', type=int, default=10, help='Tâches réservées par passage')
+        parser.add_argument('--sleep', type=float, default=2.0, help='Pause (s) quand la file est vide')
+        parser.add_argument('--types', default='', help='Types de tâches à traiter, séparés par des virgules')
+        parser.add_argument('--purge-days', type=int, default=7, help='Conservation des tâches terminées (jours)')
+
+    def handle(self, *args, **options):
+        worker = queue.worker_name()
+        types  = [t.strip() for t in options['types'].split(',') if t.strip()] or None
+        stop   = []
+        # Arrêt propre (systemd, déploiement) : la tâche en cours se termine
+        signal.signal(signal.SIGTERM, lambda *_: stop.append(True))
+
+        purged = queue.purge(options['purge_days'])
+        if purged:
+            self.stdout.write(f'{purged} tâche(s) terminée(s) supprimée(s).')
+        totals = {}
+        try:
+            while not stop:
+                counts = queue.work(worker, batch=max(1, options['batch']), types=types)
+                for status, n in counts.items():
+                    totals[status] = totals.get(status, 0) + n
+                if counts:
+                    self.stdout.write(' · '.join(f'{s}: {n}' for s, n in sorted(counts.items())))
+                    continue
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+        except KeyboardInterrupt:
+            pass
+        summary = ', '.join(f'{n} {s}' for s, n in sorted(totals.items())) or 'file vide'
+        self.stdout.write(self.style.SUCCESS(f'✅ {worker} : {summary}.'))
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:33
+
+from django.db import migrations, models
+
+
+def fill_active_key(apps, schema_editor):
+    """Clé des tâches actives ; un doublon (contrainte partielle ignorée par MySQL) reste sans clé."""
+    Job = apps.get_model('jobs', 'Job')
+    seen = set()
+    rows = (Job.objects.filter(status__in=['pending', 'running'], key__isnull=False).exclude(key='')
+            .order_by('id').only('id', 'key'))
+    for job in rows:
+        if job.key in seen:
+            continue
+        seen.add(job.key)
+        Job.objects.filter(pk=job.pk).update(active_key=job.key)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobs', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='active_key',
+            field=models.CharField(blank=True, editable=False, max_length=120, null=True),
+        ),
+        migrations.RunPython(fill_active_key, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='job',
+            name='active_key',
+            field=models.CharField(blank=True, editable=False, max_length=120, null=True, unique=True),
+        ),
+        migrations.RemoveConstraint(
+            model_name='job',
+            name='job_active_key_uniq',
+        ),
+    ]
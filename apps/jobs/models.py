@@ -0,0 +1,49 @@
+from django.db import models
+from django.utils import timezone
+
+
+class Job(models.Model):
+    """Tâche de fond stockée en base, exécutée par la commande run_worker (voir queue.py)."""
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE    = 'done'
+    STATUS_FAILED  = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'En attente'),
+        (STATUS_RUNNING, 'En cours'),
+        (STATUS_DONE,    'Terminée'),
+        (STATUS_FAILED,  'Échec'),
+    ]
+    ACTIVE = (STATUS_PENDING, STATUS_RUNNING)
+
+    # Plus petit = plus urgent
+    PRIORITY_HIGH   = 0
+    PRIORITY_NORMAL = 5
+    PRIORITY_LOW    = 9
+
+    type         = models.CharField(max_length=64)
+    payload      = models.JSONField(default=dict, blank=True)
+    priority     = models.PositiveSmallIntegerField(default=PRIORITY_NORMAL)
+    status       = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    key          = models.CharField('Clé de déduplication', max_length=120, null=True, blank=True)
+    # Copie de ``key`` tant que la tâche est active, NULL ensuite : une seule tâche active par clé
+    # (contrainte unique simple — les contraintes partielles sont ignorées par MySQL)
+    active_key   = models.CharField(max_length=120, null=True, blank=True, unique=True, editable=False)
+    attempts     = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    run_at       = models.DateTimeField(default=timezone.now)
+    locked_by    = models.CharField(max_length=100, blank=True)
+    locked_at    = models.DateTimeField(null=True, blank=True)
+    last_error   = models.TextField(blank=True)
+    created_at   = models.DateTimeField(auto_now_add=True)
+    finished_at  = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering     = ['priority', 'run_at', 'id']
+        verbose_name = 'Tâche de fond'
+        indexes      = [
+            models.Index(fields=['status', 'priority', 'run_at', 'id'], name='job_ready_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.type} #{self.pk} ({self.status})'
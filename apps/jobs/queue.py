@@ -0,0 +1,153 @@
+"""
+File de tâches de fond stockée en base (modèle Job), sans broker.
+
+Les applications déclarent leurs gestionnaires dans leur module ``jobs.py`` :
+
+    @queue.handler('ai.weekly_report')
+    def weekly_report(user_id, week_start): ...
+
+et mettent des tâches en file avec ``queue.enqueue('ai.weekly_report', {...})``. La commande
+run_worker les exécute, par priorité puis par date ; plusieurs workers, sur plusieurs machines,
+peuvent tourner en même temps : chaque tâche est réservée par un seul d'entre eux
+(SELECT … FOR UPDATE SKIP LOCKED sous PostgreSQL/MySQL 8, mise à jour conditionnelle sinon).
+Échec : nouvel essai après un délai croissant (30 s, 1 min, 2 min…), jusqu'à ``max_attempts``.
+"""
+import logging
+import os
+import socket
+import traceback
+import uuid
+from datetime import timedelta
+from django.db import connection, transaction, IntegrityError
+from django.db.models import F, Q
+from django.utils import timezone
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+BACKOFF_BASE = 30            # secondes, doublé à chaque échec
+BACKOFF_MAX  = 6 * 3600
+STALE_AFTER  = 600           # tâche « en cours » depuis 10 min : worker interrompu
+
+_handlers = {}
+
+
+class UnknownJobType(Exception):
+    """Aucun gestionnaire déclaré pour ce type de tâche."""
+
+
+def handler(type_):
+    """Décorateur : déclare ``fn(**payload)`` comme gestionnaire des tâches ``type_``."""
+    def register(fn):
+        _handlers[type_] = fn
+        return fn
+    return register
+
+
+def enqueue(type_, payload=None, priority=Job.PRIORITY_NORMAL, delay=0, key=None, max_attempts=5, cooldown=0):
+    """
+    Met une tâche en file et la retourne. Avec ``key``, tant qu'une tâche de même clé est en attente
+    ou en cours, aucune nouvelle n'est créée : la tâche existante est retournée. ``cooldown`` (s) :
+    de même pendant ce délai après l'échec définitif d'une tâche de même clé (service en panne).
+    """
+    if type_ not in _handlers:
+        raise UnknownJobType(type_)
+    if key:
+        blocking = Q(status__in=Job.ACTIVE)
+        if cooldown:
+            blocking |= Q(status=Job.STATUS_FAILED, finished_at__gte=timezone.now() - timedelta(seconds=cooldown))
+        existing = Job.objects.filter(blocking, key=key).order_by('-id').first()
+        if existing:
+            return existing
+    try:
+        with transaction.atomic():
+            return Job.objects.create(
+                type=type_, payload=payload or {}, priority=priority, key=key, active_key=key or None,
+                max_attempts=max_attempts, run_at=timezone.now() + timedelta(seconds=delay),
+            )
+    except IntegrityError:
+        if not key:
+            raise
+        # Même clé mise en file au même instant par une autre requête
+        return Job.objects.filter(key=key, status__in=Job.ACTIVE).first()
+
+
+def worker_name():
+    return f'{socket.gethostname()[:60]}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+
+
+def backoff(attempts):
+    """Délai (s) avant le nouvel essai qui suit la tentative n° ``attempts``."""
+    return min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX)
+
+
+def recover(stale_after=STALE_AFTER):
+    """Tâches réservées par un worker interrompu : remises en file, ou en échec si essais épuisés."""
+    stale = Job.objects.filter(status=Job.STATUS_RUNNING,
+                               locked_at__lt=timezone.now() - timedelta(seconds=stale_after))
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status=Job.STATUS_FAILED, active_key=None, finished_at=timezone.now(), last_error='Worker interrompu')
+    return failed + stale.update(status=Job.STATUS_PENDING, locked_by='', locked_at=None)
+
+
+def claim(worker, limit=10, types=None):
+    """Réserve jusqu'à ``limit`` tâches échues pour ``worker`` ; aucune autre réservation ne les obtient."""
+    now = timezone.now()
+    with transaction.atomic():
+        qs = (Job.objects.filter(status=Job.STATUS_PENDING, run_at__lte=now)
+              .order_by('priority', 'run_at', 'id'))
+        if types:
+            qs = qs.filter(type__in=types)
+        if connection.features.has_select_for_update_skip_locked:
+            # Les workers concurrents se partagent la file sans s'attendre
+            qs = qs.select_for_update(skip_locked=True)
+        ids = list(qs.values_list('id', flat=True)[:limit])
+        if not ids:
+            return []
+        # Sans verrou de ligne (SQLite), le filtre sur le statut départage les workers
+        Job.objects.filter(id__in=ids, status=Job.STATUS_PENDING).update(
+            status=Job.STATUS_RUNNING, locked_by=worker, locked_at=now, attempts=F('attempts') + 1)
+    return list(Job.objects.filter(id__in=ids, status=Job.STATUS_RUNNING, locked_by=worker)
+                .order_by('priority', 'run_at', 'id'))
+
+
+def run(job):
+    """Exécute une tâche réservée. Retourne son statut : done, pending (nouvel essai) ou failed."""
+    mine = Job.objects.filter(pk=job.pk, locked_by=job.locked_by)
+    try:
+        fn = _handlers.get(job.type)
+        if fn is None:
+            raise UnknownJobType(job.type)
+        fn(**job.payload)
+    except Exception as exc:
+        error = traceback.format_exc()[-4000:]
+        if isinstance(exc, UnknownJobType) or job.attempts >= job.max_attempts:
+            status = Job.STATUS_FAILED
+            mine.update(status=status, active_key=None, finished_at=timezone.now(), last_error=error)
+        else:
+            status = Job.STATUS_PENDING
+            mine.update(status=status, locked_by='', locked_at=None, last_error=error,
+                        run_at=timezone.now() + timedelta(seconds=backoff(job.attempts)))
+        logger.warning('Tâche %s #%s : échec (essai %s/%s) — %s', job.type, job.pk, job.attempts,
+                       job.max_attempts, exc)
+        return status
+    mine.update(status=Job.STATUS_DONE, active_key=None, finished_at=timezone.now(), locked_by='',
+                locked_at=None)
+    return Job.STATUS_DONE
+
+
+def work(worker=None, batch=10, types=None):
+    """Un passage : réserve un lot et l'exécute. Retourne le nombre de tâches par statut final."""
+    worker = worker or worker_name()
+    recover()
+    counts = {}
+    for job in claim(worker, limit=batch, types=types):
+        status = run(job)
+        counts[status] = counts.get(status, 0) + 1
+    return counts
+
+
+def purge(days=7):
+    """Supprime les tâches terminées depuis plus de ``days`` jours (les échecs sont conservés)."""
+    cutoff = timezone.now() - timedelta(days=days)
+    return Job.objects.filter(status=Job.STATUS_DONE, finished_at__lt=cutoff).delete()[0]
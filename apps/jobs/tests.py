@@ -0,0 +1,92 @@
+"""Tests — app jobs."""
+from datetime import timedelta
+from io import StringIO
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from . import queue
+from .models import Job
+
+CALLS = []
+
+
+@queue.handler('tests.record')
+def _record(value, fail=0):
+    CALLS.append(value)
+    if CALLS.count(value) <= fail:
+        raise RuntimeError(f'échec {value}')
+
+
+class JobQueueTest(TestCase):
+
+    def setUp(self):
+        CALLS.clear()
+
+    def test_priority_then_date(self):
+        queue.enqueue('tests.record', {'value': 'lent'}, priority=Job.PRIORITY_LOW)
+        queue.enqueue('tests.record', {'value': 'a'})
+        queue.enqueue('tests.record', {'value': 'urgent'}, priority=Job.PRIORITY_HIGH)
+        queue.enqueue('tests.record', {'value': 'plus tard'}, delay=3600)
+        self.assertEqual(queue.work(), {'done': 3})
+        self.assertEqual(CALLS, ['urgent', 'a', 'lent'])
+        self.assertEqual(Job.objects.filter(status=Job.STATUS_PENDING).count(), 1)
+
+    def test_dedup_key(self):
+        first = queue.enqueue('tests.record', {'value': 1}, key='k')
+        self.assertEqual(queue.enqueue('tests.record', {'value': 2}, key='k'), first)
+        queue.work()
+        # Tâche terminée : la clé est de nouveau libre
+        self.assertNotEqual(queue.enqueue('tests.record', {'value': 3}, key='k'), first)
+        with self.assertRaises(queue.UnknownJobType):
+            queue.enqueue('tests.inconnu')
+
+    def test_active_key_is_a_plain_unique_column(self):
+        from django.db import IntegrityError, transaction
+        job = queue.enqueue('tests.record', {'value': 'x', 'fail': 9}, key='k', max_attempts=1)
+        self.assertEqual(job.active_key, 'k')
+        # Garde indépendante du moteur : un second INSERT actif de même clé est refusé
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Job.objects.create(type='tests.record', key='k', active_key='k')
+        with self.assertLogs('apps.jobs.queue', 'WARNING'):
+            self.assertEqual(queue.work(), {'failed': 1})
+        job.refresh_from_db()
+        self.assertIsNone(job.active_key)
+        again = queue.enqueue('tests.record', {'value': 'y'}, key='k')
+        queue.work()
+        again.refresh_from_db()
+        self.assertEqual((again.status, again.active_key), (Job.STATUS_DONE, None))
+
+    def test_retry_with_backoff_then_fail(self):
+        job = queue.enqueue('tests.record', {'value': 'x', 'fail': 9}, max_attempts=2)
+        with self.assertLogs('apps.jobs.queue', 'WARNING'):
+            self.assertEqual(queue.work(), {'pending': 1})
+        job.refresh_from_db()
+        self.assertEqual(job.attempts, 1)
+        self.assertIn('RuntimeError: échec x', job.last_error)
+        self.assertAlmostEqual((job.run_at - timezone.now()).total_seconds(), queue.BACKOFF_BASE, delta=5)
+        self.assertEqual(queue.work(), {})                      # pas encore échue
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        with self.assertLogs('apps.jobs.queue', 'WARNING'):
+            self.assertEqual(queue.work(), {'failed': 1})
+        self.assertEqual([queue.backoff(n) for n in (1, 2, 3)], [30, 60, 120])
+
+    def test_claim_is_exclusive_and_stale_locks_recovered(self):
+        for i in range(3):
+            queue.enqueue('tests.record', {'value': i})
+        first  = queue.claim('w1', limit=2)
+        second = queue.claim('w2', limit=5)
+        self.assertEqual(len(first), 2)
+        self.assertEqual(len(second), 1)
+        self.assertFalse({j.pk for j in first} & {j.pk for j in second})
+        self.assertEqual(queue.claim('w3'), [])
+        # w1 est mort : ses tâches reviennent en file après STALE_AFTER
+        Job.objects.filter(locked_by='w1').update(locked_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(queue.recover(), 2)
+        self.assertEqual(len(queue.claim('w3')), 2)
+
+    def test_run_worker_command(self):
+        queue.enqueue('tests.record', {'value': 'cmd'})
+        out = StringIO()
+        call_command('run_worker', once=True, stdout=out)
+        self.assertIn('1 done', out.getvalue())
+        self.assertEqual(CALLS, ['cmd'])
@@ -1,5 +1,8 @@
 from django.contrib import admin
-from .models import Transaction, Category, BudgetLimit, PatrimoineEntry
+from .models import (
+    Transaction, Category, BudgetLimit, PatrimoineEntry, MonthlyRollup, SmsDevice, SmsInbox, CategoryRule,
+    RecurringSeries, NetWorthSnapshot,
+)
 
 
 @admin.register(Category)
@@ -27,3 +30,45 @@ class PatrimoineEntryAdmin(admin.ModelAdmin):
     list_filter    = ('ptype', 'category')
     search_fields  = ('label', 'user__username')
     date_hierarchy = 'date'
+
+
+@admin.register(MonthlyRollup)
+class MonthlyRollupAdmin(admin.ModelAdmin):
+    list_display = ('user', 'year', 'month', 'type', 'category', 'total', 'count')
+    list_filter  = ('type', 'year')
+
+
+@admin.register(SmsDevice)
+class SmsDeviceAdmin(admin.ModelAdmin):
+    list_display    = ('user', 'name', 'key_id', 'is_active', 'last_seen')
+    list_filter     = ('is_active',)
+    readonly_fields = ('key_id', 'secret')
+
+
+@admin.register(SmsInbox)
+class SmsInboxAdmin(admin.ModelAdmin):
+    list_display  = ('user', 'idempotency_key', 'status', 'received_at', 'transaction')
+    list_filter   = ('status',)
+    search_fields = ('idempotency_key', 'user__username')
+    raw_id_fields = ('transaction',)
+
+
+
+@admin.register(CategoryRule)
+class CategoryRuleAdmin(admin.ModelAdmin):
+    list_display  = ('user', 'pattern', 'category', 'priority')
+    list_filter   = ('category',)
+    search_fields = ('pattern', 'user__username')
+
+
+@admin.register(RecurringSeries)
+class RecurringSeriesAdmin(admin.ModelAdmin):
+    list_display  = ('user', 'label', 'type', 'amount', 'period', 'occurrences', 'next_date', 'is_active')
+    list_filter   = ('period', 'type', 'is_active')
+    search_fields = ('label', 'key', 'user__username')
+
+
+@admin.register(NetWorthSnapshot)
+class NetWorthSnapshotAdmin(admin.ModelAdmin):
+    list_display = ('user', 'month', 'actifs', 'passifs', 'net')
+    list_filter  = ('month',)
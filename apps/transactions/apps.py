@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class TransactionsConfig(AppConfig):
+    name = 'apps.transactions'
+
+    def ready(self):
+        from . import signals  # noqa: F401
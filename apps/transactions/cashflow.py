@@ -0,0 +1,129 @@
+"""
+Solde courant et calendrier de trésorerie, calculés par fonctions de fenêtre SQL.
+
+Le solde est le solde d'ouverture (mois complets lus dans MonthlyRollup, plus les jours du mois
+entamé) augmenté de la somme cumulée (``SUM(...) OVER (ORDER BY date, created_at, id)``) des
+opérations réelles de la plage affichée : le coût ne dépend pas de la taille du journal. Le
+calendrier le prolonge jour par jour avec les dépenses et revenus planifiés à venir.
+"""
+from datetime import date, timedelta
+from decimal import Decimal
+from django.db import connection
+from django.db.models import Case, When, F, Q, Sum, Min, Max, Value, Window, DecimalField
+from .models import Transaction, MonthlyRollup
+from .memo import request_memo
+from .stats_cache import ledger_cached
+from .services import REAL_TYPES
+
+MAX_DAYS = 366
+
+_EXPENSES = (Transaction.TYPE_EXPENSE, Transaction.TYPE_PLANNED_EXPENSE)
+_PLANNED  = (Transaction.TYPE_PLANNED_INCOME, Transaction.TYPE_PLANNED_EXPENSE)
+# Montant signé : dépenses (réelles ou planifiées) en négatif
+SIGNED = Case(When(type__in=_EXPENSES, then=-F('amount')), default=F('amount'),
+              output_field=DecimalField(max_digits=15, decimal_places=0))
+_ORDER = [F('date').asc(), F('created_at').asc(), F('id').asc()]
+
+
+def _running(user, date_from, date_to):
+    return (Transaction.objects
+            .filter(user=user, type__in=REAL_TYPES, date__gte=date_from, date__lte=date_to)
+            .annotate(balance=Window(Sum(SIGNED), order_by=_ORDER))
+            .values('id', 'balance')
+            .order_by())
+
+
+def running_balances(user, ids):
+    """
+    Solde après chacune des transactions ``ids`` (page du journal).
+    La fenêtre porte sur toutes les opérations réelles des jours couverts par la page, pour que
+    les filtres de la page ne faussent pas le cumul ; le solde d'ouverture vient des agrégats.
+    """
+    ids = [pk for pk in ids if pk is not None]
+    if not ids:
+        return {}
+    span = Transaction.objects.filter(user=user, pk__in=ids).aggregate(lo=Min('date'), hi=Max('date'))
+    if span['lo'] is None:
+        return {}
+    opening     = opening_balance(user, span['lo'])
+    sql, params = _running(user, span['lo'], span['hi']).query.sql_with_params()
+    marks = ', '.join(['%s'] * len(ids))
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT id, balance FROM ({sql}) AS ledger WHERE id IN ({marks})', [*params, *ids])
+        return {pk: opening + Decimal(balance) for pk, balance in cursor.fetchall()}
+
+
+def opening_balance(user, before):
+    """
+    Solde des opérations réelles antérieures à ``before`` : mois complets lus dans MonthlyRollup,
+    puis jours du mois de ``before`` qui le précèdent (somme bornée à un mois).
+    """
+    months = (MonthlyRollup.objects
+              .filter(user=user, type__in=REAL_TYPES)
+              .filter(Q(year__lt=before.year) | Q(year=before.year, month__lt=before.month))
+              .aggregate(total=Sum(Case(When(type=Transaction.TYPE_EXPENSE, then=-F('total')),
+                                        default=F('total'),
+                                        output_field=DecimalField(max_digits=17, decimal_places=0)))))
+    days = (Transaction.objects
+            .filter(user=user, type__in=REAL_TYPES, date__gte=before.replace(day=1), date__lt=before)
+            .aggregate(total=Sum(SIGNED)))
+    return (months['total'] or Decimal(0)) + (days['total'] or Decimal(0))
+
+
+def _amount_of(*types):
+    return Case(When(type__in=types, then=F('amount')), default=Value(0),
+                output_field=DecimalField(max_digits=15, decimal_places=0))
+
+
+@request_memo
+@ledger_cached
+def get_cashflow_calendar(user, date_from, date_to):
+    """
+    Calendrier de trésorerie jour par jour : entrées, sorties et solde de fin de journée.
+    Jusqu'à aujourd'hui le solde est réel ; au-delà il est projeté avec les opérations planifiées
+    (``projected``). Quatre requêtes, quelle que soit la longueur de la plage.
+    """
+    date_to = min(date_to, date_from + timedelta(days=MAX_DAYS - 1))
+    today   = date.today()
+    opening = opening_balance(user, date_from)
+
+    # Fenêtre ORDER BY date (cadre RANGE) : chaque ligne porte le solde de fin de sa journée
+    day = [F('date')]
+    real = (Transaction.objects
+            .filter(user=user, type__in=REAL_TYPES, date__gte=date_from, date__lte=date_to)
+            .annotate(day_in=Window(Sum(_amount_of(Transaction.TYPE_INCOME)), partition_by=day),
+                      day_out=Window(Sum(_amount_of(Transaction.TYPE_EXPENSE)), partition_by=day),
+                      balance=Window(Sum(SIGNED), order_by=F('date').asc()))
+            .values_list('date', 'day_in', 'day_out', 'balance')
+            .distinct()
+            .order_by('date'))
+    actual = {d: (Decimal(i), Decimal(o), opening + Decimal(b)) for d, i, o, b in real}
+
+    planned = {}
+    for row in (Transaction.objects
+                .filter(user=user, type__in=_PLANNED, date__gte=max(date_from, today), date__lte=date_to)
+                .values('date', 'type').annotate(total=Sum('amount')).order_by()):
+        planned.setdefault(row['date'], {})[row['type']] = row['total']
+
+    days, current = [], date_from
+    real_balance, planned_net = opening, Decimal(0)
+    while current <= date_to:
+        income, expense, closing = actual.get(current, (Decimal(0), Decimal(0), None))
+        expected    = planned.get(current, {})
+        planned_in  = expected.get(Transaction.TYPE_PLANNED_INCOME, Decimal(0))
+        planned_out = expected.get(Transaction.TYPE_PLANNED_EXPENSE, Decimal(0))
+        if closing is not None:
+            real_balance = closing
+        planned_net += planned_in - planned_out
+        balance      = real_balance + planned_net
+        days.append({
+            'date':            current.isoformat(),
+            'income':          int(income),
+            'expense':         int(expense),
+            'planned_income':  int(planned_in),
+            'planned_expense': int(planned_out),
+            'balance':         int(balance),
+            'projected':       current > today,
+        })
+        current += timedelta(days=1)
+    return {'opening': int(opening), 'days': days}
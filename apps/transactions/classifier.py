@@ -0,0 +1,210 @@
+"""
+Catégorisation locale des transactions : tables de fréquence mot → catégorie (Bayes naïf).
+
+Un modèle par utilisateur, appris sur ses propres couples description/catégorie, et un modèle
+global (toutes les données) en repli. Les modèles sont stockés compressés (CategoryModel),
+enrichis au fil de l'eau depuis un filigrane ``updated_at`` et gardés en mémoire par processus.
+Les tables ne savent qu'ajouter : une transaction déjà apprise puis modifiée ou supprimée
+impose de réapprendre le modèle en entier.
+"""
+import json
+import math
+import re
+import threading
+import unicodedata
+import zlib
+from collections import OrderedDict
+from django.conf import settings
+from django.utils import timezone
+from .models import Transaction, TransactionTombstone, Category, CategoryModel
+from .stats_cache import ledger_version
+
+# Mots sans valeur pour distinguer les catégories (libellés générés par l'analyse SMS, liaisons)
+STOPWORDS = frozenset('''
+    a au aux avec de des du en et la le les pour par sur un une via
+    recu recue envoye envoyee paiement transfert retrait depot achat mobile money momo orange mtn
+    from to the of for and fcfa xaf
+'''.split())
+
+_TOKEN = re.compile(r'[a-z][a-z0-9]+')
+_ALPHA = 1.0          # lissage de Laplace
+_CACHE_SIZE = 256     # modèles utilisateurs gardés en mémoire par processus
+
+
+def tokens(text):
+    """Mots normalisés (minuscules, sans accents) d'une description, plus le « marchand » (2 premiers)."""
+    text  = unicodedata.normalize('NFKD', (text or '').lower()).encode('ascii', 'ignore').decode()
+    words = [w for w in _TOKEN.findall(text) if w not in STOPWORDS]
+    if len(words) >= 2:
+        words.append(f'{words[0]}_{words[1]}')
+    return words
+
+
+class Classifier:
+    """Bayes naïf multinomial sur les mots des descriptions."""
+
+    def __init__(self):
+        self.words = {}       # mot → {catégorie: occurrences}
+        self.docs  = {}       # catégorie → transactions apprises
+        self.sizes = {}       # catégorie → mots appris
+
+    def learn(self, text, category_id):
+        key = str(category_id)
+        self.docs[key] = self.docs.get(key, 0) + 1
+        for word in tokens(text):
+            counts = self.words.setdefault(word, {})
+            counts[key] = counts.get(key, 0) + 1
+            self.sizes[key] = self.sizes.get(key, 0) + 1
+
+    @property
+    def samples(self):
+        return sum(self.docs.values())
+
+    def predict(self, text):
+        """(id de catégorie, probabilité) — (None, 0.0) si aucun mot connu."""
+        known = [self.words[w] for w in tokens(text) if w in self.words]
+        if not known:
+            return None, 0.0
+        total = self.samples
+        vocab = len(self.words)
+        # Seules les catégories vues avec ces mots peuvent l'emporter
+        scores = {}
+        for key in {k for counts in known for k in counts}:
+            denom = self.sizes[key] + _ALPHA * vocab
+            score = math.log(self.docs[key] / total)
+            for counts in known:
+                score += math.log((counts.get(key, 0) + _ALPHA) / denom)
+            scores[key] = score
+        best = max(scores, key=scores.get)
+        top  = scores[best]
+        prob = 1 / sum(math.exp(s - top) for s in scores.values())
+        return int(best), prob
+
+    def dumps(self):
+        return zlib.compress(json.dumps([self.words, self.docs, self.sizes], separators=(',', ':')).encode())
+
+    @classmethod
+    def loads(cls, blob):
+        clf = cls()
+        if blob:
+            clf.words, clf.docs, clf.sizes = json.loads(zlib.decompress(bytes(blob)))
+        return clf
+
+
+# ── Apprentissage et persistance ─────────────────────────────────────────────
+
+def _labelled(user=None, since=None):
+    qs = Transaction.objects.filter(category__isnull=False)
+    if user is not None:
+        qs = qs.filter(user=user)
+    if since is not None:
+        qs = qs.filter(updated_at__gt=since)
+    return qs.order_by().values_list('description', 'category_id', 'updated_at').iterator(chunk_size=2000)
+
+
+def _unlearned(user, since):
+    """Transactions antérieures au filigrane modifiées ou supprimées depuis : leur ancien libellé est appris."""
+    edited  = Transaction.objects.filter(created_at__lte=since, updated_at__gt=since)
+    deleted = TransactionTombstone.objects.filter(deleted_at__gt=since)
+    if user is not None:
+        edited, deleted = edited.filter(user=user), deleted.filter(user=user)
+    return edited.exists() or deleted.exists()
+
+
+def train(user=None, rebuild=False):
+    """
+    Complète le modèle d'un utilisateur — ou le modèle global si ``user`` est None — avec les
+    transactions catégorisées créées depuis le dernier apprentissage. Le modèle est reconstruit
+    si ``rebuild`` ou si des transactions déjà apprises ont été modifiées ou supprimées depuis.
+    """
+    row = CategoryModel.objects.filter(user=user).first()
+    if row is not None and row.trained_until is not None and not rebuild:
+        rebuild = _unlearned(user, row.trained_until)
+    if row is None or rebuild:
+        clf, since = Classifier(), None
+    else:
+        clf, since = Classifier.loads(row.data), row.trained_until
+    version = ledger_version(user.pk) if user is not None else 0
+
+    watermark, learned = since, 0
+    for description, category_id, updated_at in _labelled(user, since):
+        clf.learn(description, category_id)
+        learned += 1
+        watermark = updated_at if watermark is None else max(watermark, updated_at)
+
+    if row is None or rebuild or learned:
+        CategoryModel.objects.update_or_create(user=user, defaults={
+            'data':           clf.dumps(),
+            'samples':        clf.samples,
+            'trained_until':  watermark,
+            'ledger_version': version,
+        })
+    elif row.ledger_version != version:
+        CategoryModel.objects.filter(pk=row.pk).update(ledger_version=version)
+    forget(user)
+    return clf
+
+
+_lock   = threading.Lock()
+_models = OrderedDict()        # user_id | None → (version, Classifier)
+
+
+def _model(user):
+    """Modèle en mémoire, rafraîchi quand le journal de l'utilisateur a changé."""
+    key     = user.pk if user is not None else None
+    version = ledger_version(user.pk) if user is not None else _global_version()
+    with _lock:
+        cached = _models.get(key)
+        if cached and cached[0] == version:
+            _models.move_to_end(key)
+            return cached[1]
+
+    row = CategoryModel.objects.filter(user=user).first()
+    if user is None or (row and row.ledger_version == version):
+        clf = Classifier.loads(row.data if row else None)
+    else:
+        clf = train(user)
+    with _lock:
+        _models[key] = (version, clf)
+        while len(_models) > _CACHE_SIZE:
+            _models.popitem(last=False)
+    return clf
+
+
+def _global_version():
+    # Le modèle global est réappris par la commande train_classifier ; relu au plus toutes les 10 min
+    return int(timezone.now().timestamp() // 600)
+
+
+class Predictor:
+    """
+    Catégorie la plus probable pour une description : modèle de l'utilisateur d'abord, modèle global
+    en repli, retenue au-dessus du seuil CLASSIFIER_MIN_CONFIDENCE. Modèles chargés une fois par instance.
+    """
+
+    def __init__(self, user):
+        self.models    = (_model(user), _model(None))
+        self.threshold = settings.CLASSIFIER_MIN_CONFIDENCE
+        self.slugs     = dict(Category.objects.values_list('id', 'slug'))
+
+    def __call__(self, text):
+        """Id de catégorie, ou None."""
+        for clf in self.models:
+            category_id, prob = clf.predict(text)
+            if category_id in self.slugs and prob >= self.threshold:
+                return category_id
+        return None
+
+    def slug(self, text):
+        return self.slugs.get(self(text))
+
+
+def predict(user, text):
+    """Id de la catégorie proposée pour ``text``, ou None."""
+    return Predictor(user)(text)
+
+
+def forget(user=None):
+    """Retire un modèle du cache mémoire (après réapprentissage)."""
+    with _lock:
+        _models.pop(user.pk if user is not None else None, None)
@@ -0,0 +1,341 @@
+"""
+Import en masse du journal : CSV (format produit par export_csv) et relevés OFX.
+Lecture en flux, écriture par lots (bulk_create) — chaque lot dans sa transaction.
+"""
+import csv
+import io
+import re
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from django.db import transaction, IntegrityError
+from django.utils.dateparse import parse_date
+from .models import Transaction, Category, sms_digest
+from .services import parse_sms
+from .rules import Categorizer
+
+IMPORT_BATCH_SIZE = 1000
+
+CSV_HEADER = ['Date', 'Type', 'Montant (FCFA)', 'Description', 'Catégorie', 'Source', 'Notes']
+
+_DESCRIPTION_MAX = Transaction._meta.get_field('description').max_length
+
+
+class RowError(Exception):
+    """Ligne rejetée — le message est présenté tel quel à l'utilisateur."""
+
+
+class ImportReport:
+    """Bilan d'un import : lignes créées et erreurs par numéro de ligne."""
+
+    MAX_ERRORS = 200
+
+    def __init__(self):
+        self.created  = 0
+        self.rejected = 0
+        self.errors   = []
+
+    def error(self, line, message):
+        self.rejected += 1
+        if len(self.errors) < self.MAX_ERRORS:
+            self.errors.append((line, message))
+
+    def as_dict(self):
+        return {
+            'created':  self.created,
+            'rejected': self.rejected,
+            'errors':   [{'line': line, 'message': message} for line, message in self.errors],
+        }
+
+
+class CategoryLookup:
+    """Nom (ou slug) de catégorie → id, chargé une seule fois par import."""
+
+    def __init__(self):
+        self._ids = {}
+        for pk, name, slug in Category.objects.values_list('id', 'name', 'slug'):
+            self._ids.setdefault(name.strip().lower(), pk)
+            self._ids.setdefault(slug, pk)
+
+    # Écrit par export_csv pour une transaction sans catégorie : laissé aux règles et au classifieur
+    UNCATEGORIZED = 'divers'
+
+    def __call__(self, name):
+        key = (name or '').strip().lower()
+        # Inconnue ou « Divers » (même si la catégorie existe) : sans catégorie
+        return None if key == self.UNCATEGORIZED else self._ids.get(key)
+
+
+def _parse_amount(raw):
+    cleaned = re.sub(r'[\s  ]|FCFA|XOF|F$', '', str(raw or ''), flags=re.I).replace(',', '.')
+    try:
+        amount = Decimal(cleaned)
+    except InvalidOperation:
+        raise RowError(f'Montant invalide : {raw!r}')
+    if not amount.is_finite():
+        raise RowError(f'Montant invalide : {raw!r}')
+    return amount
+
+
+def _parse_date(raw):
+    raw = (raw or '').strip()
+    for fmt in ('%d/%m/%Y', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(raw, fmt).date()
+        except ValueError:
+            continue
+    raise RowError(f'Date invalide : {raw!r}')
+
+
+def _by_label(choices):
+    table = {}
+    for code, label in choices:
+        table[code] = code
+        table[label.lower()] = code
+    return table
+
+
+_TYPES   = _by_label(Transaction.TYPE_CHOICES)
+_SOURCES = _by_label(Transaction.SOURCE_CHOICES)
+
+
+# ── Lecteurs : produisent (numéro de ligne, dict | RowError) ─────────────
+
+def read_csv(lines):
+    """Lit le CSV d'export_csv (séparateur « ; », BOM toléré). ``lines`` : itérable de str."""
+    reader = csv.reader(lines, delimiter=';')
+    header = next(reader, None)
+    if header is None:
+        return
+    header = [h.lstrip('﻿').strip() for h in header]
+    if header[:4] != CSV_HEADER[:4]:
+        yield 1, RowError('En-tête inattendu : utilisez le format de l’export CSV FinAI.')
+        return
+    for row in reader:
+        line = reader.line_num
+        if not any(cell.strip() for cell in row):
+            continue
+        row = (row + [''] * len(CSV_HEADER))[:len(CSV_HEADER)]
+        d, type_label, amount, description, category, source, notes = row
+        try:
+            type_ = _TYPES.get(type_label.strip().lower())
+            if not type_:
+                raise RowError(f'Type inconnu : {type_label!r}')
+            yield line, {
+                'date':        _parse_date(d),
+                'type':        type_,
+                'amount':      _parse_amount(amount),
+                'description': description.strip(),
+                'category':    category,
+                'source':      _SOURCES.get(source.strip().lower()),
+                'notes':       notes,
+            }
+        except RowError as exc:
+            yield line, exc
+
+
+_OFX_TAG = re.compile(r'<(\w+)>([^<\r\n]*)')
+
+
+def _ofx_record(fields):
+    posted = fields.get('DTPOSTED', '')
+    try:
+        d = date(int(posted[:4]), int(posted[4:6]), int(posted[6:8]))
+    except ValueError:
+        raise RowError(f'Date OFX invalide : {posted!r}')
+    amount = _parse_amount(fields.get('TRNAMT'))
+    name   = fields.get('NAME', '').strip()
+    memo   = fields.get('MEMO', '').strip()
+    return {
+        'date':        d,
+        'type':        Transaction.TYPE_EXPENSE if amount < 0 else Transaction.TYPE_INCOME,
+        'amount':      abs(amount),
+        'description': name or memo,
+        'category':    '',
+        'source':      Transaction.SOURCE_IMPORT,
+        'notes':       memo if name and memo != name else '',
+    }
+
+
+def read_ofx(lines):
+    """Lit les blocs STMTTRN d'un relevé OFX (SGML 1.x ou XML 2.x), bloc par bloc."""
+    fields, start = None, 0
+    for line_no, text in enumerate(lines, 1):
+        for tag, value in _OFX_TAG.findall(text):
+            tag = tag.upper()
+            if tag == 'STMTTRN':
+                fields, start = {}, line_no
+            elif fields is not None:
+                fields[tag] = value.strip()
+        if fields is not None and re.search(r'</STMTTRN>', text, re.I):
+            try:
+                yield start, _ofx_record(fields)
+            except RowError as exc:
+                yield start, exc
+            fields = None
+
+
+def detect_format(name, head):
+    """'ofx' ou 'csv' d'après l'extension, sinon d'après le début du fichier."""
+    if (name or '').lower().endswith(('.ofx', '.qfx')):
+        return 'ofx'
+    if 'OFXHEADER' in head or '<OFX>' in head.upper():
+        return 'ofx'
+    return 'csv'
+
+
+def text_lines(binary, encoding='utf-8-sig'):
+    """Fichier binaire (upload, open('rb')) → lignes de texte, sans tout charger en mémoire."""
+    return io.TextIOWrapper(binary, encoding=encoding, errors='replace', newline='')
+
+
+# ── Écriture ─────────────────────────────────────────────────────────────────
+
+def _build(user, record, categories, guess):
+    if not record['description']:
+        raise RowError('Description manquante')
+    if record['amount'] <= 0:
+        raise RowError('Le montant doit être positif')
+    # Catégorie absente ou inconnue (relevé OFX, colonne vide) : règles, puis classifieur local
+    name        = record['category'].strip()
+    category_id = categories(name) if name else None
+    if category_id is None:
+        category_id = guess(record['description'])
+    return Transaction(
+        user=user,
+        date=record['date'],
+        type=record['type'],
+        amount=record['amount'].quantize(Decimal('1')),
+        description=record['description'][:_DESCRIPTION_MAX],
+        category_id=category_id,
+        source=record['source'] or Transaction.SOURCE_IMPORT,
+        notes=record['notes'] or '',
+    )
+
+
+def _flush(batch, report):
+    if not batch:
+        return
+    with transaction.atomic():
+        Transaction.objects.bulk_create(batch)
+    report.created += len(batch)
+    batch.clear()
+
+
+def import_records(user, records, batch_size=IMPORT_BATCH_SIZE):
+    """Écrit les enregistrements d'un lecteur (read_csv / read_ofx) par lots de ``batch_size``."""
+    report     = ImportReport()
+    categories = CategoryLookup()
+    guess      = Categorizer(user)
+    batch      = []
+    for line, record in records:
+        if isinstance(record, RowError):
+            report.error(line, str(record))
+            continue
+        try:
+            batch.append(_build(user, record, categories, guess))
+        except RowError as exc:
+            report.error(line, str(exc))
+            continue
+        if len(batch) >= batch_size:
+            _flush(batch, report)
+    _flush(batch, report)
+    return report
+
+
+def import_file(user, binary, name='', fmt=None, batch_size=IMPORT_BATCH_SIZE):
+    """Point d'entrée commun (vue d'upload, commande) : détecte le format et importe."""
+    lines = text_lines(binary)
+    if fmt is None:
+        head = lines.readline()
+        fmt  = detect_format(name, head)
+        lines = _chain(head, lines)
+    reader = read_ofx if fmt == 'ofx' else read_csv
+    return import_records(user, reader(lines), batch_size=batch_size)
+
+
+def _chain(first, rest):
+    if first:
+        yield first
+    yield from rest
+
+
+# ── Lot de SMS Mobile Money ──────────────────────────────────────────────────
+
+SMS_BATCH_MAX = 500
+
+
+def import_sms(user, items, parse=parse_sms):
+    """
+    Analyse et enregistre un lot de SMS en une transaction.
+    ``items`` : textes, ou dicts {'sms': …, 'category': slug, 'date': date de réception}
+    (la date lue dans le SMS reste prioritaire). Retourne un statut par élément :
+    created (avec id), duplicate (id existant) ou error (message).
+    """
+    slugs    = dict(Category.objects.values_list('slug', 'id'))
+    guess    = None
+    statuses = []
+    pending  = {}                         # empreinte → (index, Transaction)
+    for index, item in enumerate(items):
+        raw  = item.get('sms', '') if isinstance(item, dict) else str(item or '')
+        slug = item.get('category', '') if isinstance(item, dict) else ''
+        when = item.get('date') if isinstance(item, dict) else None
+        statuses.append({'index': index})
+        if not isinstance(raw, str):
+            statuses[index].update(status='error', message='SMS invalide')
+            continue
+        if when:
+            try:
+                when = parse_date(when) if isinstance(when, str) else None
+            except ValueError:
+                when = None
+            if when is None:
+                statuses[index].update(status='error', message='Date invalide')
+                continue
+        digest = sms_digest(raw)
+        parsed = parse(raw) if digest else None
+        if not parsed:
+            statuses[index].update(status='error', message='SMS non reconnu')
+            continue
+        if digest in pending:
+            statuses[index].update(status='duplicate', duplicate_of=pending[digest][0])
+            continue
+        category_id = slugs.get((slug if isinstance(slug, str) else '') or parsed.get('category') or '')
+        if category_id is None:
+            guess = guess or Categorizer(user)
+            category_id = guess(parsed['description'], raw)
+        pending[digest] = (index, Transaction(
+            user=user,
+            amount=parsed['amount'],
+            type=parsed['type'],
+            description=parsed['description'][:_DESCRIPTION_MAX],
+            category_id=category_id,
+            date=parsed['date'] if parsed.get('datetime') or not when else when,
+            source=Transaction.SOURCE_SMS,
+            raw_sms=raw,
+        ))
+
+    for attempt in range(2):
+        existing = dict(Transaction.objects.filter(user=user, sms_hash__in=list(pending))
+                        .values_list('sms_hash', 'id'))
+        for digest, pk in existing.items():
+            index, _ = pending.pop(digest)
+            statuses[index].update(status='duplicate', id=pk)
+        try:
+            with transaction.atomic():
+                created = Transaction.objects.bulk_create([tx for _, tx in pending.values()])
+            break
+        except IntegrityError:
+            # Même SMS enregistré entre-temps par une autre requête : on relit les empreintes
+            if attempt:
+                raise
+    ids = {tx.sms_hash: tx.pk for tx in created}
+    if None in ids.values():
+        # MySQL ne renvoie pas les clés d'une insertion groupée : relecture par empreinte
+        ids = dict(Transaction.objects.filter(user=user, sms_hash__in=list(pending))
+                   .values_list('sms_hash', 'id'))
+    for digest, (index, _) in pending.items():
+        statuses[index].update(status='created', id=ids.get(digest))
+    for status in statuses:
+        if 'duplicate_of' in status:
+            status['id'] = statuses[status.pop('duplicate_of')].get('id')
+    return statuses
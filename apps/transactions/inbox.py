@@ -0,0 +1,148 @@
+"""
+Webhook des applications de transfert SMS : authentification des appareils, file durable (SmsInbox)
+et traitement différé par lots — le web acquitte, la commande drain_sms_inbox analyse et enregistre.
+"""
+import hashlib
+import hmac
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .models import SmsDevice, SmsInbox, sms_digest
+from .importers import import_sms
+
+RATE_KEY = 'finai:smshook:{}:{}'
+
+_OPEN = (SmsInbox.STATUS_PENDING, SmsInbox.STATUS_PROCESSING)
+
+
+class InboxError(Exception):
+    """Requête refusée : ``status`` HTTP et, pour 429, délai conseillé avant nouvel essai."""
+
+    def __init__(self, message, status=400, retry_after=None):
+        super().__init__(message)
+        self.status      = status
+        self.retry_after = retry_after
+
+
+def authenticate(request):
+    """
+    Appareil à l'origine de la requête, ou None.
+    Jeton « Authorization: Bearer <key_id>.<secret> », ou signature HMAC-SHA256 du corps :
+    X-FinAI-Key, X-FinAI-Timestamp (epoch) et X-FinAI-Signature = hex(hmac(secret, "<timestamp>.<corps>")).
+    """
+    auth = request.headers.get('Authorization', '')
+    if auth.startswith('Bearer '):
+        key_id, _, secret = auth[7:].strip().partition('.')
+        device = SmsDevice.objects.filter(key_id=key_id, is_active=True).select_related('user').first()
+        if device and hmac.compare_digest(secret.encode(), device.secret.encode()):
+            return device
+        return None
+
+    key_id    = request.headers.get('X-FinAI-Key', '')
+    stamp     = request.headers.get('X-FinAI-Timestamp', '')
+    signature = request.headers.get('X-FinAI-Signature', '')
+    if not (key_id and stamp.isdigit() and signature):
+        return None
+    if abs(time.time() - int(stamp)) > settings.SMS_WEBHOOK_MAX_SKEW:
+        return None
+    device = SmsDevice.objects.filter(key_id=key_id, is_active=True).select_related('user').first()
+    if not device:
+        return None
+    expected = hmac.new(device.secret.encode(), stamp.encode() + b'.' + request.body, hashlib.sha256).hexdigest()
+    return device if hmac.compare_digest(expected, signature.lower()) else None
+
+
+def throttle(device):
+    """Fenêtre fixe d'une minute par appareil ; lève InboxError(429) au-delà du quota."""
+    window = int(time.time() // 60)
+    key    = RATE_KEY.format(device.pk, window)
+    cache.add(key, 0, timeout=120)
+    try:
+        hits = cache.incr(key)
+    except ValueError:
+        hits = 1
+    if hits > settings.SMS_WEBHOOK_RATE_PER_MINUTE:
+        raise InboxError('Trop de requêtes', status=429, retry_after=60 - int(time.time()) % 60)
+
+
+def _messages(payload):
+    """Normalise {id, sms, received_at} ou {messages: [...]} en liste de (clé, sms, reçu_le)."""
+    items = payload.get('messages') if isinstance(payload, dict) and 'messages' in payload else [payload]
+    if not isinstance(items, list) or not items:
+        raise InboxError('Message ou liste « messages » attendu')
+    if len(items) > settings.SMS_WEBHOOK_MAX_BATCH:
+        raise InboxError(f'{settings.SMS_WEBHOOK_MAX_BATCH} messages maximum par requête', status=413)
+    messages = []
+    for item in items:
+        raw = item.get('sms') if isinstance(item, dict) else None
+        if not isinstance(raw, str) or not raw.strip():
+            raise InboxError('Chaque message doit contenir « sms »')
+        key  = str(item.get('id') or sms_digest(raw))[:64]
+        sent = item.get('received_at')
+        sent = parse_datetime(sent) if isinstance(sent, str) else None
+        if sent and timezone.is_naive(sent):
+            sent = timezone.make_aware(sent)
+        messages.append((key, raw, sent))
+    return messages
+
+
+def enqueue(device, payload):
+    """Met en file les messages d'une requête du webhook. Idempotent par clé client."""
+    messages = _messages(payload)
+    user     = device.user
+    depth    = SmsInbox.objects.filter(user=user, status__in=_OPEN).count()
+    if depth + len(messages) > settings.SMS_INBOX_MAX_PENDING:
+        raise InboxError('File pleine, réessayez plus tard', status=429,
+                         retry_after=settings.SMS_WEBHOOK_RETRY_AFTER)
+
+    keys  = {key for key, _, _ in messages}
+    known = set(SmsInbox.objects.filter(user=user, idempotency_key__in=keys)
+                .values_list('idempotency_key', flat=True))
+    rows, seen = [], set(known)
+    for key, raw, sent in messages:
+        if key in seen:
+            continue
+        seen.add(key)
+        rows.append(SmsInbox(user=user, device=device, idempotency_key=key, raw_sms=raw, sent_at=sent))
+    # Requête rejouée en parallèle : la contrainte d'unicité fait foi
+    SmsInbox.objects.bulk_create(rows, ignore_conflicts=True)
+    SmsDevice.objects.filter(pk=device.pk).update(last_seen=timezone.now())
+    return {'accepted': len(rows), 'duplicate': len(messages) - len(rows), 'queued': depth + len(rows)}
+
+
+def drain(batch_size=200, stale_after=300):
+    """Traite un lot de la file. Retourne le nombre de messages par statut final."""
+    now = timezone.now()
+    # Lots réservés par un worker interrompu : remis en attente
+    SmsInbox.objects.filter(status=SmsInbox.STATUS_PROCESSING,
+                            claimed_at__lt=now - timedelta(seconds=stale_after)) \
+        .update(status=SmsInbox.STATUS_PENDING, claimed_at=None)
+
+    ids = list(SmsInbox.objects.filter(status=SmsInbox.STATUS_PENDING)
+               .order_by('id').values_list('id', flat=True)[:batch_size])
+    if not ids:
+        return {}
+    SmsInbox.objects.filter(id__in=ids, status=SmsInbox.STATUS_PENDING) \
+        .update(status=SmsInbox.STATUS_PROCESSING, claimed_at=now)
+    rows = list(SmsInbox.objects.filter(id__in=ids, status=SmsInbox.STATUS_PROCESSING, claimed_at=now)
+                .select_related('user').order_by('id'))
+
+    by_user = {}
+    for row in rows:
+        by_user.setdefault(row.user_id, []).append(row)
+
+    counts = {}
+    for user_rows in by_user.values():
+        items = [{'sms': row.raw_sms,
+                  'date': timezone.localdate(row.sent_at).isoformat() if row.sent_at else None}
+                 for row in user_rows]
+        for row, result in zip(user_rows, import_sms(user_rows[0].user, items)):
+            row.status         = result['status']
+            row.transaction_id = result.get('id')
+            row.error          = result.get('message', '')[:200]
+            counts[row.status] = counts.get(row.status, 0) + 1
+    SmsInbox.objects.bulk_update(rows, ['status', 'transaction', 'error'], batch_size=500)
+    return counts
@@ -0,0 +1,18 @@
+"""Tâches de fond du journal : recalculs lourds (agrégats mensuels, patrimoine net)."""
+from django.contrib.auth import get_user_model
+from apps.jobs import queue
+from . import rollups, networth
+
+
+@queue.handler('transactions.rebuild_rollups')
+def rebuild_rollups(user_id):
+    user = get_user_model().objects.filter(pk=user_id).first()
+    if user is not None:
+        rollups.rebuild(user)
+
+
+@queue.handler('transactions.snapshot_networth')
+def snapshot_networth(user_id):
+    user = get_user_model().objects.filter(pk=user_id).first()
+    if user is not None:
+        networth.rebuild(user)
@@ -0,0 +1,75 @@
+"""
+Management command : exactitude et latence du classifieur local, comparées à l'IA.
+Usage : python manage.py benchmark_classifier [--user alice] [--holdout 5] [--llm 20]
+
+Une transaction sur ``holdout`` sert de test, les autres d'apprentissage (modèles en mémoire,
+rien n'est enregistré). ``--llm N`` soumet N transactions de test à l'IA pour comparaison.
+"""
+import time
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from apps.transactions.models import Transaction, Category
+from apps.transactions.classifier import Classifier
+
+
+class Command(BaseCommand):
+    help = 'Benchmark du classifieur de catégories local (exactitude, couverture, latence) vs IA'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help="Nom d'utilisateur (tous par défaut)")
+        parser.add_argument('--holdout', type=int, default=5, help='1 transaction sur N en test (défaut 5)')
+        parser.add_argument('--llm', type=int, default=0, help="Nombre de transactions de test soumises à l'IA")
+
+    def handle(self, *args, **options):
+        qs = Transaction.objects.filter(category__isnull=False)
+        if options['user']:
+            try:
+                qs = qs.filter(user=get_user_model().objects.get(username=options['user']))
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"Utilisateur introuvable : {options['user']}")
+        rows    = list(qs.order_by('id').values_list('id', 'user_id', 'description', 'category_id'))
+        holdout = max(2, options['holdout'])
+        test    = [r for r in rows if r[0] % holdout == 0]
+        train   = [r for r in rows if r[0] % holdout]
+        if not test or not train:
+            raise CommandError('Pas assez de transactions catégorisées pour un benchmark.')
+
+        local, global_ = {}, Classifier()
+        for _, user_id, description, category_id in train:
+            local.setdefault(user_id, Classifier()).learn(description, category_id)
+            global_.learn(description, category_id)
+
+        threshold = settings.CLASSIFIER_MIN_CONFIDENCE
+        empty     = Classifier()
+        right = answered = 0
+        start = time.perf_counter()
+        for _, user_id, description, category_id in test:
+            for clf in (local.get(user_id, empty), global_):
+                guess, prob = clf.predict(description)
+                if guess is not None and prob >= threshold:
+                    answered += 1
+                    right    += guess == category_id
+                    break
+        latency = (time.perf_counter() - start) / len(test) * 1e6
+
+        self.stdout.write(f'Apprentissage : {len(train)} · test : {len(test)}')
+        self.stdout.write(f'Local  — exactitude {100 * right / len(test):.1f}% '
+                          f'(couverture {100 * answered / len(test):.1f}%, '
+                          f'précision {100 * right / max(answered, 1):.1f}%), {latency:.1f} µs/prédiction')
+
+        if options['llm']:
+            self._llm(test[:options['llm']])
+
+    def _llm(self, sample):
+        from apps.ai_advisor.services import categorize_ai, _client
+        if _client() is None:
+            self.stdout.write(self.style.WARNING('IA — indisponible (ANTHROPIC_API_KEY absente), comparaison ignorée.'))
+            return
+        names = dict(Category.objects.values_list('id', 'name'))
+        right, start = 0, time.perf_counter()
+        for _, _, description, category_id in sample:
+            right += categorize_ai(description, list(names.values())) == names.get(category_id)
+        latency = (time.perf_counter() - start) / len(sample) * 1e3
+        self.stdout.write(f'IA     — exactitude {100 * right / len(sample):.1f}% sur {len(sample)}, '
+                          f'{latency:.0f} ms/prédiction')
@@ -0,0 +1,41 @@
+"""
+Management command : mesure débit et exactitude de l'analyse SMS sur le corpus de référence.
+Usage : python manage.py benchmark_sms [--corpus fixtures/sms_corpus.json] [--repeat 200] [--min-accuracy 95]
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from apps.transactions import sms
+
+
+class Command(BaseCommand):
+    help = "Benchmark de l'analyse SMS Mobile Money (messages/seconde, exactitude)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--corpus', default=str(settings.BASE_DIR / 'fixtures' / 'sms_corpus.json'))
+        parser.add_argument('--repeat', type=int, default=200, help='Passes sur le corpus pour le débit')
+        parser.add_argument('--min-accuracy', type=float, default=0, help='Échec en dessous de ce pourcentage')
+
+    def handle(self, *args, **options):
+        try:
+            corpus = sms.load_corpus(options['corpus'])
+        except (OSError, ValueError) as exc:
+            raise CommandError(f'Corpus illisible : {exc}')
+        if not corpus:
+            raise CommandError('Corpus vide.')
+
+        ok, misses = sms.evaluate(corpus)
+        for text, diff in misses:
+            self.stdout.write(self.style.WARNING(f'✗ {text[:70]}'))
+            self.stdout.write(f'    {diff}')
+
+        rate      = sms.throughput(corpus, repeat=max(1, options['repeat']))
+        accuracy  = 100 * ok / len(corpus)
+        parsed    = [r for r in map(sms.parse, (s['sms'] for s in corpus)) if r]
+        skip_llm  = sum(r['confidence'] >= settings.SMS_AI_MIN_CONFIDENCE for r in parsed)
+        self.stdout.write(f'Corpus       : {len(corpus)} SMS')
+        self.stdout.write(f'Débit        : {rate:,.0f} messages/s')
+        self.stdout.write(f'Exactitude   : {accuracy:.1f}% ({ok}/{len(corpus)})')
+        self.stdout.write(f'Sans IA      : {skip_llm}/{len(parsed)} analyses au-dessus du seuil de confiance')
+        if accuracy < options['min_accuracy']:
+            raise CommandError(f"Exactitude {accuracy:.1f}% sous le minimum {options['min_accuracy']}%.")
+        self.stdout.write(self.style.SUCCESS('✅ Benchmark terminé.'))
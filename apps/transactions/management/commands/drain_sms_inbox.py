@@ -0,0 +1,35 @@
+"""
+Management command : vide la file des SMS reçus par le webhook (SmsInbox), par lots.
+Usage : python manage.py drain_sms_inbox [--batch-size 200] [--loop] [--sleep 2]
+"""
+import time
+from django.core.management.base import BaseCommand
+from apps.transactions import inbox
+
+
+class Command(BaseCommand):
+    help = 'Analyse et enregistre les SMS en attente du webhook'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200)
+        parser.add_argument('--loop', action='store_true', help='Reste actif et attend de nouveaux messages')
+        parser.add_argument('--sleep', type=float, default=2.0, help='Pause (s) quand la file est vide')
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options['batch_size'])
+        totals = {}
+        try:
+            while True:
+                counts = inbox.drain(batch_size=batch_size)
+                for status, n in counts.items():
+                    totals[status] = totals.get(status, 0) + n
+                if counts:
+                    self.stdout.write(' · '.join(f'{s}: {n}' for s, n in sorted(counts.items())))
+                    continue
+                if not options['loop']:
+                    break
+                time.sleep(options['sleep'])
+        except KeyboardInterrupt:
+            pass
+        summary = ', '.join(f'{n} {s}' for s, n in sorted(totals.items())) or 'file vide'
+        self.stdout.write(self.style.SUCCESS(f'✅ {summary}.'))
@@ -0,0 +1,42 @@
+"""
+Management command : importe un fichier CSV (format de l'export) ou un relevé OFX.
+Usage : python manage.py import_transactions alice releve.ofx [--format ofx] [--batch-size 1000]
+"""
+import time
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from apps.transactions.importers import import_file, IMPORT_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = "Importe en masse des transactions depuis un CSV FinAI ou un relevé OFX"
+
+    def add_arguments(self, parser):
+        parser.add_argument('username', help="Nom d'utilisateur destinataire")
+        parser.add_argument('path', help='Chemin du fichier à importer')
+        parser.add_argument('--format', choices=['csv', 'ofx'], help='Détecté automatiquement par défaut')
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE,
+                            help=f'Lignes par lot (défaut {IMPORT_BATCH_SIZE})')
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(username=options['username'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"Utilisateur introuvable : {options['username']}")
+
+        start = time.monotonic()
+        try:
+            with open(options['path'], 'rb') as fh:
+                report = import_file(user, fh, name=options['path'], fmt=options['format'],
+                                     batch_size=max(1, options['batch_size']))
+        except OSError as exc:
+            raise CommandError(f'Lecture impossible : {exc}')
+
+        for line, message in report.errors:
+            self.stdout.write(self.style.WARNING(f'ligne {line} : {message}'))
+        if report.rejected > len(report.errors):
+            self.stdout.write(self.style.WARNING(f'… {report.rejected - len(report.errors)} autre(s) erreur(s)'))
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {report.created} transaction(s) importée(s), {report.rejected} rejetée(s) '
+            f'en {time.monotonic() - start:.1f}s.'
+        ))
@@ -0,0 +1,46 @@
+"""
+Management command : détecte les opérations récurrentes et planifie leurs prochaines échéances.
+À lancer chaque nuit (cron) ; seuls les utilisateurs ayant de nouvelles transactions sont analysés.
+Usage : python manage.py plan_recurring [--user alice] [--full] [--horizon 35]
+"""
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from apps.transactions import recurring
+
+
+class Command(BaseCommand):
+    help = 'Détecte les séries récurrentes (incrémental) et crée les transactions planifiées à venir'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help="Nom d'utilisateur (tous par défaut)")
+        parser.add_argument('--full', action='store_true', help="Réanalyse tout l'historique")
+        parser.add_argument('--horizon', type=int, default=recurring.HORIZON_DAYS,
+                            help=f'Jours planifiés à l’avance (défaut : {recurring.HORIZON_DAYS})')
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        if options['user']:
+            try:
+                users = [User.objects.get(username=options['user'])]
+            except User.DoesNotExist:
+                raise CommandError(f"Utilisateur introuvable : {options['user']}")
+        elif options['full']:
+            users = User.objects.filter(transactions__isnull=False).distinct()
+        else:
+            users = recurring.users_to_scan()
+
+        scanned = series = failed = 0
+        for user in users:
+            try:
+                series += recurring.scan(user, full=options['full'])
+            except Exception as exc:
+                # Un utilisateur en erreur n'interrompt pas l'analyse des suivants
+                failed += 1
+                self.stdout.write(self.style.WARNING(f'{user.username} : {exc!r}'))
+                continue
+            scanned += 1
+        user = users[0] if options['user'] else None
+        created = recurring.materialize(user, horizon=options['horizon'])
+        self.stdout.write(f'{scanned} utilisateur(s) analysé(s), {series} série(s) mise(s) à jour'
+                          + (f', {failed} en erreur' if failed else ''))
+        self.stdout.write(self.style.SUCCESS(f'✅ {created} transaction(s) planifiée(s).'))
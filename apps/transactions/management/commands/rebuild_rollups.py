@@ -0,0 +1,46 @@
+"""
+Management command : reconstruit ou vérifie les agrégats mensuels (MonthlyRollup).
+Usage : python manage.py rebuild_rollups [--user alice] [--verify] [--queue]
+"""
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from apps.jobs import queue
+from apps.transactions import rollups
+
+
+class Command(BaseCommand):
+    help = 'Reconstruit les agrégats mensuels depuis le journal, ou les vérifie (--verify)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help="Nom d'utilisateur (tous par défaut)")
+        parser.add_argument('--verify', action='store_true', help='Compare sans rien modifier')
+        parser.add_argument('--queue', action='store_true',
+                            help='Met en file un recalcul par utilisateur, exécuté par run_worker')
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            try:
+                user = get_user_model().objects.get(username=options['user'])
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"Utilisateur introuvable : {options['user']}")
+
+        if options['verify']:
+            diffs = rollups.verify(user)
+            for key, expected, found in diffs:
+                self.stdout.write(self.style.WARNING(f'{key} : journal={expected} agrégat={found}'))
+            if diffs:
+                raise CommandError(f'{len(diffs)} écart(s) entre agrégats et journal.')
+            self.stdout.write(self.style.SUCCESS('✅ Agrégats conformes au journal.'))
+            return
+
+        if options['queue']:
+            users = [user] if user else get_user_model().objects.filter(transactions__isnull=False).distinct()
+            for u in users:
+                queue.enqueue('transactions.rebuild_rollups', {'user_id': u.pk},
+                              key=f'transactions.rebuild_rollups:{u.pk}')
+            self.stdout.write(self.style.SUCCESS(f'✅ {len(users)} recalcul(s) mis en file.'))
+            return
+
+        n = rollups.rebuild(user)
+        self.stdout.write(self.style.SUCCESS(f'✅ {n} agrégat(s) reconstruit(s).'))
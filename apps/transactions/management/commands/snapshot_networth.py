@@ -0,0 +1,40 @@
+"""
+Management command : instantanés mensuels du patrimoine net (NetWorthSnapshot).
+À lancer en début de mois (cron) ; la première exécution reconstitue tout l'historique.
+Usage : python manage.py snapshot_networth [--user alice] [--queue]
+"""
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from apps.jobs import queue
+from apps.transactions import networth
+
+
+class Command(BaseCommand):
+    help = 'Écrit les instantanés mensuels du patrimoine net depuis les entrées de patrimoine'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help="Nom d'utilisateur (tous par défaut)")
+        parser.add_argument('--queue', action='store_true',
+                            help='Met en file un calcul par utilisateur, exécuté par run_worker')
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        if options['user']:
+            try:
+                users = [User.objects.get(username=options['user'])]
+            except User.DoesNotExist:
+                raise CommandError(f"Utilisateur introuvable : {options['user']}")
+        else:
+            users = User.objects.filter(patrimoine__isnull=False).distinct()
+
+        if options['queue']:
+            for user in users:
+                queue.enqueue('transactions.snapshot_networth', {'user_id': user.pk},
+                              key=f'transactions.snapshot_networth:{user.pk}')
+            self.stdout.write(self.style.SUCCESS(f'✅ {len(users)} calcul(s) mis en file.'))
+            return
+
+        months = 0
+        for user in users:
+            months += networth.rebuild(user)
+        self.stdout.write(self.style.SUCCESS(f'✅ {months} instantané(s) mensuel(s) pour {len(users)} utilisateur(s).'))
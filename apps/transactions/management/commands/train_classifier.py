@@ -0,0 +1,33 @@
+"""
+Management command : (ré)apprend les modèles de catégorisation locaux.
+Usage : python manage.py train_classifier [--user alice] [--rebuild]
+"""
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from apps.transactions import classifier
+
+
+class Command(BaseCommand):
+    help = 'Apprend les modèles de catégorisation (par utilisateur + global) depuis le journal'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help="Nom d'utilisateur (tous + modèle global par défaut)")
+        parser.add_argument('--rebuild', action='store_true', help='Repart de zéro au lieu de compléter')
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        if options['user']:
+            try:
+                users = [User.objects.get(username=options['user'])]
+            except User.DoesNotExist:
+                raise CommandError(f"Utilisateur introuvable : {options['user']}")
+        else:
+            users = User.objects.filter(transactions__category__isnull=False).distinct()
+
+        for user in users:
+            clf = classifier.train(user, rebuild=options['rebuild'])
+            self.stdout.write(f'{user.username} : {clf.samples} transaction(s), {len(clf.words)} mot(s)')
+        if not options['user']:
+            clf = classifier.train(None, rebuild=options['rebuild'])
+            self.stdout.write(f'Global : {clf.samples} transaction(s), {len(clf.words)} mot(s)')
+        self.stdout.write(self.style.SUCCESS('✅ Modèles à jour.'))
@@ -0,0 +1,100 @@
+"""Mémoïsation des services financiers pour la durée d'une requête HTTP.
+
+Le context processor, les vues et le contexte IA appellent les mêmes services
+(stats du mois, fuites, alertes…) plusieurs fois par rendu : chaque appel
+``(fonction, user, arguments)`` n'est calculé qu'une fois par requête.
+Hors requête (commandes, tests unitaires), les services s'exécutent normalement.
+"""
+import contextvars
+import functools
+import logging
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_current = contextvars.ContextVar('finai_request_memo', default=None)
+
+
+class RequestMemo:
+    def __init__(self):
+        self.values = {}
+        self.hits   = 0
+        self.misses = 0
+
+    def __str__(self):
+        return f'hits={self.hits}; misses={self.misses}'
+
+
+def request_memo(fn):
+    """Décorateur : mémoïse ``fn(user, *args, **kwargs)`` dans la requête courante."""
+    name = f'{fn.__module__}.{fn.__qualname__}'
+
+    @functools.wraps(fn)
+    def wrapper(user, *args, **kwargs):
+        memo = _current.get()
+        if memo is None or getattr(user, 'pk', None) is None:
+            return fn(user, *args, **kwargs)
+        key = (name, user.pk, args, tuple(sorted(kwargs.items())))
+        try:
+            if key in memo.values:
+                memo.hits += 1
+                return memo.values[key]
+        except TypeError:  # argument non hachable : pas de mémoïsation
+            return fn(user, *args, **kwargs)
+        memo.misses += 1
+        value = memo.values[key] = fn(user, *args, **kwargs)
+        return value
+
+    return wrapper
+
+
+def invalidate(user_id):
+    """Oublie les résultats d'un utilisateur (écriture dans la requête en cours)."""
+    memo = _current.get()
+    if memo is not None:
+        for key in [k for k in memo.values if k[1] == user_id]:
+            del memo.values[key]
+
+
+def current():
+    """Compteurs de la requête en cours (None hors requête)."""
+    return _current.get()
+
+
+class RequestMemoMiddleware:
+    """Ouvre un espace de mémoïsation par requête ; en DEBUG, expose ``X-FinAI-Memo``."""
+    sync_capable  = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+        self.get_response = get_response
+        self.async_mode   = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        memo  = RequestMemo()
+        token = _current.set(memo)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._report(request, response, memo)
+
+    async def __acall__(self, request):
+        memo  = RequestMemo()
+        token = _current.set(memo)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._report(request, response, memo)
+
+    def _report(self, request, response, memo):
+        if settings.DEBUG:
+            response['X-FinAI-Memo'] = str(memo)
+            logger.debug('memo %s %s', request.path, memo)
+        return response
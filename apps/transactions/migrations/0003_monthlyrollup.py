@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:28
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import ExtractMonth, ExtractYear
+
+
+def build_rollups(apps, schema_editor):
+    Transaction   = apps.get_model('transactions', 'Transaction')
+    MonthlyRollup = apps.get_model('transactions', 'MonthlyRollup')
+    groups = (Transaction.objects.order_by()
+              .annotate(y=ExtractYear('date'), m=ExtractMonth('date'))
+              .values('user_id', 'y', 'm', 'type', 'category_id')
+              .annotate(total=Sum('amount'), n=Count('id')))
+    MonthlyRollup.objects.bulk_create([MonthlyRollup(
+        user_id=g['user_id'], year=g['y'], month=g['m'], type=g['type'],
+        category_id=g['category_id'], total=g['total'], count=g['n'],
+    ) for g in groups], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0002_patrimoineentry'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveSmallIntegerField(verbose_name='Année')),
+                ('month', models.PositiveSmallIntegerField(verbose_name='Mois')),
+                ('type', models.CharField(choices=[('expense', 'Dépense'), ('income', 'Revenu'), ('planned_expense', 'Dépense planifiée'), ('planned_income', 'Revenu attendu')], max_length=20, verbose_name='Type')),
+                ('total', models.DecimalField(decimal_places=0, default=0, max_digits=17, verbose_name='Total')),
+                ('count', models.IntegerField(default=0, verbose_name='Nombre')),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='monthly_rollups', to='transactions.category')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Agrégat mensuel',
+                'unique_together': {('user', 'year', 'month', 'type', 'category')},
+            },
+        ),
+        migrations.RunPython(build_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0006_sync_updated_at_tombstones'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='transaction',
+            name='source',
+            field=models.CharField(choices=[('manual', 'Saisie manuelle'), ('sms', 'SMS Mobile Money'), ('ai', 'Extrait par IA'), ('import', 'Import fichier')], default='manual', max_length=10, verbose_name='Source'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:02
+
+import hashlib
+import re
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_sms_hash(apps, schema_editor):
+    """Empreinte des SMS déjà saisis ; les doublons existants restent sans empreinte."""
+    Transaction = apps.get_model('transactions', 'Transaction')
+    seen, batch = set(), []
+    rows = (Transaction.objects.exclude(raw_sms='').order_by('id')
+            .only('id', 'user_id', 'raw_sms').iterator(chunk_size=2000))
+    for tx in rows:
+        text = re.sub(r'\s+', ' ', tx.raw_sms).strip()
+        if not text:
+            continue
+        key = (tx.user_id, hashlib.sha256(text.encode('utf-8')).hexdigest())
+        if key in seen:
+            continue
+        seen.add(key)
+        tx.sms_hash = key[1]
+        batch.append(tx)
+        if len(batch) >= 1000:
+            Transaction.objects.bulk_update(batch, ['sms_hash'])
+            batch = []
+    Transaction.objects.bulk_update(batch, ['sms_hash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0007_source_import'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='sms_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True),
+        ),
+        migrations.RunPython(fill_sms_hash, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='transaction',
+            constraint=models.UniqueConstraint(fields=('user', 'sms_hash'), name='tx_user_sms_hash_uniq'),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:11
+
+import apps.transactions.models
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0008_sms_hash'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SmsDevice',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, verbose_name='Nom')),
+                ('key_id', models.CharField(default=apps.transactions.models._new_key_id, editable=False, max_length=24, unique=True, verbose_name='Identifiant')),
+                ('secret', models.CharField(default=apps.transactions.models._new_secret, editable=False, max_length=64, verbose_name='Secret')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Actif')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_seen', models.DateTimeField(blank=True, null=True, verbose_name='Dernier envoi')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sms_devices', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Appareil SMS',
+            },
+        ),
+        migrations.CreateModel(
+            name='SmsInbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('idempotency_key', models.CharField(max_length=64, verbose_name='Clé client')),
+                ('raw_sms', models.TextField(verbose_name='SMS')),
+                ('sent_at', models.DateTimeField(blank=True, null=True, verbose_name='Reçu sur l’appareil')),
+                ('status', models.CharField(choices=[('pending', 'En attente'), ('processing', 'En cours'), ('created', 'Transaction créée'), ('duplicate', 'Doublon'), ('error', 'Erreur')], default='pending', max_length=12, verbose_name='Statut')),
+                ('claimed_at', models.DateTimeField(blank=True, null=True)),
+                ('error', models.CharField(blank=True, max_length=200)),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+                ('device', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='messages', to='transactions.smsdevice')),
+                ('transaction', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='transactions.transaction')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sms_inbox', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'SMS reçu',
+                'indexes': [models.Index(fields=['status', 'id'], name='sms_inbox_status_idx'), models.Index(fields=['user', 'status', 'id'], name='sms_inbox_user_status_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'idempotency_key'), name='sms_inbox_user_key_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:15
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0009_sms_inbox'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryModel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.BinaryField(verbose_name='Tables compressées')),
+                ('samples', models.PositiveIntegerField(default=0, verbose_name='Transactions apprises')),
+                ('trained_until', models.DateTimeField(blank=True, null=True, verbose_name='Appris jusqu’à')),
+                ('ledger_version', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='category_model', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Modèle de catégorisation',
+            },
+        ),
+    ]
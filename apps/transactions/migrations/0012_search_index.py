@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:40
+
+from django.db import migrations
+
+
+def install_index(apps, schema_editor):
+    from apps.transactions import search
+    search.install(schema_editor.connection)
+
+
+def drop_index(apps, schema_editor):
+    from apps.transactions import search
+    search.uninstall(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0011_category_rule'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_index, drop_index),
+    ]
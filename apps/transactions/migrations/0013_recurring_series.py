@@ -0,0 +1,69 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0012_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='transaction',
+            name='source',
+            field=models.CharField(choices=[('manual', 'Saisie manuelle'), ('sms', 'SMS Mobile Money'), ('ai', 'Extrait par IA'), ('import', 'Import fichier'), ('recurring', 'Récurrence détectée')], default='manual', max_length=10, verbose_name='Source'),
+        ),
+        migrations.CreateModel(
+            name='RecurringScan',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_id', models.BigIntegerField(default=0)),
+                ('scanned_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='recurring_scan', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Analyse des récurrences',
+            },
+        ),
+        migrations.CreateModel(
+            name='RecurringSeries',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=120, verbose_name='Libellé normalisé')),
+                ('label', models.CharField(max_length=300, verbose_name='Libellé')),
+                ('type', models.CharField(choices=[('expense', 'Dépense'), ('income', 'Revenu')], max_length=20, verbose_name='Type')),
+                ('amount', models.DecimalField(decimal_places=0, max_digits=15, verbose_name='Montant habituel')),
+                ('period', models.CharField(choices=[('weekly', 'Hebdomadaire'), ('monthly', 'Mensuelle'), ('quarterly', 'Trimestrielle'), ('yearly', 'Annuelle')], max_length=10, verbose_name='Périodicité')),
+                ('occurrences', models.PositiveIntegerField(default=0, verbose_name='Occurrences')),
+                ('last_date', models.DateField(verbose_name='Dernière occurrence')),
+                ('next_date', models.DateField(verbose_name='Prochaine échéance')),
+                ('materialized_until', models.DateField(blank=True, null=True, verbose_name='Planifiée jusqu’au')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Active')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='transactions.category')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recurring_series', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Série récurrente',
+                'ordering': ['next_date'],
+            },
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='series',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='planned', to='transactions.recurringseries'),
+        ),
+        migrations.AddIndex(
+            model_name='recurringseries',
+            index=models.Index(fields=['is_active', 'next_date'], name='recurring_due_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='recurringseries',
+            unique_together={('user', 'key', 'type', 'period')},
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:39
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0013_recurring_series'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NetWorthSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(verbose_name='Mois')),
+                ('actifs', models.DecimalField(decimal_places=0, default=0, max_digits=15, verbose_name='Actifs')),
+                ('passifs', models.DecimalField(decimal_places=0, default=0, max_digits=15, verbose_name='Passifs')),
+                ('net', models.DecimalField(decimal_places=0, default=0, max_digits=15, verbose_name='Patrimoine net')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='networth_snapshots', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Instantané du patrimoine',
+                'ordering': ['month'],
+                'constraints': [models.UniqueConstraint(fields=('user', 'month'), name='networth_user_month_uniq')],
+            },
+        ),
+    ]
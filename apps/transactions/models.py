@@ -1,7 +1,14 @@
-from django.db import models
+import hashlib
+import re
+import secrets
+from django.db import models, transaction
 from django.conf import settings
+from django.dispatch import Signal
 from decimal import Decimal
 
+# Envoyé après Transaction.objects.bulk_create(), qui ne déclenche pas post_save
+transactions_bulk_created = Signal()  # arguments : instances
+
 
 class Category(models.Model):
     name        = models.CharField('Nom', max_length=100)
@@ -17,6 +24,27 @@ class Category(models.Model):
         return self.name
 
 
+def sms_digest(raw_sms):
+    """Empreinte d'un SMS (espaces normalisés) — None si pas de SMS."""
+    text = re.sub(r'\s+', ' ', raw_sms or '').strip()
+    return hashlib.sha256(text.encode('utf-8')).hexdigest() if text else None
+
+
+class TransactionQuerySet(models.QuerySet):
+
+    def bulk_create(self, objs, *args, **kwargs):
+        # Les données dérivées (agrégats, caches…) suivent les insertions en masse
+        if kwargs.get('ignore_conflicts') or kwargs.get('update_conflicts'):
+            raise ValueError('bulk_create avec gestion de conflits non supporté : dédoublonnez avant insertion.')
+        objs = list(objs)
+        for obj in objs:
+            obj.sms_hash = sms_digest(obj.raw_sms)
+        with transaction.atomic(using=self.db):
+            created = super().bulk_create(objs, *args, **kwargs)
+            transactions_bulk_created.send(sender=self.model, instances=created)
+        return created
+
+
 class Transaction(models.Model):
     TYPE_EXPENSE         = 'expense'
     TYPE_INCOME          = 'income'
@@ -31,10 +59,14 @@ class Transaction(models.Model):
     SOURCE_MANUAL = 'manual'
     SOURCE_SMS    = 'sms'
     SOURCE_AI     = 'ai'
+    SOURCE_IMPORT = 'import'
+    SOURCE_RECURRING = 'recurring'
     SOURCE_CHOICES = [
-        (SOURCE_MANUAL, 'Saisie manuelle'),
-        (SOURCE_SMS,    'SMS Mobile Money'),
-        (SOURCE_AI,     'Extrait par IA'),
+        (SOURCE_MANUAL,    'Saisie manuelle'),
+        (SOURCE_SMS,       'SMS Mobile Money'),
+        (SOURCE_AI,        'Extrait par IA'),
+        (SOURCE_IMPORT,    'Import fichier'),
+        (SOURCE_RECURRING, 'Récurrence détectée'),
     ]
 
     user        = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='transactions')
@@ -45,12 +77,63 @@ class Transaction(models.Model):
     date        = models.DateField('Date')
     source      = models.CharField('Source', max_length=10, choices=SOURCE_CHOICES, default=SOURCE_MANUAL)
     raw_sms     = models.TextField('SMS original', blank=True)
+    sms_hash    = models.CharField(max_length=64, null=True, blank=True, editable=False)
     notes       = models.TextField('Notes', blank=True)
+    # Échéance planifiée générée depuis une série récurrente (recurring.py)
+    series      = models.ForeignKey('RecurringSeries', on_delete=models.SET_NULL, null=True, blank=True,
+                                    related_name='planned', editable=False)
     created_at  = models.DateTimeField(auto_now_add=True)
+    updated_at  = models.DateTimeField(auto_now=True)
+
+    objects = TransactionQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Transaction'
         ordering     = ['-date', '-created_at']
+        indexes = [
+            models.Index(fields=['user', 'date'],                        name='tx_user_date_idx'),
+            models.Index(fields=['user', 'type', 'date'],                name='tx_user_type_date_idx'),
+            models.Index(fields=['user', 'category', 'type', 'date'],    name='tx_user_cat_type_date_idx'),
+            models.Index(fields=['user', '-date', '-created_at', '-id'], name='tx_user_journal_idx'),
+            models.Index(fields=['user', 'updated_at', 'id'],            name='tx_user_sync_idx'),
+        ]
+        constraints = [
+            # Un même SMS n'est enregistré qu'une fois par utilisateur (NULL hors SMS)
+            models.UniqueConstraint(fields=['user', 'sms_hash'], name='tx_user_sms_hash_uniq'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_raw_sms = instance.__dict__.get('raw_sms')
+        return instance
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self._loaded_raw_sms = self.__dict__.get('raw_sms')
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if self._state.adding:
+            self.sms_hash = sms_digest(self.raw_sms)
+        elif (update_fields is None or 'raw_sms' in update_fields) \
+                and self.raw_sms != getattr(self, '_loaded_raw_sms', None):
+            digest = sms_digest(self.raw_sms)
+            # Empreinte déjà prise (doublon antérieur à la contrainte) : la ligne reste sans empreinte
+            if digest and Transaction.objects.filter(user_id=self.user_id, sms_hash=digest) \
+                                             .exclude(pk=self.pk).exists():
+                digest = None
+            self.sms_hash = digest
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'sms_hash'}
+        # Ligne du journal et agrégats (signals.py) écrits dans la même transaction
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+        self._loaded_raw_sms = self.raw_sms
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            return super().delete(*args, **kwargs)
 
     @property
     def is_expense(self):
@@ -69,6 +152,20 @@ class Transaction(models.Model):
         return f'{s}{self.amount} FCFA — {self.description}'
 
 
+class TransactionTombstone(models.Model):
+    """Trace d'une transaction supprimée, pour la synchronisation différentielle de la PWA."""
+    user           = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='transaction_tombstones')
+    transaction_id = models.BigIntegerField()
+    deleted_at     = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Transaction supprimée'
+        indexes      = [models.Index(fields=['user', 'deleted_at', 'id'], name='tombstone_user_deleted_idx')]
+
+    def __str__(self):
+        return f'{self.user} — #{self.transaction_id} supprimée le {self.deleted_at:%d/%m/%Y}'
+
+
 class PatrimoineEntry(models.Model):
     PTYPE_CHOICES = [('actif', 'Actif'), ('passif', 'Passif')]
     CAT_CHOICES = [
@@ -93,6 +190,7 @@ class PatrimoineEntry(models.Model):
     class Meta:
         verbose_name = 'Entrée patrimoine'
         ordering     = ['-date', '-created_at']
+        indexes = [models.Index(fields=['user', 'ptype'], name='patrimoine_user_ptype_idx')]
 
     @property
     def is_actif(self):
@@ -102,6 +200,27 @@ class PatrimoineEntry(models.Model):
         return f'{self.get_ptype_display()} — {self.label}: {self.valeur} FCFA'
 
 
+class NetWorthSnapshot(models.Model):
+    """Patrimoine d'un utilisateur à la fin d'un mois — historique maintenu par networth.py."""
+    user       = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE,
+                                   related_name='networth_snapshots')
+    month      = models.DateField('Mois')             # premier jour du mois
+    actifs     = models.DecimalField('Actifs', max_digits=15, decimal_places=0, default=0)
+    passifs    = models.DecimalField('Passifs', max_digits=15, decimal_places=0, default=0)
+    net        = models.DecimalField('Patrimoine net', max_digits=15, decimal_places=0, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Instantané du patrimoine'
+        ordering     = ['month']
+        constraints  = [
+            models.UniqueConstraint(fields=['user', 'month'], name='networth_user_month_uniq'),
+        ]
+
+    def __str__(self):
+        return f'{self.user} — {self.month:%m/%Y} : {self.net} FCFA'
+
+
 class BudgetLimit(models.Model):
     user     = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='budget_limits')
     category = models.ForeignKey(Category, on_delete=models.CASCADE)
@@ -113,3 +232,181 @@ class BudgetLimit(models.Model):
 
     def __str__(self):
         return f'{self.user} — {self.category}: {self.amount} FCFA'
+
+
+class MonthlyRollup(models.Model):
+    """Agrégat mensuel (user, mois, type, catégorie) maintenu à chaque écriture du journal."""
+    user     = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='monthly_rollups')
+    year     = models.PositiveSmallIntegerField('Année')
+    month    = models.PositiveSmallIntegerField('Mois')
+    type     = models.CharField('Type', max_length=20, choices=Transaction.TYPE_CHOICES)
+    category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True, related_name='monthly_rollups')
+    total    = models.DecimalField('Total', max_digits=17, decimal_places=0, default=0)
+    count    = models.IntegerField('Nombre', default=0)
+
+    class Meta:
+        verbose_name    = 'Agrégat mensuel'
+        unique_together = ('user', 'year', 'month', 'type', 'category')
+
+    def __str__(self):
+        return f'{self.user} — {self.month:02d}/{self.year} {self.type}: {self.total} FCFA ({self.count})'
+
+
+def _new_key_id():
+    return 'dev_' + secrets.token_hex(8)
+
+
+def _new_secret():
+    return secrets.token_urlsafe(32)
+
+
+class CategoryRule(models.Model):
+    """Règle de catégorisation : « la description (ou le SMS) contient … → catégorie »."""
+    user       = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='category_rules')
+    pattern    = models.CharField('Contient', max_length=100)
+    category   = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='rules')
+    priority   = models.PositiveSmallIntegerField('Priorité', default=100)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name    = 'Règle de catégorisation'
+        ordering        = ['priority', 'id']
+        unique_together = ('user', 'pattern')
+
+    def __str__(self):
+        return f'{self.user} — « {self.pattern} » → {self.category}'
+
+
+class CategoryModel(models.Model):
+    """Classifieur de catégories (classifier.py) sérialisé — un par utilisateur, user NULL = global."""
+    user           = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True,
+                                          related_name='category_model')
+    data           = models.BinaryField('Tables compressées')
+    samples        = models.PositiveIntegerField('Transactions apprises', default=0)
+    trained_until  = models.DateTimeField('Appris jusqu’à', null=True, blank=True)
+    ledger_version = models.BigIntegerField(default=0)
+    updated_at     = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Modèle de catégorisation'
+
+    def __str__(self):
+        return f'{self.user or "Global"} — {self.samples} transaction(s)'
+
+
+class SmsDevice(models.Model):
+    """Appareil (application de transfert SMS) autorisé à pousser des SMS via le webhook."""
+    user       = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='sms_devices')
+    name       = models.CharField('Nom', max_length=100)
+    key_id     = models.CharField('Identifiant', max_length=24, unique=True, default=_new_key_id, editable=False)
+    secret     = models.CharField('Secret', max_length=64, default=_new_secret, editable=False)
+    is_active  = models.BooleanField('Actif', default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_seen  = models.DateTimeField('Dernier envoi', null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Appareil SMS'
+
+    @property
+    def token(self):
+        """Jeton « Bearer » : identifiant public + secret."""
+        return f'{self.key_id}.{self.secret}'
+
+    def __str__(self):
+        return f'{self.user} — {self.name} ({self.key_id})'
+
+
+class SmsInbox(models.Model):
+    """File durable des SMS reçus par le webhook, vidée par la commande drain_sms_inbox."""
+    STATUS_PENDING    = 'pending'
+    STATUS_PROCESSING = 'processing'
+    STATUS_CREATED    = 'created'
+    STATUS_DUPLICATE  = 'duplicate'
+    STATUS_ERROR      = 'error'
+    STATUS_CHOICES = [
+        (STATUS_PENDING,    'En attente'),
+        (STATUS_PROCESSING, 'En cours'),
+        (STATUS_CREATED,    'Transaction créée'),
+        (STATUS_DUPLICATE,  'Doublon'),
+        (STATUS_ERROR,      'Erreur'),
+    ]
+
+    user            = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='sms_inbox')
+    device          = models.ForeignKey(SmsDevice, on_delete=models.SET_NULL, null=True, blank=True, related_name='messages')
+    idempotency_key = models.CharField('Clé client', max_length=64)
+    raw_sms         = models.TextField('SMS')
+    sent_at         = models.DateTimeField('Reçu sur l’appareil', null=True, blank=True)
+    status          = models.CharField('Statut', max_length=12, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    claimed_at      = models.DateTimeField(null=True, blank=True)
+    transaction     = models.ForeignKey(Transaction, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    error           = models.CharField(max_length=200, blank=True)
+    received_at     = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'SMS reçu'
+        constraints  = [
+            models.UniqueConstraint(fields=['user', 'idempotency_key'], name='sms_inbox_user_key_uniq'),
+        ]
+        indexes      = [
+            models.Index(fields=['status', 'id'],         name='sms_inbox_status_idx'),
+            models.Index(fields=['user', 'status', 'id'], name='sms_inbox_user_status_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.user} — {self.idempotency_key} ({self.status})'
+
+
+class RecurringSeries(models.Model):
+    """Opération récurrente détectée dans le journal (loyer, facture ENEO, salaire…)."""
+    PERIOD_WEEKLY    = 'weekly'
+    PERIOD_MONTHLY   = 'monthly'
+    PERIOD_QUARTERLY = 'quarterly'
+    PERIOD_YEARLY    = 'yearly'
+    PERIOD_CHOICES = [
+        (PERIOD_WEEKLY,    'Hebdomadaire'),
+        (PERIOD_MONTHLY,   'Mensuelle'),
+        (PERIOD_QUARTERLY, 'Trimestrielle'),
+        (PERIOD_YEARLY,    'Annuelle'),
+    ]
+
+    user               = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE,
+                                           related_name='recurring_series')
+    key                = models.CharField('Libellé normalisé', max_length=120)
+    label              = models.CharField('Libellé', max_length=300)
+    type               = models.CharField('Type', max_length=20, choices=Transaction.TYPE_CHOICES[:2])
+    category           = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True,
+                                           related_name='+')
+    amount             = models.DecimalField('Montant habituel', max_digits=15, decimal_places=0)
+    period             = models.CharField('Périodicité', max_length=10, choices=PERIOD_CHOICES)
+    occurrences        = models.PositiveIntegerField('Occurrences', default=0)
+    last_date          = models.DateField('Dernière occurrence')
+    next_date          = models.DateField('Prochaine échéance')
+    materialized_until = models.DateField('Planifiée jusqu’au', null=True, blank=True)
+    is_active          = models.BooleanField('Active', default=True)
+    updated_at         = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name    = 'Série récurrente'
+        ordering        = ['next_date']
+        unique_together = ('user', 'key', 'type', 'period')
+        indexes         = [
+            models.Index(fields=['is_active', 'next_date'], name='recurring_due_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.user} — {self.label} ({self.get_period_display()}, {self.amount} FCFA)'
+
+
+class RecurringScan(models.Model):
+    """Filigrane de la détection incrémentale : dernière transaction examinée par utilisateur."""
+    user       = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE,
+                                      related_name='recurring_scan')
+    last_id    = models.BigIntegerField(default=0)
+    scanned_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Analyse des récurrences'
+
+    def __str__(self):
+        return f'{self.user} — jusqu’à #{self.last_id}'
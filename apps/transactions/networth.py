@@ -0,0 +1,63 @@
+"""
+Historique du patrimoine net : un instantané (NetWorthSnapshot) par utilisateur et par mois.
+
+Une entrée de patrimoine compte à partir du mois de sa date d'évaluation. L'historique est recalculé
+en une requête groupée (mois × actif/passif), cumulée en mémoire, puis réécrit d'un bloc (suppression
+et insertion groupée dans une transaction) : quelques dizaines de lignes pour des années d'historique. Recalculé à chaque modification d'entrée
+(signals.py) et chaque mois par la commande snapshot_networth.
+"""
+from datetime import date
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models.functions import TruncMonth
+from .models import PatrimoineEntry, NetWorthSnapshot
+
+
+def month_start(d):
+    return date(d.year, d.month, 1)
+
+
+def _next_month(d):
+    return date(d.year + 1, 1, 1) if d.month == 12 else date(d.year, d.month + 1, 1)
+
+
+def rebuild(user, today=None):
+    """Recalcule tous les instantanés de ``user`` jusqu'au mois courant. Retourne le nombre de mois."""
+    current = month_start(today or date.today())
+    rows = (PatrimoineEntry.objects
+            .filter(user=user)
+            .annotate(m=TruncMonth('date'))
+            .values('m', 'ptype')
+            .annotate(total=Sum('valeur'))
+            .order_by('m'))
+    deltas = {}
+    for row in rows:
+        # Entrées datées dans le futur : comptées dès le mois courant
+        delta = deltas.setdefault(min(row['m'], current), {})
+        delta[row['ptype']] = delta.get(row['ptype'], 0) + row['total']
+
+    snapshots, actifs, passifs = [], Decimal(0), Decimal(0)
+    month = min(deltas, default=_next_month(current))
+    while month <= current:
+        delta    = deltas.get(month, {})
+        actifs  += delta.get('actif', 0)
+        passifs += delta.get('passif', 0)
+        snapshots.append(NetWorthSnapshot(user=user, month=month, actifs=actifs, passifs=passifs,
+                                          net=actifs - passifs))
+        month = _next_month(month)
+
+    # Remplacement complet plutôt qu'un upsert : MySQL refuse bulk_create(unique_fields=…)
+    with transaction.atomic():
+        NetWorthSnapshot.objects.filter(user=user).delete()
+        NetWorthSnapshot.objects.bulk_create(snapshots, batch_size=500)
+    return len(snapshots)
+
+
+def history(user, months=None):
+    """Évolution mensuelle du patrimoine net, du plus ancien au plus récent."""
+    qs = NetWorthSnapshot.objects.filter(user=user).order_by('-month')
+    if months:
+        qs = qs[:months]
+    return [{'month': s.month, 'actifs': int(s.actifs), 'passifs': int(s.passifs), 'net': int(s.net)}
+            for s in reversed(list(qs))]
@@ -0,0 +1,80 @@
+"""Pagination par curseur (keyset) du journal.
+
+Ordre stable ``(-date, -created_at, -id)`` ; chaque page part de la dernière
+ligne vue au lieu d'un ``OFFSET``, et aucun ``COUNT(*)`` n'est nécessaire :
+le coût d'une page est le même en page 1 qu'après des années d'historique.
+"""
+from datetime import date, datetime
+from django.core import signing
+from django.db.models import Q
+
+ORDERING = ('-date', '-created_at', '-id')
+_SALT    = 'finai.journal.cursor'
+
+
+class KeysetPage:
+    """Page de résultats — interface proche de ``django.core.paginator.Page``."""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list     = object_list
+        self.next_cursor     = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+def _encode(direction, row):
+    return signing.dumps(
+        [direction, row.date.isoformat(), row.created_at.isoformat(), row.pk],
+        salt=_SALT, compress=True,
+    )
+
+
+def _decode(cursor):
+    try:
+        direction, d, created, pk = signing.loads(cursor, salt=_SALT)
+        return direction, date.fromisoformat(d), datetime.fromisoformat(created), int(pk)
+    except (signing.BadSignature, ValueError, TypeError):
+        return None
+
+
+def _after(d, created, pk):
+    return Q(date__lt=d) | Q(date=d, created_at__lt=created) | Q(date=d, created_at=created, id__lt=pk)
+
+
+def _before(d, created, pk):
+    return Q(date__gt=d) | Q(date=d, created_at__gt=created) | Q(date=d, created_at=created, id__gt=pk)
+
+
+def paginate(qs, cursor=None, per_page=25):
+    """Page de ``qs`` suivant/précédant ``cursor`` (curseur invalide ⇒ première page)."""
+    position = _decode(cursor) if cursor else None
+    if position and position[0] == 'p':
+        rows = list(qs.filter(_before(*position[1:])).order_by('date', 'created_at', 'id')[:per_page + 1])
+        if len(rows) <= per_page:  # on est revenu en tête du journal
+            return paginate(qs, None, per_page)
+        rows = rows[:per_page][::-1]
+        return KeysetPage(rows, next_cursor=_encode('n', rows[-1]), previous_cursor=_encode('p', rows[0]))
+    if position:
+        qs = qs.filter(_after(*position[1:]))
+    rows = list(qs.order_by(*ORDERING)[:per_page + 1])
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    return KeysetPage(
+        rows,
+        next_cursor=_encode('n', rows[-1]) if rows and more else None,
+        previous_cursor=_encode('p', rows[0]) if rows and position else None,
+    )
@@ -0,0 +1,237 @@
+"""
+Détection des opérations récurrentes et planification de leurs prochaines échéances.
+
+``scan`` regroupe le journal d'un utilisateur en une passe (libellé normalisé, type, tranche de
+montant), reconnaît une périodicité (hebdomadaire, mensuelle, trimestrielle, annuelle) et tient à
+jour les RecurringSeries. L'analyse est incrémentale : seuls les libellés des transactions arrivées
+depuis le dernier passage (filigrane RecurringScan) sont réexaminés.
+
+``materialize`` crée en masse les transactions planifiées des séries actives jusqu'à l'horizon ;
+l'arrivée de l'opération réelle retire l'échéance planifiée correspondante.
+"""
+import re
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+from decimal import Decimal
+from statistics import median
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import BigIntegerField, Exists, OuterRef, F, Value
+from django.db.models.functions import Coalesce
+from .models import Transaction, RecurringSeries, RecurringScan
+from .rules import fold
+from .services import REAL_TYPES, month_bounds
+
+HISTORY_DAYS    = 800        # deux ans : deux occurrences d'une série annuelle
+HORIZON_DAYS    = 35         # échéances planifiées jusqu'à J+35
+MIN_OCCURRENCES = 3
+AMOUNT_BAND     = Decimal('0.2')  # montants à ±20 % : même série
+REGULARITY      = 0.75       # part minimale d'intervalles conformes à la période
+
+# Période → (durée nominale en jours, tolérance en jours, mois d'avance)
+PERIODS = {
+    RecurringSeries.PERIOD_WEEKLY:    (7,      2,  0),
+    RecurringSeries.PERIOD_MONTHLY:   (30.44,  4,  1),
+    RecurringSeries.PERIOD_QUARTERLY: (91.3,   10, 3),
+    RecurringSeries.PERIOD_YEARLY:    (365.25, 20, 12),
+}
+
+_MONTHS = frozenset('''
+    janvier fevrier mars avril mai juin juillet aout septembre octobre novembre decembre
+    janv fev avr juil sept oct nov dec
+    january february march april june july august september october november december
+'''.split())
+_WORD = re.compile(r'[a-z]+')
+
+
+def series_key(description):
+    """Libellé sans accents, chiffres, références ni noms de mois : « Facture ENEO mars 2024 » → « facture eneo »."""
+    words = [w for w in _WORD.findall(fold(description)) if len(w) > 1 and w not in _MONTHS]
+    return ' '.join(words[:4])[:120]
+
+
+def advance(d, period, anchor_day=None):
+    """Échéance suivante ; les séries mensuelles gardent leur jour (ramené au dernier jour du mois)."""
+    days, _, months = PERIODS[period]
+    if not months:
+        return d + timedelta(days=days)
+    idx          = d.year * 12 + d.month - 1 + months
+    year, month  = idx // 12, idx % 12 + 1
+    last         = month_bounds(year, month)[1].day
+    return date(year, month, min(anchor_day or d.day, last))
+
+
+# ── Détection ────────────────────────────────────────────────────────────────
+
+def _bands(rows):
+    """Regroupe les occurrences (date, montant, …) par tranche de montant."""
+    bands, current = [], []
+    for row in sorted(rows, key=lambda r: r[1]):
+        if current and row[1] > current[0][1] * (1 + AMOUNT_BAND):
+            bands.append(current)
+            current = []
+        current.append(row)
+    if current:
+        bands.append(current)
+    return bands
+
+
+def _period(dates):
+    gaps = [(b - a).days for a, b in zip(dates, dates[1:])]
+    if not gaps:
+        return None
+    typical = median(gaps)
+    for period, (days, tolerance, _) in PERIODS.items():
+        if abs(typical - days) <= tolerance:
+            regular = sum(abs(g - days) <= tolerance for g in gaps)
+            if regular / len(gaps) >= REGULARITY:
+                return period
+    return None
+
+
+def _stopped(period, last_date, today):
+    # Plus de deux échéances manquées : série arrêtée (abonnement résilié…)
+    days, tolerance, _ = PERIODS[period]
+    return (today - last_date).days > 2 * days + tolerance
+
+
+def detect(rows, today):
+    """
+    Séries d'un groupe (même libellé normalisé et même type).
+    ``rows`` : (date, montant, id de catégorie, libellé) ; retourne des dicts prêts pour RecurringSeries.
+    """
+    found = []
+    for band in _bands(rows):
+        band.sort(key=lambda r: r[0])
+        # Une occurrence par jour : deux SMS du même paiement ne font pas une série
+        by_day = list({r[0]: r for r in band}.values())
+        dates  = [r[0] for r in by_day]
+        period = _period(dates)
+        if period is None:
+            continue
+        needed = 2 if period == RecurringSeries.PERIOD_YEARLY else MIN_OCCURRENCES
+        if len(by_day) < needed:
+            continue
+        last      = by_day[-1]
+        anchor    = Counter(d.day for d in dates[-3:]).most_common(1)[0][0]
+        next_date = advance(last[0], period, anchor)
+        found.append({
+            'period':      period,
+            'amount':      Decimal(median(r[1] for r in by_day[-3:])).quantize(Decimal('1')),
+            'category_id': last[2],
+            'label':       last[3][:300],
+            'occurrences': len(by_day),
+            'last_date':   last[0],
+            'next_date':   next_date,
+            'is_active':   not _stopped(period, last[0], today),
+        })
+    # Une série par période (contrainte unique) : deux tranches de montant de même période
+    # (loyer et charges au même libellé…) → la plus récemment payée
+    latest = {}
+    for series in found:
+        kept = latest.get(series['period'])
+        if kept is None or (series['last_date'], series['occurrences']) > (kept['last_date'], kept['occurrences']):
+            latest[series['period']] = series
+    return list(latest.values())
+
+
+def scan(user, full=False, today=None):
+    """
+    Met à jour les séries de ``user`` à partir des transactions arrivées depuis le dernier passage
+    (ou de tout l'historique si ``full``). Retourne le nombre de séries créées ou mises à jour.
+    """
+    today    = today or date.today()
+    state, _ = RecurringScan.objects.get_or_create(user=user)
+    since_id = 0 if full else state.last_id
+    new = list(Transaction.objects.filter(user=user, type__in=REAL_TYPES, id__gt=since_id)
+               .order_by().values_list('id', 'description', 'type'))
+    if not new:
+        return 0
+    wanted = {(series_key(desc), type_) for _, desc, type_ in new} - {('', t) for t in REAL_TYPES}
+
+    # Une seule lecture de l'historique récent ; seuls les groupes touchés sont analysés
+    groups = defaultdict(list)
+    history = (Transaction.objects
+               .filter(user=user, type__in=REAL_TYPES, date__gte=today - timedelta(days=HISTORY_DAYS))
+               .order_by().values_list('date', 'amount', 'category_id', 'description', 'type')
+               .iterator(chunk_size=2000))
+    for d, amount, category_id, description, type_ in history:
+        key = (series_key(description), type_)
+        if key in wanted:
+            groups[key].append((d, amount, category_id, description))
+
+    existing = {(s.key, s.type, s.period): s for s in RecurringSeries.objects.filter(user=user)}
+    touched  = 0
+    with transaction.atomic():
+        for (key, type_), rows in groups.items():
+            for found in detect(rows, today):
+                series = existing.get((key, type_, found['period']))
+                if series is None:
+                    series = existing[key, type_, found['period']] = RecurringSeries(user=user, key=key, type=type_)
+                for field, value in found.items():
+                    setattr(series, field, value)
+                series.save()
+                touched += 1
+                _settle(series)
+        state.last_id = max(pk for pk, _, _ in new)
+        state.save(update_fields=['last_id', 'scanned_at'])
+    return touched
+
+
+def _settle(series):
+    """L'opération réelle est arrivée : retire les échéances planifiées qu'elle remplace."""
+    _, tolerance, _ = PERIODS[series.period]
+    Transaction.objects.filter(
+        series=series, date__lte=series.last_date + timedelta(days=tolerance),
+    ).delete()
+
+
+def users_to_scan():
+    """Utilisateurs ayant des transactions réelles postérieures à leur filigrane — une requête."""
+    newer = Transaction.objects.filter(user=OuterRef('pk'), type__in=REAL_TYPES, id__gt=OuterRef('watermark'))
+    return (get_user_model().objects
+            .annotate(watermark=Coalesce(F('recurring_scan__last_id'), Value(0, output_field=BigIntegerField())))
+            .filter(Exists(newer)))
+
+
+# ── Planification ────────────────────────────────────────────────────────────
+
+def materialize(user=None, horizon=HORIZON_DAYS, today=None):
+    """
+    Crée (bulk_create) les transactions planifiées des séries actives jusqu'à ``today + horizon``.
+    Chaque série retient la dernière échéance planifiée : relancer ne crée pas de doublon.
+    """
+    today   = today or date.today()
+    until   = today + timedelta(days=horizon)
+    planned = {
+        Transaction.TYPE_EXPENSE: Transaction.TYPE_PLANNED_EXPENSE,
+        Transaction.TYPE_INCOME:  Transaction.TYPE_PLANNED_INCOME,
+    }
+    series = RecurringSeries.objects.filter(is_active=True, next_date__lte=until)
+    if user is not None:
+        series = series.filter(user=user)
+
+    batch, changed, stopped = [], [], []
+    for s in series:
+        if _stopped(s.period, s.last_date, today):
+            stopped.append(s.pk)
+            continue
+        due, last = s.next_date, None
+        while due <= until:
+            if due >= today and (s.materialized_until is None or due > s.materialized_until):
+                batch.append(Transaction(
+                    user_id=s.user_id, amount=s.amount, type=planned[s.type], description=s.label,
+                    category_id=s.category_id, date=due, source=Transaction.SOURCE_RECURRING, series=s,
+                ))
+                last = due
+            # Jour d'échéance d'origine, même après un mois plus court (31 → 28 février → 31 mars)
+            due = advance(due, s.period, max(s.next_date.day, s.last_date.day))
+        if last:
+            s.materialized_until = last
+            changed.append(s)
+
+    with transaction.atomic():
+        Transaction.objects.bulk_create(batch, batch_size=500)
+        RecurringSeries.objects.bulk_update(changed, ['materialized_until'], batch_size=500)
+        RecurringSeries.objects.filter(pk__in=stopped).update(is_active=False)
+    return len(batch)
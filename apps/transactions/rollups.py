@@ -0,0 +1,106 @@
+"""Agrégats mensuels (MonthlyRollup) — maintenance incrémentale, reconstruction, vérification."""
+from decimal import Decimal
+from django.db import transaction, IntegrityError
+from django.db.models import F, Sum, Count
+from django.db.models.functions import ExtractYear, ExtractMonth
+from .models import Transaction, MonthlyRollup
+
+_DATE   = Transaction._meta.get_field('date')
+_AMOUNT = Transaction._meta.get_field('amount')
+
+
+def snapshot(tx):
+    """Clé d'agrégat + montant d'une transaction (valeurs normalisées)."""
+    d = _DATE.to_python(tx['date'] if isinstance(tx, dict) else tx.date)
+    if isinstance(tx, dict):
+        return ((tx['user_id'], d.year, d.month, tx['type'], tx['category_id']),
+                _AMOUNT.to_python(tx['amount']))
+    return ((tx.user_id, d.year, d.month, tx.type, tx.category_id),
+            _AMOUNT.to_python(tx.amount))
+
+
+def bump(key, amount, count):
+    """Ajoute ``amount``/``count`` (éventuellement négatifs) à l'agrégat ``key``."""
+    user_id, year, month, type_, category_id = key
+    rows = MonthlyRollup.objects.filter(
+        user_id=user_id, year=year, month=month, type=type_, category_id=category_id,
+    )
+    with transaction.atomic():
+        if rows.update(total=F('total') + amount, count=F('count') + count):
+            if count < 0:
+                rows.filter(count__lte=0).delete()
+            return
+        try:
+            with transaction.atomic():
+                MonthlyRollup.objects.create(
+                    user_id=user_id, year=year, month=month, type=type_,
+                    category_id=category_id, total=amount, count=count,
+                )
+        except IntegrityError:
+            # Création concurrente de la même ligne : on repasse par l'UPDATE
+            rows.update(total=F('total') + amount, count=F('count') + count)
+
+
+def apply_change(before, after):
+    """Reporte une écriture du journal : ``before``/``after`` valent None à la création/suppression."""
+    old = snapshot(before) if before else None
+    new = snapshot(after)  if after  else None
+    if old and new and old[0] == new[0]:
+        if old[1] != new[1]:
+            bump(new[0], new[1] - old[1], 0)
+        return
+    if old:
+        bump(old[0], -old[1], -1)
+    if new:
+        bump(new[0], new[1], 1)
+
+
+def apply_bulk(transactions):
+    """Reporte un lot de créations : une mise à jour par agrégat touché, pas par ligne."""
+    deltas = {}
+    for tx in transactions:
+        key, amount = snapshot(tx)
+        total, n = deltas.get(key, (Decimal(0), 0))
+        deltas[key] = (total + amount, n + 1)
+    for key, (amount, n) in deltas.items():
+        bump(key, amount, n)
+
+
+def _ledger_groups(user=None):
+    qs = Transaction.objects.all() if user is None else Transaction.objects.filter(user=user)
+    return (qs.order_by()
+              .annotate(y=ExtractYear('date'), m=ExtractMonth('date'))
+              .values('user_id', 'y', 'm', 'type', 'category_id')
+              .annotate(total=Sum('amount'), n=Count('id')))
+
+
+def rebuild(user=None, batch_size=1000):
+    """Recalcule les agrégats depuis le journal brut. Retourne le nombre de lignes créées."""
+    rows = [MonthlyRollup(
+        user_id=g['user_id'], year=g['y'], month=g['m'], type=g['type'],
+        category_id=g['category_id'], total=g['total'], count=g['n'],
+    ) for g in _ledger_groups(user)]
+    with transaction.atomic():
+        qs = MonthlyRollup.objects.all() if user is None else MonthlyRollup.objects.filter(user=user)
+        qs.delete()
+        MonthlyRollup.objects.bulk_create(rows, batch_size=batch_size)
+    return len(rows)
+
+
+def verify(user=None):
+    """Compare agrégats et journal brut. Retourne la liste des écarts (clé, attendu, trouvé)."""
+    expected = {
+        (g['user_id'], g['y'], g['m'], g['type'], g['category_id']): (g['total'], g['n'])
+        for g in _ledger_groups(user)
+    }
+    qs = MonthlyRollup.objects.all() if user is None else MonthlyRollup.objects.filter(user=user)
+    found = {}
+    for r in qs.values('user_id', 'year', 'month', 'type', 'category_id', 'total', 'count'):
+        key = (r['user_id'], r['year'], r['month'], r['type'], r['category_id'])
+        total, n = found.get(key, (Decimal(0), 0))
+        found[key] = (total + r['total'], n + r['count'])
+    return [
+        (key, expected.get(key), found.get(key))
+        for key in sorted(set(expected) | set(found), key=str)
+        if expected.get(key) != found.get(key)
+    ]
@@ -0,0 +1,129 @@
+"""
+Règles de catégorisation de l'utilisateur (CategoryRule), compilées en une seule expression.
+
+Toutes les règles d'un utilisateur forment une alternative unique : une description est
+parcourue une fois, quel que soit le nombre de règles. Le matcher compilé est gardé en mémoire
+par processus et recompilé quand la version des règles, lue en base, change.
+"""
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from django.db import transaction
+from django.db.models import Count, Max
+from django.utils import timezone
+from .models import Transaction, CategoryRule
+from .classifier import Predictor
+from . import rollups
+
+UPDATE_CHUNK = 500
+_CACHE_SIZE  = 256
+
+
+def fold(text):
+    """Minuscules sans accents : « Électricité » et « electricite » se valent."""
+    return unicodedata.normalize('NFKD', (text or '').lower()).encode('ascii', 'ignore').decode()
+
+
+def rules_version(user_id):
+    """
+    Version des règles lue en base (nombre, dernière modification) : partagée par tous les
+    processus, elle change à chaque ajout, modification ou suppression.
+    """
+    v = CategoryRule.objects.filter(user_id=user_id).aggregate(n=Count('id'), at=Max('updated_at'))
+    return v['n'], v['at']
+
+
+class Matcher:
+    """Règles d'un utilisateur compilées : ``match(text)`` → id de catégorie ou None."""
+
+    def __init__(self, rules):
+        # motif replié → (priorité, catégorie) ; à motif égal, la première règle l'emporte
+        self.targets = {}
+        for pattern, category_id, priority in rules:
+            key = fold(pattern).strip()
+            if key and key not in self.targets:
+                self.targets[key] = (priority, category_id)
+        # Lookahead : un motif est essayé à chaque position, sans que les correspondances se consomment
+        # (« canal plus » n'empêche pas de voir « plus ») ; à une même position, la priorité la plus
+        # forte d'abord, puis le motif le plus long (« canal+ » avant « canal »)
+        alternatives = sorted(self.targets, key=lambda k: (self.targets[k][0], -len(k)))
+        self.regex = re.compile('(?=({}))'.format('|'.join(map(re.escape, alternatives)))) if alternatives else None
+
+    def match(self, *texts):
+        if self.regex is None:
+            return None
+        found = [self.targets[m] for m in self.regex.findall(fold(' '.join(t for t in texts if t)))]
+        return min(found)[1] if found else None
+
+
+_lock     = threading.Lock()
+_matchers = OrderedDict()      # user_id → (version, Matcher)
+
+
+def matcher_for(user):
+    version = rules_version(user.pk)
+    with _lock:
+        cached = _matchers.get(user.pk)
+        if cached and cached[0] == version:
+            _matchers.move_to_end(user.pk)
+            return cached[1]
+    matcher = Matcher(CategoryRule.objects.filter(user=user).order_by('priority', 'id')
+                      .values_list('pattern', 'category_id', 'priority'))
+    with _lock:
+        _matchers[user.pk] = (version, matcher)
+        while len(_matchers) > _CACHE_SIZE:
+            _matchers.popitem(last=False)
+    return matcher
+
+
+class Categorizer:
+    """Catégorie d'une nouvelle transaction : règles de l'utilisateur, puis classifieur local."""
+
+    def __init__(self, user):
+        self.rules = matcher_for(user)
+        self.guess = Predictor(user)
+
+    def __call__(self, description, raw_sms=''):
+        category_id = self.rules.match(description, raw_sms)
+        if category_id in self.guess.slugs:
+            return category_id
+        return self.guess(description)
+
+    def slug(self, description, raw_sms=''):
+        return self.guess.slugs.get(self(description, raw_sms))
+
+
+def apply_to_history(user, only_uncategorized=False):
+    """
+    Réapplique les règles à tout le journal de l'utilisateur.
+    Une requête UPDATE par catégorie cible (et par tranche d'ids), puis agrégats reconstruits.
+    Retourne le nombre de transactions recatégorisées.
+    """
+    from .signals import ledger_changed
+    matcher = matcher_for(user)
+    if matcher.regex is None:
+        return 0
+    qs = Transaction.objects.filter(user=user)
+    if only_uncategorized:
+        qs = qs.filter(category__isnull=True)
+
+    moves = {}
+    for pk, description, raw_sms, category_id in qs.order_by().values_list(
+            'id', 'description', 'raw_sms', 'category_id').iterator(chunk_size=2000):
+        target = matcher.match(description, raw_sms)
+        if target is not None and target != category_id:
+            moves.setdefault(target, []).append(pk)
+    if not moves:
+        return 0
+
+    now = timezone.now()
+    with transaction.atomic():
+        for category_id, ids in moves.items():
+            for start in range(0, len(ids), UPDATE_CHUNK):
+                # update() ne passe pas par save() : updated_at posé à la main pour la synchro PWA
+                Transaction.objects.filter(id__in=ids[start:start + UPDATE_CHUNK]) \
+                    .update(category_id=category_id, updated_at=now)
+        rollups.rebuild(user)
+        ledger_changed(user.pk)
+    return sum(len(ids) for ids in moves.values())
@@ -0,0 +1,267 @@
+"""
+Recherche plein texte et à facettes dans le journal.
+
+L'index est tenu à jour par la base elle-même à chaque écriture (save, bulk_create, update,
+suppression) :
+  • SQLite     → table FTS5 ``transactions_search`` (contenu externe) alimentée par triggers ;
+  • PostgreSQL → index GIN sur to_tsvector(description, notes).
+Autres moteurs (MySQL) : repli sur ``icontains``.
+"""
+import re
+from decimal import Decimal, InvalidOperation
+from django.db import connection, connections, OperationalError, ProgrammingError
+from django.db.models import BooleanField, Count, Q
+from django.db.models.expressions import RawSQL
+from .models import Transaction, Category
+
+TABLE        = Transaction._meta.db_table
+FTS_TABLE    = 'transactions_search'
+MAX_TERMS    = 8
+NO_CATEGORY  = 'aucune'
+
+# Tranches de la facette « montant » : (min inclus, max exclu)
+AMOUNT_BUCKETS = [
+    (None,    5000),
+    (5000,    25000),
+    (25000,   100000),
+    (100000,  500000),
+    (500000,  None),
+]
+
+_SQLITE = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        description, notes, content='{TABLE}', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2')""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON {TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, description, notes) VALUES (new.id, new.description, new.notes);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON {TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, description, notes)
+        VALUES ('delete', old.id, old.description, old.notes);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF description, notes ON {TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, description, notes)
+        VALUES ('delete', old.id, old.description, old.notes);
+        INSERT INTO {FTS_TABLE}(rowid, description, notes) VALUES (new.id, new.description, new.notes);
+    END""",
+]
+
+# L'expression de la requête doit être identique à celle de l'index pour que PostgreSQL l'utilise
+_PG_VECTOR = "to_tsvector('simple'::regconfig, coalesce(description, '') || ' ' || coalesce(notes, ''))"
+_POSTGRES  = [
+    f'CREATE INDEX IF NOT EXISTS tx_search_fts_idx ON {TABLE} USING gin ({_PG_VECTOR})',
+    # Ancien index trigrammes, jamais interrogé par match() : coût d'écriture sans bénéfice
+    'DROP INDEX IF EXISTS tx_search_trgm_idx',
+]
+
+
+# ── Index ────────────────────────────────────────────────────────────────────
+
+_TRIGGERS = [f'{FTS_TABLE}_{suffix}' for suffix in ('ai', 'ad', 'au')]
+
+
+def _sqlite_installed(cursor):
+    cursor.execute("SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND name IN (%s, %s, %s)",
+                   _TRIGGERS)
+    return cursor.fetchone()[0] == len(_TRIGGERS)
+
+
+def install(conn=connection):
+    """
+    Crée l'index s'il manque (idempotent). Appelé par la migration et après chaque migrate :
+    sous SQLite, une migration qui reconstruit la table du journal supprime ses triggers.
+    """
+    if conn.vendor == 'sqlite':
+        with conn.cursor() as cursor:
+            if _sqlite_installed(cursor):
+                return
+            try:
+                for sql in _SQLITE:
+                    cursor.execute(sql)
+            except OperationalError:
+                return                       # SQLite compilé sans FTS5 : repli icontains
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    elif conn.vendor == 'postgresql':
+        with conn.cursor() as cursor:
+            for sql in _POSTGRES:
+                cursor.execute(sql)
+    _available.pop(conn.alias, None)
+
+
+def uninstall(conn=connection):
+    with conn.cursor() as cursor:
+        if conn.vendor == 'sqlite':
+            for name in _TRIGGERS:
+                cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+            cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+        elif conn.vendor == 'postgresql':
+            cursor.execute('DROP INDEX IF EXISTS tx_search_fts_idx')
+            cursor.execute('DROP INDEX IF EXISTS tx_search_trgm_idx')
+    _available.pop(conn.alias, None)
+
+
+def ensure_index(using='default', **kwargs):
+    """Récepteur post_migrate (voir signals.py) : index recréé si une migration l'a supprimé."""
+    try:
+        install(connections[using])
+    except (OperationalError, ProgrammingError):
+        pass
+
+
+_available = {}     # alias → index utilisable
+
+
+def _index_available(conn=connection):
+    if conn.alias not in _available:
+        if conn.vendor == 'sqlite':
+            with conn.cursor() as cursor:
+                _available[conn.alias] = _sqlite_installed(cursor)
+        else:
+            _available[conn.alias] = conn.vendor == 'postgresql'
+    return _available[conn.alias]
+
+
+# ── Requête ──────────────────────────────────────────────────────────────────
+
+def terms(text):
+    """Mots recherchés (préfixes), sans la syntaxe des moteurs FTS."""
+    return re.findall(r'\w+', text or '')[:MAX_TERMS]
+
+
+def match(qs, text):
+    """Restreint ``qs`` aux transactions dont description ou notes contiennent tous les mots de ``text``."""
+    words = terms(text)
+    if not words:
+        return qs
+    if _index_available():
+        if connection.vendor == 'sqlite':
+            query = ' '.join(f'"{w}"*' for w in words)
+            sql   = f'"{TABLE}"."id" IN (SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s)'
+        else:
+            query = ' & '.join(f'{w}:*' for w in words)
+            sql   = f"{_PG_VECTOR} @@ to_tsquery('simple'::regconfig, %s)"
+        return qs.filter(RawSQL(sql, [query], output_field=BooleanField()))
+    for w in words:
+        qs = qs.filter(Q(description__icontains=w) | Q(notes__icontains=w))
+    return qs
+
+
+def _decimal(raw):
+    try:
+        value = Decimal(str(raw).replace(' ', '').replace(',', '.'))
+    except (InvalidOperation, ValueError):
+        return None
+    return value if value.is_finite() else None
+
+
+class SearchFilters:
+    """Critères du journal lus depuis la query string : texte, type, dates, catégorie, source, montant."""
+
+    def __init__(self, q='', type='', date_from=None, date_to=None, category='', source='',
+                 amount_min=None, amount_max=None):
+        self.q          = (q or '').strip()
+        self.type       = type or ''
+        self.date_from  = date_from
+        self.date_to    = date_to
+        self.category   = category or ''
+        self.source     = source or ''
+        self.amount_min = amount_min
+        self.amount_max = amount_max
+
+    @classmethod
+    def from_query(cls, params, **dates):
+        return cls(
+            q=params.get('q', ''),
+            type=params.get('type', ''),
+            category=params.get('category', ''),
+            source=params.get('source', ''),
+            amount_min=_decimal(params['amount_min']) if params.get('amount_min') else None,
+            amount_max=_decimal(params['amount_max']) if params.get('amount_max') else None,
+            **dates,
+        )
+
+    @property
+    def is_search(self):
+        """Au-delà des filtres historiques (type, dates) : mode recherche avec facettes."""
+        return bool(self.q or self.category or self.source
+                    or self.amount_min is not None or self.amount_max is not None)
+
+    def apply(self, qs, skip=None):
+        """Applique tous les critères, sauf la facette ``skip`` (comptage de ses valeurs)."""
+        qs = match(qs, self.q)
+        if self.date_from:
+            qs = qs.filter(date__gte=self.date_from)
+        if self.date_to:
+            qs = qs.filter(date__lte=self.date_to)
+        if self.type and skip != 'type':
+            qs = qs.filter(type=self.type)
+        if self.category and skip != 'category':
+            qs = (qs.filter(category__isnull=True) if self.category == NO_CATEGORY
+                  else qs.filter(category__slug=self.category))
+        if self.source and skip != 'source':
+            qs = qs.filter(source=self.source)
+        if skip != 'amount':
+            if self.amount_min is not None:
+                qs = qs.filter(amount__gte=self.amount_min)
+            if self.amount_max is not None:
+                qs = qs.filter(amount__lt=self.amount_max)
+        return qs
+
+    def params(self, **override):
+        """Query string (dict) des critères, avec ``override`` — liens des facettes."""
+        values = {
+            'q':          self.q,
+            'type':       self.type,
+            'date_from':  self.date_from.isoformat() if self.date_from else '',
+            'date_to':    self.date_to.isoformat() if self.date_to else '',
+            'category':   self.category,
+            'source':     self.source,
+            'amount_min': self.amount_min if self.amount_min is not None else '',
+            'amount_max': self.amount_max if self.amount_max is not None else '',
+        }
+        values.update(override)
+        return {k: str(v) for k, v in values.items() if v not in ('', None)}
+
+
+def _fcfa(value):
+    return f'{value:,}'.replace(',', ' ')
+
+
+def _bucket_label(low, high):
+    if low is None:
+        return f'< {_fcfa(high)}'
+    if high is None:
+        return f'≥ {_fcfa(low)}'
+    return f'{_fcfa(low)} – {_fcfa(high)}'
+
+
+def facets(user, filters):
+    """
+    Comptes par valeur de chaque facette. Chaque facette est comptée avec tous les autres
+    critères appliqués, pour que l'on puisse passer d'une valeur à l'autre.
+    """
+    base   = Transaction.objects.filter(user=user).order_by()
+    types  = dict(Transaction.TYPE_CHOICES)
+    labels = dict(Transaction.SOURCE_CHOICES)
+    names  = dict(Category.objects.values_list('slug', 'name'))
+
+    by_type = filters.apply(base, skip='type').values('type').annotate(n=Count('id'))
+    by_cat  = filters.apply(base, skip='category').values('category__slug').annotate(n=Count('id'))
+    by_src  = filters.apply(base, skip='source').values('source').annotate(n=Count('id'))
+    amounts = filters.apply(base, skip='amount').aggregate(**{
+        f'b{i}': Count('id', filter=Q(**{k: v for k, v in (('amount__gte', low), ('amount__lt', high))
+                                        if v is not None}))
+        for i, (low, high) in enumerate(AMOUNT_BUCKETS)
+    })
+
+    def ordered(rows, key, label):
+        return sorted(({'value': r[key] or NO_CATEGORY, 'label': label(r[key]), 'count': r['n']}
+                       for r in rows if r['n']), key=lambda f: -f['count'])
+
+    return {
+        'type':     ordered(by_type, 'type', lambda v: types.get(v, v)),
+        'category': ordered(by_cat, 'category__slug', lambda v: names.get(v, v) if v else 'Sans catégorie'),
+        'source':   ordered(by_src, 'source', lambda v: labels.get(v, v)),
+        'amount':   [{'min': low, 'max': high, 'label': _bucket_label(low, high), 'count': amounts[f'b{i}']}
+                     for i, (low, high) in enumerate(AMOUNT_BUCKETS) if amounts[f'b{i}']],
+    }
@@ -1,66 +1,144 @@
 """Services métier FIN.AI — stats, SMS parsing, score."""
-import re
 from datetime import date, timedelta
 from decimal import Decimal
-from django.db.models import Sum
-from .models import Transaction
+from django.db.models import Sum, Count, Q, OuterRef, Subquery, Value, DecimalField
+from django.db.models.functions import Coalesce
+from django.db.models.functions import TruncDay, TruncWeek, TruncMonth, TruncQuarter
+from .models import Transaction, MonthlyRollup
+from .memo import request_memo
+from .stats_cache import ledger_cached
+from . import sms
 
 
+REAL_TYPES = (Transaction.TYPE_INCOME, Transaction.TYPE_EXPENSE)
+
+
+def month_bounds(year, month):
+    """Premier et dernier jour d'un mois (filtres par plage, compatibles index)."""
+    start = date(year, month, 1)
+    end   = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+    return start, end - timedelta(days=1)
+
+
+def _derive_totals(sums, counts):
+    """Complète les sommes/compteurs par type avec les ratios dérivés."""
+    incomes  = sums[Transaction.TYPE_INCOME]
+    expenses = sums[Transaction.TYPE_EXPENSE]
+    net      = incomes - expenses
+    burn     = int(expenses / incomes * 100) if incomes > 0 else 0
+    return {
+        'sums':        sums,
+        'counts':      counts,
+        'incomes':     incomes,
+        'expenses':    expenses,
+        'net':         net,
+        'burn_rate':   burn,
+        'free_pct':    max(0, 100 - burn),
+        'saving_rate': float(net / incomes) if incomes > 0 else 0.0,
+        'planned_exp': sums[Transaction.TYPE_PLANNED_EXPENSE],
+        'planned_inc': sums[Transaction.TYPE_PLANNED_INCOME],
+        'tx_count':    counts[Transaction.TYPE_INCOME] + counts[Transaction.TYPE_EXPENSE],
+    }
+
+
+def aggregate_ledger(user, date_from, date_to):
+    """Moteur d'agrégation : sommes, compteurs et ratios par type en une seule requête.
+
+    Chaque type est agrégé via un ``SUM``/``COUNT`` filtré (``FILTER (WHERE …)``
+    ou ``CASE WHEN`` selon le SGBD) sur la fenêtre ``[date_from, date_to]``.
+    """
+    exprs = {}
+    for t, _ in Transaction.TYPE_CHOICES:
+        exprs[f'sum_{t}'] = Sum('amount', filter=Q(type=t))
+        exprs[f'n_{t}']   = Count('id',   filter=Q(type=t))
+    row = (Transaction.objects
+           .filter(user=user, date__gte=date_from, date__lte=date_to)
+           .aggregate(**exprs))
+    sums   = {t: row[f'sum_{t}'] or Decimal(0) for t, _ in Transaction.TYPE_CHOICES}
+    counts = {t: row[f'n_{t}'] for t, _ in Transaction.TYPE_CHOICES}
+    return _derive_totals(sums, counts)
+
+
+def aggregate_rollup(user, year, month):
+    """Même résultat qu'``aggregate_ledger`` pour un mois entier, lu dans MonthlyRollup."""
+    exprs = {}
+    for t, _ in Transaction.TYPE_CHOICES:
+        exprs[f'sum_{t}'] = Sum('total', filter=Q(type=t))
+        exprs[f'n_{t}']   = Sum('count', filter=Q(type=t))
+    row = MonthlyRollup.objects.filter(user=user, year=year, month=month).aggregate(**exprs)
+    sums   = {t: row[f'sum_{t}'] or Decimal(0) for t, _ in Transaction.TYPE_CHOICES}
+    counts = {t: row[f'n_{t}'] or 0 for t, _ in Transaction.TYPE_CHOICES}
+    return _derive_totals(sums, counts)
+
+
+@request_memo
+@ledger_cached
 def get_monthly_stats(user, year=None, month=None):
     """Stats complètes d'un mois."""
     today = date.today()
     year  = year  or today.year
     month = month or today.month
 
-    qs   = Transaction.objects.filter(user=user, date__year=year, date__month=month)
-    real = qs.filter(type__in=['income', 'expense'])
-
-    incomes  = real.filter(type='income').aggregate(t=Sum('amount'))['t']  or Decimal(0)
-    expenses = real.filter(type='expense').aggregate(t=Sum('amount'))['t'] or Decimal(0)
-    net      = incomes - expenses
-    burn     = int(expenses / incomes * 100) if incomes > 0 else 0
-
+    totals = aggregate_rollup(user, year, month)
     return {
-        'incomes':          incomes,
-        'expenses':         expenses,
-        'net':              net,
-        'burn_rate':        burn,
-        'free_pct':         max(0, 100 - burn),
-        'invest_capacity':  net,
-        'planned_exp': qs.filter(type='planned_expense').aggregate(t=Sum('amount'))['t'] or Decimal(0),
-        'planned_inc': qs.filter(type='planned_income').aggregate(t=Sum('amount'))['t']  or Decimal(0),
+        'incomes':          totals['incomes'],
+        'expenses':         totals['expenses'],
+        'net':              totals['net'],
+        'burn_rate':        totals['burn_rate'],
+        'free_pct':         totals['free_pct'],
+        'saving_rate':      totals['saving_rate'],
+        'invest_capacity':  totals['net'],
+        'planned_exp':      totals['planned_exp'],
+        'planned_inc':      totals['planned_inc'],
     }
 
 
+def last_months(months, today=None):
+    """Les ``months`` derniers mois calendaires (année, mois), du plus ancien au courant."""
+    today = today or date.today()
+    idx   = today.year * 12 + today.month - 1
+    return [(i // 12, i % 12 + 1) for i in range(idx - months + 1, idx + 1)]
+
+
+@request_memo
+@ledger_cached
 def get_monthly_series(user, months=6):
     """Séries temporelles revenus/dépenses pour les graphiques."""
-    today  = date.today()
-    result = []
-    for i in range(months - 1, -1, -1):
-        d  = (today.replace(day=1) - timedelta(days=i * 28))
-        qs = Transaction.objects.filter(user=user, date__year=d.year, date__month=d.month, type__in=['income','expense'])
-        result.append({
-            'label':   d.strftime('%b'),
-            'income':  int(qs.filter(type='income').aggregate(t=Sum('amount'))['t']  or 0),
-            'expense': int(qs.filter(type='expense').aggregate(t=Sum('amount'))['t'] or 0),
-        })
-    return result
+    keys  = last_months(months)
+    (y0, m0), (y1, m1) = keys[0], keys[-1]
+    rows = (MonthlyRollup.objects
+            .filter(user=user, type__in=REAL_TYPES)
+            .filter(Q(year__gt=y0) | Q(year=y0, month__gte=m0))
+            .filter(Q(year__lt=y1) | Q(year=y1, month__lte=m1))
+            .values('year', 'month', 'type')
+            .annotate(t=Sum('total'))
+            .order_by())
+    totals = {(r['year'], r['month'], r['type']): r['t'] for r in rows}
+    return [{
+        'label':   date(y, m, 1).strftime('%b'),
+        'income':  int(totals.get((y, m, Transaction.TYPE_INCOME))  or 0),
+        'expense': int(totals.get((y, m, Transaction.TYPE_EXPENSE)) or 0),
+    } for y, m in keys]
 
 
+@request_memo
+@ledger_cached
 def get_expense_by_category(user, year=None, month=None):
     today = date.today()
-    return (
-        Transaction.objects
-        .filter(user=user, date__year=year or today.year, date__month=month or today.month, type='expense')
+    return list(
+        MonthlyRollup.objects
+        .filter(user=user, year=year or today.year, month=month or today.month, type='expense')
         .values('category__name', 'category__slug', 'category__icon', 'category__color_class')
-        .annotate(total=Sum('amount'))
+        .annotate(total=Sum('total'))
         .order_by('-total')
     )
 
 
+@request_memo
+@ledger_cached
 def detect_leaks(user):
     """Top 3 fuites (dépenses les plus lourdes du mois)."""
-    rows = list(get_expense_by_category(user))
+    rows = get_expense_by_category(user)
     return [{
         'category': r['category__name'] or 'Divers',
         'slug':     r['category__slug'] or 'divers',
@@ -70,14 +148,13 @@ def detect_leaks(user):
     } for r in rows[:3]]
 
 
-def compute_score(user):
-    """Score FIN.AI sur 100."""
-    stats = get_monthly_stats(user)
+def compute_score(user, stats=None):
+    """Score FIN.AI sur 100 (réutilise ``stats`` s'il est déjà calculé)."""
+    stats = stats or get_monthly_stats(user)
     if stats['incomes'] == 0:
         return {'total': 0, 'income_grade': '-', 'saving_grade': '-', 'expense_grade': '-'}
 
-    saving_rate = float(stats['net'] / stats['incomes'])
-    sp = min(40, int(saving_rate * 50))
+    sp = min(40, int(stats['saving_rate'] * 50))
     sg = 'A+' if sp >= 35 else ('A' if sp >= 28 else ('B' if sp >= 20 else ('C+' if sp >= 12 else 'C')))
 
     burn = stats['burn_rate']
@@ -87,52 +164,81 @@ def compute_score(user):
     return {'total': min(100, sp + 28 + ep), 'income_grade': 'A+', 'saving_grade': sg, 'expense_grade': eg}
 
 
-def get_budget_alerts(user, year=None, month=None):
-    """Retourne les catégories qui approchent ou dépassent leur limite (≥ 80%)."""
+@request_memo
+@ledger_cached
+def get_budget_consumption(user, year=None, month=None):
+    """Consommation de chaque limite budgétaire sur le mois — une seule requête.
+
+    Le montant dépensé vient des compteurs MonthlyRollup (dépenses par mois et
+    par catégorie, tenus à jour à chaque écriture) : le coût ne dépend ni du
+    nombre de limites ni de l'historique des transactions.
+    """
     from .models import BudgetLimit
     today = date.today()
-    year  = year  or today.year
-    month = month or today.month
-    alerts = []
-    for lim in BudgetLimit.objects.filter(user=user).select_related('category'):
-        spent = (Transaction.objects
-                 .filter(user=user, category=lim.category, type='expense',
-                         date__year=year, date__month=month)
-                 .aggregate(t=Sum('amount'))['t'] or Decimal(0))
-        pct = int(spent / lim.amount * 100) if lim.amount > 0 else 0
-        if pct >= 80:
-            alerts.append({
-                'category': lim.category.name,
-                'slug':     lim.category.slug,
-                'icon':     lim.category.icon,
-                'color':    lim.category.color_class,
-                'limit':    int(lim.amount),
-                'spent':    int(spent),
-                'pct':      pct,
-                'over':     pct >= 100,
-            })
-    return alerts
+    spent = (MonthlyRollup.objects
+             .filter(user=user, year=year or today.year, month=month or today.month,
+                     type=Transaction.TYPE_EXPENSE, category=OuterRef('category'))
+             .values('category')
+             .annotate(t=Sum('total'))
+             .values('t'))
+    limits = (BudgetLimit.objects
+              .filter(user=user)
+              .select_related('category')
+              .annotate(spent=Coalesce(Subquery(spent), Value(Decimal(0)), output_field=DecimalField()))
+              .order_by('category__name'))
+    rows = []
+    for lim in limits:
+        pct = int(lim.spent / lim.amount * 100) if lim.amount > 0 else 0
+        rows.append({'limit': lim, 'spent': int(lim.spent), 'pct': pct})
+    return rows
+
+
+def get_budget_alerts(user, year=None, month=None):
+    """Retourne les catégories qui approchent ou dépassent leur limite (≥ 80%)."""
+    return [{
+        'category': r['limit'].category.name,
+        'slug':     r['limit'].category.slug,
+        'icon':     r['limit'].category.icon,
+        'color':    r['limit'].category.color_class,
+        'limit':    int(r['limit'].amount),
+        'spent':    r['spent'],
+        'pct':      r['pct'],
+        'over':     r['pct'] >= 100,
+    } for r in get_budget_consumption(user, year, month) if r['pct'] >= 80]
+
+
+@request_memo
+@ledger_cached
+def count_transactions(user, type_filter='', date_from=None, date_to=None):
+    """Total du journal filtré — recalculé seulement après une écriture (version de journal)."""
+    qs = Transaction.objects.filter(user=user)
+    if type_filter:
+        qs = qs.filter(type=type_filter)
+    if date_from:
+        qs = qs.filter(date__gte=date_from)
+    if date_to:
+        qs = qs.filter(date__lte=date_to)
+    return qs.count()
 
 
+@request_memo
+@ledger_cached
 def get_range_stats(user, date_from, date_to):
     """Stats sur une plage de dates personnalisée."""
-    qs   = Transaction.objects.filter(user=user, date__gte=date_from, date__lte=date_to)
-    real = qs.filter(type__in=['income', 'expense'])
-    incomes  = real.filter(type='income').aggregate(t=Sum('amount'))['t']  or Decimal(0)
-    expenses = real.filter(type='expense').aggregate(t=Sum('amount'))['t'] or Decimal(0)
-    net  = incomes - expenses
-    burn = int(expenses / incomes * 100) if incomes > 0 else 0
+    totals = aggregate_ledger(user, date_from, date_to)
     return {
-        'incomes': incomes, 'expenses': expenses, 'net': net,
-        'burn_rate': burn, 'free_pct': max(0, 100 - burn),
-        'tx_count':  real.count(),
+        'incomes': totals['incomes'], 'expenses': totals['expenses'], 'net': totals['net'],
+        'burn_rate': totals['burn_rate'], 'free_pct': totals['free_pct'],
+        'tx_count':  totals['tx_count'],
         'days':      (date_to - date_from).days + 1,
     }
 
 
+@request_memo
+@ledger_cached
 def get_expense_by_category_range(user, date_from, date_to):
     """Dépenses par catégorie sur une plage."""
-    return (
+    return list(
         Transaction.objects
         .filter(user=user, date__gte=date_from, date__lte=date_to, type='expense')
         .values('category__name', 'category__slug', 'category__icon', 'category__color_class')
@@ -143,47 +249,118 @@ def get_expense_by_category_range(user, date_from, date_to):
 
 def get_daily_series(user, date_from, date_to):
     """Séries journalières pour courte plage (≤ 60 jours)."""
+    return get_time_series(user, date_from, date_to, granularity='day')
+
+
+# ── Séries temporelles ─────────────────────────────────────────────────────────
+
+_TRUNC = {'day': TruncDay, 'week': TruncWeek, 'month': TruncMonth, 'quarter': TruncQuarter}
+
+
+def pick_granularity(date_from, date_to):
+    """Granularité adaptée à la longueur de la plage (≈ 8 à 60 points par graphique)."""
+    days = (date_to - date_from).days + 1
+    if days <= 60:
+        return 'day'
+    if days <= 182:
+        return 'week'
+    if days <= 3 * 366:
+        return 'month'
+    return 'quarter'
+
+
+def _bucket_start(d, granularity):
+    if granularity == 'week':
+        return d - timedelta(days=d.weekday())
+    if granularity == 'month':
+        return d.replace(day=1)
+    if granularity == 'quarter':
+        return date(d.year, (d.month - 1) // 3 * 3 + 1, 1)
+    return d
+
+
+def _next_bucket(d, granularity):
+    if granularity == 'week':
+        return d + timedelta(days=7)
+    if granularity in ('month', 'quarter'):
+        idx = d.year * 12 + d.month - 1 + (3 if granularity == 'quarter' else 1)
+        return date(idx // 12, idx % 12 + 1, 1)
+    return d + timedelta(days=1)
+
+
+def _bucket_label(d, granularity, multi_year):
+    if granularity == 'week':
+        return f'S{d.isocalendar()[1]:02d}'
+    if granularity == 'month':
+        return d.strftime('%b %y' if multi_year else '%b')
+    if granularity == 'quarter':
+        return f'T{(d.month - 1) // 3 + 1} {d.year}'
+    return d.strftime('%d/%m')
+
+
+@request_memo
+@ledger_cached
+def get_time_series(user, date_from, date_to, granularity=None):
+    """Revenus/dépenses par jour, semaine ISO, mois ou trimestre — une requête ``GROUP BY``.
+
+    Les périodes sans transaction sont complétées à zéro ; chaque point a la forme
+    ``{label, income, expense}`` attendue par ``initAnalyseCharts``.
+    """
+    granularity = granularity or pick_granularity(date_from, date_to)
+    rows = (Transaction.objects
+            .filter(user=user, date__gte=date_from, date__lte=date_to, type__in=REAL_TYPES)
+            .annotate(bucket=_TRUNC[granularity]('date'))
+            .values('bucket', 'type')
+            .annotate(t=Sum('amount'))
+            .order_by())
+    totals     = {(r['bucket'], r['type']): r['t'] for r in rows}
+    multi_year = date_from.year != date_to.year
     result  = []
-    current = date_from
+    current = _bucket_start(date_from, granularity)
     while current <= date_to:
-        qs = Transaction.objects.filter(user=user, date=current, type__in=['income', 'expense'])
         result.append({
-            'label':   current.strftime('%d/%m'),
-            'income':  int(qs.filter(type='income').aggregate(t=Sum('amount'))['t']  or 0),
-            'expense': int(qs.filter(type='expense').aggregate(t=Sum('amount'))['t'] or 0),
+            'label':   _bucket_label(current, granularity, multi_year),
+            'income':  int(totals.get((current, Transaction.TYPE_INCOME))  or 0),
+            'expense': int(totals.get((current, Transaction.TYPE_EXPENSE)) or 0),
         })
-        current += timedelta(days=1)
+        current = _next_bucket(current, granularity)
     return result
 
 
+@request_memo
+@ledger_cached
+def get_patrimoine_breakdown(user):
+    """Actifs, passifs, net et totaux par catégorie — une seule requête groupée (type × catégorie)."""
+    from .models import PatrimoineEntry
+    labels = dict(PatrimoineEntry.CAT_CHOICES)
+    rows = (PatrimoineEntry.objects
+            .filter(user=user)
+            .values('ptype', 'category')
+            .annotate(total=Sum('valeur'), n=Count('id'))
+            .order_by('-total'))
+    totals     = {'actif': Decimal(0), 'passif': Decimal(0)}
+    categories = {'actif': [], 'passif': []}
+    for r in rows:
+        totals[r['ptype']] += r['total']
+        categories[r['ptype']].append({
+            'category': r['category'], 'label': labels.get(r['category'], r['category']),
+            'total': r['total'], 'count': r['n'],
+        })
+    return {
+        'actifs':      totals['actif'],
+        'passifs':     totals['passif'],
+        'net':         totals['actif'] - totals['passif'],
+        'cat_actifs':  categories['actif'],
+        'cat_passifs': categories['passif'],
+    }
+
+
 def get_patrimoine_summary(user):
     """Actifs − Passifs = Patrimoine net."""
-    from .models import PatrimoineEntry
-    actifs  = PatrimoineEntry.objects.filter(user=user, ptype='actif').aggregate(t=Sum('valeur'))['t']  or Decimal(0)
-    passifs = PatrimoineEntry.objects.filter(user=user, ptype='passif').aggregate(t=Sum('valeur'))['t'] or Decimal(0)
-    return {'actifs': actifs, 'passifs': passifs, 'net': actifs - passifs}
+    b = get_patrimoine_breakdown(user)
+    return {'actifs': b['actifs'], 'passifs': b['passifs'], 'net': b['net']}
 
 
 def parse_sms(sms_text):
-    """Parse un SMS Mobile Money (regex, sans IA)."""
-    if not sms_text or len(sms_text) < 10:
-        return None
-    am = re.search(r'(\d[\d\s]{1,10})\s*(?:F CFA|FCFA|XAF)', sms_text, re.IGNORECASE)
-    if not am:
-        return None
-    amount    = int(am.group(1).replace(' ', ''))
-    is_income = bool(re.search(r'\b(reçu|received|crédit|crédité|déposé)\b', sms_text, re.IGNORECASE))
-    network   = ('MTN MoMo' if re.search(r'\bMTN\b', sms_text, re.IGNORECASE)
-                 else 'Orange Money' if re.search(r'\bOrange\b', sms_text, re.IGNORECASE)
-                 else 'Mobile Money')
-    sender_m  = re.search(r'(?:de|from)\s+([A-Z][a-zA-Z\s]{2,25})', sms_text)
-    sender    = sender_m.group(1).strip() if sender_m else network
-    return {
-        'amount':      amount,
-        'type':        'income' if is_income else 'expense',
-        'description': f'{"Reçu de" if is_income else "Envoyé à"} {sender}',
-        'network':     network,
-        'raw_sms':     sms_text,
-        'date':        date.today().isoformat(),
-        'source':      'sms',
-    }
+    """Parse un SMS Mobile Money (grammaires par opérateur, sans IA) — voir sms.py."""
+    return sms.parse(sms_text)
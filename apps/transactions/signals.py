@@ -0,0 +1,110 @@
+"""Maintenance des données dérivées du journal à chaque écriture."""
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, post_migrate
+from django.dispatch import receiver
+from django.utils import timezone
+from .models import (
+    Transaction, TransactionTombstone, Category, BudgetLimit, PatrimoineEntry, MonthlyRollup,
+    transactions_bulk_created,
+)
+from . import rollups, memo, search, networth
+from .stats_cache import bump_ledger_version
+
+_SNAPSHOT_FIELDS = ('user_id', 'date', 'type', 'category_id', 'amount')
+
+
+def ledger_changed(user_id):
+    """Invalide tout ce qui est calculé à partir des données d'un utilisateur."""
+    memo.invalidate(user_id)
+    bump_ledger_version(user_id)
+    # Seconde incrémentation au commit : une lecture concurrente faite avant le
+    # commit ne peut pas laisser en cache un résultat antérieur à l'écriture.
+    transaction.on_commit(lambda: bump_ledger_version(user_id))
+
+
+@receiver(pre_save, sender=Transaction)
+def _remember_previous(sender, instance, raw=False, **kwargs):
+    instance._previous = None
+    if raw or instance._state.adding or instance.pk is None:
+        return
+    instance._previous = sender.objects.filter(pk=instance.pk).values(*_SNAPSHOT_FIELDS).first()
+
+
+@receiver(post_save, sender=Transaction)
+def _transaction_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    rollups.apply_change(getattr(instance, '_previous', None), instance)
+    instance._previous = None
+    ledger_changed(instance.user_id)
+
+
+@receiver(transactions_bulk_created, sender=Transaction)
+def _transactions_bulk_created(sender, instances, **kwargs):
+    rollups.apply_bulk(instances)
+    for user_id in {tx.user_id for tx in instances}:
+        ledger_changed(user_id)
+
+
+def _cascaded(origin):
+    """Suppression en cascade (ex. compte utilisateur) : les agrégats partent avec."""
+    model = getattr(origin, 'model', type(origin))
+    return origin is not None and model is not Transaction
+
+
+@receiver(post_delete, sender=Transaction)
+def _transaction_deleted(sender, instance, origin=None, **kwargs):
+    if _cascaded(origin):
+        return
+    rollups.apply_change(instance, None)
+    TransactionTombstone.objects.create(user_id=instance.user_id, transaction_id=instance.pk)
+    ledger_changed(instance.user_id)
+
+
+@receiver(pre_delete, sender=Category)
+def _category_deleting(sender, instance, **kwargs):
+    rows = Transaction.objects.filter(category=instance)
+    instance._affected_users = (
+        set(rows.values_list('user_id', flat=True).distinct())
+        | set(MonthlyRollup.objects.filter(category=instance).values_list('user_id', flat=True).distinct())
+    )
+    # Détachement explicite (au lieu du SET_NULL silencieux) : la synchro delta voit les lignes modifiées
+    rows.update(category=None, updated_at=timezone.now())
+
+
+@receiver(post_delete, sender=Category)
+def _category_deleted(sender, instance, **kwargs):
+    # Le SET_NULL laisse plusieurs agrégats « sans catégorie » pour une même clé : on les reconstruit
+    for user_id in getattr(instance, '_affected_users', ()):
+        rollups.rebuild(user_id)
+        ledger_changed(user_id)
+
+
+@receiver(post_save,   sender=BudgetLimit)
+@receiver(post_delete, sender=BudgetLimit)
+@receiver(post_save,   sender=PatrimoineEntry)
+@receiver(post_delete, sender=PatrimoineEntry)
+def _user_data_changed(sender, instance, **kwargs):
+    ledger_changed(instance.user_id)
+
+
+@receiver(post_save,   sender=PatrimoineEntry)
+@receiver(post_delete, sender=PatrimoineEntry)
+def _patrimoine_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        networth.rebuild(instance.user)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def _user_created(sender, instance, created, raw=False, **kwargs):
+    # Un identifiant réutilisé (base recréée) ne doit pas hériter d'un ancien cache
+    if created and not raw:
+        bump_ledger_version(instance.pk)
+
+
+@receiver(post_migrate)
+def _search_index(sender, using='default', **kwargs):
+    # Sous SQLite, reconstruire la table du journal (AlterField…) supprime les triggers de l'index
+    if sender.label == 'transactions':
+        search.ensure_index(using)
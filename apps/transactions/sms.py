@@ -0,0 +1,212 @@
+"""
+Analyse des SMS Mobile Money — grammaires par opérateur, expressions compilées une fois au chargement.
+
+Chaque grammaire reconnaît l'opérateur (``detect``) et ses formats propres (référence de transaction,
+libellés) ; les opérations courantes (reçu, transfert, paiement, retrait…) sont partagées.
+``parse`` renvoie montant, frais, solde, contrepartie, référence, date réelle et un score de confiance.
+"""
+import json
+import re
+import time
+from datetime import date, datetime
+
+# Montant : « 25000 », « 25 000 », « 10.000 », « 25000.00 » suivi de la devise
+_NUM      = r'\d{1,3}(?:[  .,]\d{3})+(?![\d])|\d+'
+_CURRENCY = r'\s*(?:FCFA|F\s?CFA|XAF)\b'
+_AMOUNT   = rf'(?<![\d])(?P<amount>{_NUM})(?:[.,]\d{{1,2}})?{_CURRENCY}'
+# Contrepartie : numéro facultatif puis nom commençant par une majuscule (sensible à la casse)
+_PARTY    = (r'(?:\(?\+?\d{8,12}\)?\s+)?'
+             r'(?-i:(?P<party>[A-ZÀ-Ý][\wÀ-ÿ\'’&.-]*(?:\s+[A-ZÀ-Ý0-9][\wÀ-ÿ\'’&+.-]*){0,4}))')
+_TO       = r'\s+(?:à|a|vers|to)\s+'
+_FROM     = r'\s+(?:de|du|from)\s+'
+
+_FLAGS  = re.IGNORECASE
+_SPACES = re.compile(r'\s+')
+
+
+def _action(pattern, type_, operation):
+    return re.compile(pattern.format(AMOUNT=_AMOUNT, PARTY=_PARTY, TO=_TO, FROM=_FROM), _FLAGS), type_, operation
+
+
+# Opérations communes aux opérateurs (ordre = priorité)
+_ACTIONS = [
+    _action(r'(?:vous avez re[çc]u|you have received)\s+{AMOUNT}(?:{FROM}{PARTY})?', 'income', 'transfert reçu'),
+    _action(r'(?:vous avez transf[ée]r[ée]|vous avez envoy[ée]|you have sent)\s+{AMOUNT}(?:{TO}{PARTY})?',
+            'expense', 'transfert'),
+    _action(r'transfert de\s+{AMOUNT}(?:{TO}{PARTY})?', 'expense', 'transfert'),
+    _action(r'(?:paiement de|vous avez pay[ée]|you have paid)\s+{AMOUNT}(?:{TO}{PARTY})?', 'expense', 'paiement'),
+    _action(r'retrait de\s+{AMOUNT}', 'expense', 'retrait'),
+    _action(r'd[ée]p[ôo]t de\s+{AMOUNT}', 'income', 'dépôt'),
+    _action(r'achat de cr[ée]dit(?: de)?\s+{AMOUNT}', 'expense', 'crédit'),
+]
+
+# Formulations libres (opérateur inconnu) : mot-clé proche du montant, confiance moindre
+_LOOSE = [
+    _action(r'(?:re[çc]u|received|cr[ée]dit[ée]e?|credited|d[ée]pos[ée])\b[^.\n]{{0,40}}?{AMOUNT}(?:{FROM}{PARTY})?',
+            'income', 'transfert reçu'),
+    _action(r'(?:d[ée]bit[ée]e?|debited|envoy[ée]|sent|pay[ée]|paid|transf[ée]r[ée]|retir[ée])\b[^.\n]{{0,40}}?{AMOUNT}',
+            'expense', 'paiement'),
+    _action(r'{AMOUNT}[^.\n]{{0,30}}?\b(?:re[çc]us?|cr[ée]dit[ée]s?|credited)\b', 'income', 'transfert reçu'),
+    _action(r'{AMOUNT}[^.\n]{{0,30}}?\b(?:d[ée]bit[ée]s?|debited|envoy[ée]s?|pay[ée]s?)\b', 'expense', 'paiement'),
+]
+
+_HAS_AMOUNT = re.compile(rf'\d{_CURRENCY}', _FLAGS)
+_FEES    = re.compile(rf'\b(?:frais|fees?)\s*:?\s*({_NUM}){_CURRENCY}', _FLAGS)
+_BALANCE = re.compile(rf'\b(?:nouveau\s+solde|new\s+balance|solde|balance)(?:\s+est\s+de)?\s*:?\s*({_NUM}){_CURRENCY}',
+                      _FLAGS)
+_DATES   = [
+    # 2024-03-05 14:22:10
+    re.compile(r'(?P<y>\d{4})-(?P<m>\d{2})-(?P<d>\d{2})(?:[ T]+(?P<H>\d{1,2}):(?P<M>\d{2})(?::(?P<S>\d{2}))?)?'),
+    # 05/03/2024 09:30 — 05/03/24 à 11h20
+    re.compile(r'(?P<d>\d{1,2})[/.-](?P<m>\d{1,2})[/.-](?P<y>\d{4}|\d{2})\b'
+               r'(?:\s*(?:à|a|at)?\s*(?P<H>\d{1,2})[h:](?P<M>\d{2})(?::(?P<S>\d{2}))?)?', _FLAGS),
+]
+
+
+class Grammar:
+    """Format SMS d'un opérateur : détection, référence de transaction, opérations propres."""
+
+    def __init__(self, network, detect, reference, actions=(), base=0.5):
+        self.network   = network
+        self.detect    = re.compile(detect, _FLAGS) if detect else None
+        self.reference = re.compile(reference, _FLAGS)
+        self.actions   = list(actions) + _ACTIONS
+        self.base      = base
+
+
+GRAMMARS = [
+    Grammar('MTN MoMo',
+            detect=r'\bMTN\b|\bMoMo\b|\bY.ello\b|ID de transaction\s*:?\s*\d{8,}',
+            reference=r'(?:ID de transaction|Transaction ID)\s*:?\s*(\d{6,})'),
+    Grammar('Orange Money',
+            detect=r'\bOrange\b|^\s*OM\b|Trans\s*Id\s*:?\s*[A-Z]{2}\d{6}\.',
+            reference=r'Trans\s*Id\s*:?\s*([A-Z]{2}\d{6}\.\d{4}\.[A-Z0-9]+)'),
+    Grammar('Express Union',
+            detect=r'Express\s*Union|\bEU\s*Mobile|^\s*EUM?\b',
+            reference=r'\bR[ée]f\.?\s*:?\s*(EU\d{6,})'),
+]
+
+GENERIC = Grammar(
+    'Mobile Money', detect=None,
+    reference=r'(?:R[ée]f(?:[ée]rence)?|ID de transaction|Transaction ID|Trans\s*Id)\.?\s*:?\s*([A-Z0-9][A-Z0-9.]{4,}[A-Z0-9])',
+    base=0.4,
+)
+GENERIC.actions += _LOOSE
+
+
+def _amount(raw):
+    return int(re.sub(r'\D', '', raw))
+
+
+def _timestamp(text):
+    for pattern in _DATES:
+        for m in pattern.finditer(text):
+            year = int(m['y'])
+            year = year + 2000 if year < 100 else year
+            try:
+                return datetime(year, int(m['m']), int(m['d']),
+                                int(m['H'] or 0), int(m['M'] or 0), int(m['S'] or 0))
+            except ValueError:
+                continue
+    return None
+
+
+def _description(operation, type_, party, network):
+    if operation == 'paiement' and party:
+        return f'Paiement {party}'
+    if operation == 'retrait':
+        return f'Retrait {network}'
+    if operation == 'dépôt':
+        return f'Dépôt {network}'
+    if operation == 'crédit':
+        return 'Achat de crédit'
+    return f'{"Reçu de" if type_ == "income" else "Envoyé à"} {party or network}'
+
+
+def _match(grammar, text):
+    for pattern, type_, operation in grammar.actions:
+        m = pattern.search(text)
+        if m:
+            break
+    else:
+        return None
+
+    party     = (m.groupdict().get('party') or '').strip(' .,;:') or None
+    fees      = _FEES.search(text)
+    balance   = _BALANCE.search(text, m.end('amount'))
+    reference = grammar.reference.search(text)
+    when      = _timestamp(text)
+
+    # Opérateur identifié, puis chaque champ de contrôle trouvé, renforcent la confiance
+    confidence = grammar.base + (0.15 if grammar.detect else 0)
+    confidence += 0.1 * sum(x is not None for x in (reference, balance, when)) + (0.05 if party else 0)
+    network    = grammar.network
+    return {
+        'amount':       _amount(m['amount']),
+        'type':         type_,
+        'description':  _description(operation, type_, party, network),
+        'network':      network,
+        'operation':    operation,
+        'fees':         _amount(fees.group(1)) if fees else None,
+        'balance':      _amount(balance.group(1)) if balance else None,
+        'counterparty': party,
+        'reference':    reference.group(1) if reference else None,
+        'datetime':     when.isoformat() if when else None,
+        'date':         (when.date() if when else date.today()).isoformat(),
+        'confidence':   round(min(confidence, 1.0), 2),
+    }
+
+
+def parse(sms_text):
+    """Analyse un SMS Mobile Money ; None s'il ne décrit pas une opération."""
+    if not sms_text or len(sms_text) < 10:
+        return None
+    text = _SPACES.sub(' ', sms_text).strip()
+    if not _HAS_AMOUNT.search(text):
+        return None
+    for grammar in GRAMMARS:
+        if grammar.detect.search(text):
+            result = _match(grammar, text) or _match(GENERIC, text)
+            break
+    else:
+        result = _match(GENERIC, text)
+    if result is None:
+        return None
+    result['raw_sms'] = sms_text
+    result['source']  = 'sms'
+    return result
+
+
+# ── Corpus de référence ──────────────────────────────────────────────────────
+
+def load_corpus(path):
+    with open(path, encoding='utf-8') as fh:
+        return json.load(fh)
+
+
+def evaluate(corpus, parser=parse):
+    """Compare ``parser`` aux valeurs attendues du corpus. Retourne (réussites, écarts)."""
+    ok, misses = 0, []
+    for sample in corpus:
+        expected = sample['expected']
+        result   = parser(sample['sms'])
+        if expected is None or result is None:
+            diff = {} if expected is None and result is None else {'result': result, 'expected': expected}
+        else:
+            diff = {k: (result.get(k), v) for k, v in expected.items() if result.get(k) != v}
+        if diff:
+            misses.append((sample['sms'], diff))
+        else:
+            ok += 1
+    return ok, misses
+
+
+def throughput(corpus, repeat=100, parser=parse):
+    """Messages analysés par seconde sur ``repeat`` passes du corpus."""
+    texts = [sample['sms'] for sample in corpus]
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for text in texts:
+            parser(text)
+    elapsed = time.perf_counter() - start
+    return len(texts) * repeat / elapsed if elapsed else float('inf')
@@ -0,0 +1,98 @@
+"""Cache inter-requêtes des services financiers, invalidé par version du journal.
+
+Chaque utilisateur possède une version de journal, incrémentée à chaque écriture
+(transaction, limite budgétaire, patrimoine). Les résultats sont rangés sous une
+clé qui contient cette version : une écriture rend toutes les entrées précédentes
+inaccessibles, sans TTL à deviner ni suppression explicite.
+"""
+import functools
+import hashlib
+import threading
+import time
+from datetime import date
+from django.conf import settings
+from django.core.cache import cache
+
+VERSION_KEY = 'finai:ledger:v:{}'
+HITS_KEY    = 'finai:ledger:hits'
+MISSES_KEY  = 'finai:ledger:misses'
+FLUSH_EVERY = 100
+
+_MISSING = object()
+_lock    = threading.Lock()
+_local   = {'hits': 0, 'misses': 0}
+
+
+def _enabled():
+    return getattr(settings, 'FINAI_STATS_CACHE', True)
+
+
+def ledger_version(user_id):
+    """Version courante du journal d'un utilisateur."""
+    key     = VERSION_KEY.format(user_id)
+    version = cache.get(key)
+    if version is None:
+        # Valeur initiale horodatée : jamais inférieure à une version évincée du cache
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_ledger_version(user_id):
+    key = VERSION_KEY.format(user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), timeout=None)
+
+
+def _count(name):
+    with _lock:
+        _local[name] += 1
+        if _local['hits'] + _local['misses'] < FLUSH_EVERY:
+            return
+        pending = dict(_local)
+        _local.update(hits=0, misses=0)
+    for counter, key in (('hits', HITS_KEY), ('misses', MISSES_KEY)):
+        if pending[counter]:
+            cache.add(key, 0, timeout=None)
+            try:
+                cache.incr(key, pending[counter])
+            except ValueError:
+                pass
+
+
+def hit_ratio():
+    """Compteurs agrégés (tous processus) + compteurs locaux non encore publiés."""
+    with _lock:
+        hits, misses = _local['hits'], _local['misses']
+    hits   += cache.get(HITS_KEY, 0)
+    misses += cache.get(MISSES_KEY, 0)
+    total   = hits + misses
+    return {'hits': hits, 'misses': misses, 'hit_ratio': round(hits / total, 4) if total else None}
+
+
+def ledger_cached(fn):
+    """Décorateur : met en cache ``fn(user, …)`` sous la version de journal de l'utilisateur."""
+    name = f'{fn.__module__}.{fn.__qualname__}'
+
+    @functools.wraps(fn)
+    def wrapper(user, *args, **kwargs):
+        if not _enabled() or getattr(user, 'pk', None) is None:
+            return fn(user, *args, **kwargs)
+        # La date du jour fait partie de la clé : « mois courant » change sans écriture
+        signature = repr((args, sorted(kwargs.items()), date.today()))
+        key = 'finai:svc:{}:{}:{}:{}'.format(
+            name, user.pk, ledger_version(user.pk),
+            hashlib.md5(signature.encode()).hexdigest(),
+        )
+        value = cache.get(key, _MISSING)
+        if value is not _MISSING:
+            _count('hits')
+            return value
+        _count('misses')
+        value = fn(user, *args, **kwargs)
+        cache.set(key, value, timeout=settings.FINAI_STATS_CACHE_TIMEOUT)
+        return value
+
+    return wrapper
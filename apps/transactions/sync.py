@@ -0,0 +1,93 @@
+"""Synchronisation différentielle du journal pour la PWA.
+
+Le client garde un jeton opaque ; chaque appel ne renvoie que les transactions
+créées/modifiées (``updated_at``) et les suppressions (tombstones) postérieures.
+Les deux flux sont paginés par clé ``(horodatage, id)``.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.conf import settings
+from django.core import signing
+from django.db.models import Q
+from django.utils import timezone
+from .models import Transaction, TransactionTombstone
+
+_SALT = 'finai.sync'
+
+
+def encode_token(position):
+    # Signature sans horodatage : même position ⇒ même jeton, donc même ETag d'une seconde à l'autre
+    return signing.Signer(salt=_SALT).sign_object(position, compress=True)
+
+
+def decode_token(token):
+    """``{'tx': [iso, id], 'del': [iso, id]}`` ou None (jeton absent/invalide ⇒ synchro complète)."""
+    if not token:
+        return None
+    try:
+        position = signing.Signer(salt=_SALT).unsign_object(token)
+        for key in ('tx', 'del'):
+            datetime.fromisoformat(position[key][0])
+            int(position[key][1])
+        return position
+    except (signing.BadSignature, KeyError, IndexError, TypeError, ValueError):
+        return None
+
+
+def _after(field, key):
+    ts, pk = datetime.fromisoformat(key[0]), key[1]
+    return Q(**{f'{field}__gt': ts}) | Q(**{field: ts, 'id__gt': pk})
+
+
+def _advance(rows, field, key, full_page, settle):
+    """Nouvelle position après ``rows``.
+
+    En fin de flux, la position ne dépasse pas ``settle`` : une écriture encore
+    non validée au moment de la lecture, horodatée juste avant, sera renvoyée au
+    prochain appel plutôt que perdue (les clients appliquent des upserts).
+    """
+    if not rows:
+        return key
+    last = rows[-1]
+    ts   = getattr(last, field)
+    if full_page or ts <= settle:
+        return [ts.isoformat(), last.pk]
+    return max(key, [settle.isoformat(), 0], key=lambda k: datetime.fromisoformat(k[0]))
+
+
+def changes_since(user, token=None, limit=None):
+    """Changements postérieurs à ``token``.
+
+    Retourne ``{'changed', 'deleted', 'since', 'has_more', 'full'}`` ; ``full`` indique
+    une synchro complète (jeton absent ou invalide) : le client repart de zéro.
+    """
+    limit    = limit or settings.SYNC_PAGE_SIZE
+    settle   = timezone.now() - timedelta(seconds=settings.SYNC_SETTLE_SECONDS)
+    position = decode_token(token)
+    origin   = [datetime.min.replace(tzinfo=dt_timezone.utc).isoformat(), 0]
+
+    changed = Transaction.objects.filter(user=user).select_related('category')
+    deleted = TransactionTombstone.objects.filter(user=user)
+    if position:
+        changed = changed.filter(_after('updated_at', position['tx']))
+        deleted = deleted.filter(_after('deleted_at', position['del']))
+    changed = list(changed.order_by('updated_at', 'id')[:limit + 1])
+    deleted = list(deleted.order_by('deleted_at', 'id')[:limit + 1]) if position else []
+
+    more_tx, more_del = len(changed) > limit, len(deleted) > limit
+    changed, deleted  = changed[:limit], deleted[:limit]
+    start = position or {'tx': origin, 'del': origin}
+    if not position:
+        # Synchro complète : les suppressions antérieures n'intéressent pas le client
+        last = TransactionTombstone.objects.filter(user=user).order_by('-deleted_at', '-id').first()
+        start['del'] = [last.deleted_at.isoformat(), last.pk] if last else origin
+    new_position = {
+        'tx':  _advance(changed, 'updated_at', start['tx'],  more_tx,  settle),
+        'del': _advance(deleted, 'deleted_at', start['del'], more_del, settle),
+    }
+    return {
+        'changed':  changed,
+        'deleted':  [t.transaction_id for t in deleted],
+        'since':    encode_token(new_position),
+        'has_more': more_tx or more_del,
+        'full':     position is None,
+    }
@@ -1,10 +1,22 @@
 """Tests — app transactions."""
-from django.test import TestCase, Client
+from django.test import TestCase, Client, RequestFactory, override_settings
+from django.http import HttpResponse
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.core.management import call_command, CommandError
 from django.urls import reverse
 from apps.accounts.models import User
-from .models import Transaction, Category, BudgetLimit
-from .services import get_monthly_stats, compute_score, get_budget_alerts, parse_sms
+from .models import Transaction, Category, BudgetLimit, PatrimoineEntry, MonthlyRollup, sms_digest
+from .services import (
+    get_monthly_stats, compute_score, get_budget_alerts, parse_sms,
+    aggregate_ledger, get_range_stats, get_patrimoine_summary, get_monthly_series,
+    get_time_series, pick_granularity, get_expense_by_category,
+    get_expense_by_category_range, detect_leaks,
+)
+from . import rollups
 import datetime
+import json
+from io import StringIO
 
 
 class TransactionViewsTest(TestCase):
@@ -36,6 +48,36 @@ class TransactionViewsTest(TestCase):
         self.assertEqual(r.status_code, 200)
         self.assertTrue(r.context['transactions'].has_other_pages())
 
+    def test_journal_cursor_walks_whole_ledger(self):
+        today = datetime.date.today()
+        created = [Transaction.objects.create(
+            user=self.user, amount=1000 + i, type='expense', description=f'Dépense {i}',
+            date=today - datetime.timedelta(days=i // 3)).pk for i in range(60)]
+        seen, cursor, pages = [], None, []
+        while True:
+            r = self.client.get(reverse('transactions:journal'), {'cursor': cursor} if cursor else {})
+            page = r.context['transactions']
+            pages.append(page)
+            seen += [tx.pk for tx in page]
+            if not page.has_next():
+                break
+            cursor = page.next_cursor
+        self.assertEqual(sorted(seen), sorted(created))
+        self.assertEqual(len(pages), 3)
+        self.assertEqual(r.context['total_count'], 60)
+        back = self.client.get(reverse('transactions:journal'), {'cursor': pages[-1].previous_cursor})
+        self.assertEqual([tx.pk for tx in back.context['transactions']], [tx.pk for tx in pages[1]])
+
+    def test_journal_tampered_cursor_shows_first_page(self):
+        r = self.client.get(reverse('transactions:journal'), {'cursor': 'abc'})
+        self.assertEqual(r.status_code, 200)
+        self.assertFalse(r.context['transactions'].has_previous())
+
+    def test_analyse_long_range_uses_range_buckets(self):
+        r = self.client.get(reverse('transactions:analyse'), {'date_from': '2024-01-01', 'date_to': '2025-12-31'})
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(len(json.loads(r.context['series_json'])), 24)
+
     # ── Add ───────────────────────────────────────────────────────────────────
 
     def test_add_transaction(self):
@@ -113,6 +155,21 @@ class TransactionViewsTest(TestCase):
         self.assertEqual(r.status_code, 200)
         self.assertIn('text/csv', r['Content-Type'])
 
+    def test_export_csv_streams_rows(self):
+        for i in range(600):
+            Transaction(user=self.user, amount=100 + i, type='expense', description=f'Op {i}',
+                        category=self.cat if i % 2 else None, date=datetime.date.today()).save()
+        r = self.client.get(reverse('transactions:export_csv'))
+        self.assertTrue(r.streaming)
+        with self.assertNumQueries(1):  # catégories déjà chargées par la vue
+            body = b''.join(r.streaming_content).decode('utf-8')
+        lines = body.splitlines()
+        self.assertTrue(lines[0].startswith('\ufeffDate;Type;'))
+        self.assertEqual(len(lines), 601)
+        self.assertIn(';Dépense;', lines[1])
+        self.assertTrue(any(';Alimentation;' in l for l in lines[1:3]))
+        self.assertTrue(any(';Divers;' in l for l in lines[1:3]))
+
     # ── Budgets ───────────────────────────────────────────────────────────────
 
     def test_budgets_page_loads(self):
@@ -161,6 +218,42 @@ class TransactionServicesTest(TestCase):
         self.assertEqual(int(stats['net']),      120000)
         self.assertEqual(stats['burn_rate'], 40)
 
+    def test_monthly_stats_single_query(self):
+        today = datetime.date.today()
+        Transaction.objects.create(user=self.user, amount=200000, type='income',          description='Salaire', date=today)
+        Transaction.objects.create(user=self.user, amount=30000,  type='planned_expense', description='Loyer',   date=today)
+        with self.assertNumQueries(1):
+            stats = get_monthly_stats(self.user)
+        self.assertEqual(int(stats['planned_exp']), 30000)
+        self.assertEqual(int(stats['planned_inc']), 0)
+
+    def test_aggregate_ledger_counts_and_ratios(self):
+        today = datetime.date.today()
+        Transaction.objects.create(user=self.user, amount=100000, type='income',  description='Salaire', date=today)
+        Transaction.objects.create(user=self.user, amount=20000,  type='expense', description='Courses', date=today)
+        Transaction.objects.create(user=self.user, amount=5000,   type='expense', description='Taxi',    date=today)
+        totals = aggregate_ledger(self.user, today, today)
+        self.assertEqual(totals['counts']['expense'], 2)
+        self.assertEqual(totals['tx_count'], 3)
+        self.assertEqual(totals['burn_rate'], 25)
+        self.assertAlmostEqual(totals['saving_rate'], 0.75)
+
+    def test_range_stats_single_query(self):
+        today = datetime.date.today()
+        Transaction.objects.create(user=self.user, amount=50000, type='income', description='Prime', date=today)
+        with self.assertNumQueries(1):
+            stats = get_range_stats(self.user, today - datetime.timedelta(days=7), today)
+        self.assertEqual(stats['tx_count'], 1)
+        self.assertEqual(stats['days'], 8)
+
+    def test_patrimoine_summary_single_query(self):
+        today = datetime.date.today()
+        PatrimoineEntry.objects.create(user=self.user, ptype='actif',  label='Terrain', valeur=900000, date=today)
+        PatrimoineEntry.objects.create(user=self.user, ptype='passif', label='Prêt',    valeur=300000, date=today)
+        with self.assertNumQueries(1):
+            summary = get_patrimoine_summary(self.user)
+        self.assertEqual(int(summary['net']), 600000)
+
     def test_compute_score_no_income(self):
         score = compute_score(self.user)
         self.assertEqual(score['total'], 0)
@@ -186,6 +279,27 @@ class TransactionServicesTest(TestCase):
         alerts = get_budget_alerts(self.user)
         self.assertEqual(len(alerts), 0)
 
+    def test_budget_alerts_single_query(self):
+        today = datetime.date.today()
+        for i in range(15):
+            cat = Category.objects.create(name=f'Cat {i}', slug=f'cat-{i}')
+            BudgetLimit.objects.create(user=self.user, category=cat, amount=10000)
+            Transaction.objects.create(user=self.user, amount=9000 if i % 2 else 1000, type='expense',
+                                       description='Achat', category=cat, date=today)
+        with override_settings(FINAI_STATS_CACHE=False), self.assertNumQueries(1):
+            alerts = get_budget_alerts(self.user)
+        self.assertEqual(len(alerts), 7)
+        self.assertTrue(all(a['pct'] == 90 for a in alerts))
+
+    def test_budget_alert_ignores_other_months_and_types(self):
+        today = datetime.date.today()
+        BudgetLimit.objects.create(user=self.user, category=self.cat, amount=100000)
+        Transaction.objects.create(user=self.user, amount=90000, type='expense', description='Ancien',
+                                   category=self.cat, date=today - datetime.timedelta(days=62))
+        Transaction.objects.create(user=self.user, amount=90000, type='planned_expense', description='Prévu',
+                                   category=self.cat, date=today)
+        self.assertEqual(get_budget_alerts(self.user), [])
+
     def test_parse_sms_mtn(self):
         sms = 'Vous avez reçu 25000 FCFA de DUPOND Jean via MTN MoMo'
         result = parse_sms(sms)
@@ -197,3 +311,1215 @@ class TransactionServicesTest(TestCase):
     def test_parse_sms_invalid(self):
         result = parse_sms('Bonjour')
         self.assertIsNone(result)
+
+
+class MonthlyRollupTest(TestCase):
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='alice', password='pass123')
+        self.client.login(username='alice', password='pass123')
+        self.cat  = Category.objects.create(name='Loisirs', slug='loisirs')
+        self.today = datetime.date.today()
+
+    def _rollup(self, **kw):
+        return MonthlyRollup.objects.filter(user=self.user, **kw).values_list('total', 'count').first()
+
+    def test_create_updates_rollup(self):
+        Transaction.objects.create(user=self.user, amount=1000, type='expense', description='A', date=self.today, category=self.cat)
+        Transaction.objects.create(user=self.user, amount=2500, type='expense', description='B', date=self.today, category=self.cat)
+        self.assertEqual(self._rollup(type='expense', category=self.cat), (3500, 2))
+
+    def test_edit_moves_amount_between_buckets(self):
+        tx = Transaction.objects.create(user=self.user, amount=10000, type='expense', description='Avant', date=self.today)
+        last_year = self.today - datetime.timedelta(days=400)
+        self.client.post(
+            reverse('transactions:edit', args=[tx.pk]),
+            {'amount': 20000, 'type': 'income', 'description': 'Après',
+             'date': last_year, 'category': self.cat.id},
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest'
+        )
+        self.assertIsNone(self._rollup(type='expense'))
+        self.assertEqual(self._rollup(type='income', year=last_year.year, category=self.cat), (20000, 1))
+        self.assertEqual(rollups.verify(self.user), [])
+
+    def test_delete_removes_rollup(self):
+        tx = Transaction.objects.create(user=self.user, amount=1000, type='income', description='A', date=self.today)
+        tx.delete()
+        self.assertFalse(MonthlyRollup.objects.filter(user=self.user).exists())
+
+    def test_stats_read_from_rollup(self):
+        Transaction.objects.create(user=self.user, amount=50000, type='income', description='A', date=self.today)
+        Transaction.objects.filter(user=self.user).update(amount=1)  # contourne les signaux
+        self.assertEqual(int(get_monthly_stats(self.user)['incomes']), 50000)
+
+    def test_monthly_series_calendar_months(self):
+        series = get_monthly_series(self.user, months=13)
+        self.assertEqual(len(series), 13)
+        self.assertEqual(series[0]['label'], series[-1]['label'])
+
+    def test_rebuild_and_verify_command(self):
+        Transaction.objects.create(user=self.user, amount=7000, type='expense', description='A', date=self.today)
+        MonthlyRollup.objects.all().update(total=1)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_rollups', '--verify', stdout=StringIO())
+        call_command('rebuild_rollups', stdout=StringIO())
+        call_command('rebuild_rollups', '--verify', stdout=StringIO())
+        self.assertEqual(self._rollup(type='expense'), (7000, 1))
+
+    def test_user_deletion_cascades(self):
+        Transaction.objects.create(user=self.user, amount=7000, type='expense', description='A', date=self.today)
+        self.user.delete()
+        self.assertFalse(MonthlyRollup.objects.exists())
+
+    def test_category_deletion_folds_rollups(self):
+        Transaction.objects.create(user=self.user, amount=1000, type='expense', description='A', date=self.today, category=self.cat)
+        Transaction.objects.create(user=self.user, amount=2000, type='expense', description='B', date=self.today)
+        self.assertEqual(int(get_monthly_stats(self.user)['expenses']), 3000)
+        self.client.post(reverse('transactions:delete_category', args=[self.cat.pk]))
+        self.assertFalse(Category.objects.filter(pk=self.cat.pk).exists())
+        Transaction.objects.create(user=self.user, amount=500, type='expense', description='C', date=self.today)
+        self.assertEqual(rollups.verify(self.user), [])
+        self.assertEqual(self._rollup(type='expense', category=None), (3500, 3))
+        self.assertEqual(int(get_monthly_stats(self.user)['expenses']), 3500)
+
+
+class TimeSeriesTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='alice', password='pass123')
+
+    def _tx(self, d, amount, type='expense'):
+        Transaction.objects.create(user=self.user, amount=amount, type=type, description='X', date=d)
+
+    def test_pick_granularity(self):
+        d0 = datetime.date(2026, 1, 1)
+        self.assertEqual(pick_granularity(d0, d0 + datetime.timedelta(days=59)),  'day')
+        self.assertEqual(pick_granularity(d0, d0 + datetime.timedelta(days=120)), 'week')
+        self.assertEqual(pick_granularity(d0, d0 + datetime.timedelta(days=700)), 'month')
+        self.assertEqual(pick_granularity(d0, d0 + datetime.timedelta(days=2000)), 'quarter')
+
+    def test_daily_series_single_query_with_gaps(self):
+        d0 = datetime.date(2026, 3, 1)
+        self._tx(d0, 1000)
+        self._tx(d0 + datetime.timedelta(days=9), 4000, 'income')
+        with self.assertNumQueries(1):
+            series = get_time_series(self.user, d0, d0 + datetime.timedelta(days=59))
+        self.assertEqual(len(series), 60)
+        self.assertEqual(series[0], {'label': '01/03', 'income': 0, 'expense': 1000})
+        self.assertEqual(series[9]['income'], 4000)
+
+    def test_weekly_buckets_are_iso_weeks(self):
+        d0 = datetime.date(2026, 1, 7)  # mercredi, semaine ISO 2
+        self._tx(d0, 1000)
+        self._tx(d0 + datetime.timedelta(days=4), 500)  # dimanche, même semaine
+        series = get_time_series(self.user, d0, d0 + datetime.timedelta(days=20), 'week')
+        self.assertEqual(series[0], {'label': 'S02', 'income': 0, 'expense': 1500})
+        self.assertEqual(len(series), 4)
+
+    def test_monthly_and_quarterly_buckets(self):
+        self._tx(datetime.date(2025, 12, 31), 700)
+        self._tx(datetime.date(2026, 2, 15), 300)
+        monthly = get_time_series(self.user, datetime.date(2025, 12, 1), datetime.date(2026, 2, 28), 'month')
+        self.assertEqual([m['expense'] for m in monthly], [700, 0, 300])
+        quarterly = get_time_series(self.user, datetime.date(2025, 10, 1), datetime.date(2026, 3, 31), 'quarter')
+        self.assertEqual(quarterly, [
+            {'label': 'T4 2025', 'income': 0, 'expense': 700},
+            {'label': 'T1 2026', 'income': 0, 'expense': 300},
+        ])
+
+
+@override_settings(FINAI_STATS_CACHE=False)
+class QueryPlanTest(TestCase):
+    """Chaque requête des services doit passer par un index (EXPLAIN), jamais par un scan complet."""
+
+    LEDGER_TABLES = {
+        'transactions_transaction', 'transactions_monthlyrollup',
+        'transactions_patrimoineentry', 'transactions_budgetlimit',
+    }
+
+    def setUp(self):
+        self.user  = User.objects.create_user(username='alice', password='pass123')
+        self.cat   = Category.objects.create(name='Loisirs', slug='loisirs')
+        self.today = datetime.date.today()
+        BudgetLimit.objects.create(user=self.user, category=self.cat, amount=100000)
+        PatrimoineEntry.objects.create(user=self.user, ptype='actif', label='Terrain', valeur=900000, date=self.today)
+        for i in range(20):
+            Transaction.objects.create(
+                user=self.user, amount=1000 + i, type=('income', 'expense')[i % 2],
+                description=f'Op {i}', category=self.cat, date=self.today - datetime.timedelta(days=i * 9),
+            )
+
+    def _full_scans(self, sql, params):
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cur:
+                cur.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+                details = [row[-1] for row in cur.fetchall()]
+            return [d for d in details
+                    if d.startswith('SCAN ') and d.split()[1] in self.LEDGER_TABLES]
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cur:
+                cur.execute('SET LOCAL enable_seqscan = off')
+                cur.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+                plan = cur.fetchone()[0]
+            scans, stack = [], [plan[0]['Plan']]
+            while stack:
+                node = stack.pop()
+                if node['Node Type'] == 'Seq Scan' and node.get('Relation Name') in self.LEDGER_TABLES:
+                    scans.append(f"Seq Scan on {node['Relation Name']}")
+                stack.extend(node.get('Plans', []))
+            return scans
+        self.skipTest(f'EXPLAIN non vérifié pour {connection.vendor}')
+
+    def assertUsesIndexes(self, fn):
+        executed = []
+
+        def capture(execute, sql, params, many, context):
+            executed.append((sql, params))
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(capture):
+            fn()
+        self.assertTrue(executed)
+        for sql, params in executed:
+            self.assertEqual(self._full_scans(sql, params), [], sql)
+
+    def test_monthly_stats(self):
+        self.assertUsesIndexes(lambda: get_monthly_stats(self.user))
+
+    def test_aggregate_ledger(self):
+        self.assertUsesIndexes(lambda: aggregate_ledger(self.user, self.today.replace(day=1), self.today))
+
+    def test_range_stats(self):
+        self.assertUsesIndexes(lambda: get_range_stats(self.user, self.today - datetime.timedelta(days=90), self.today))
+
+    def test_time_series(self):
+        d0 = self.today - datetime.timedelta(days=365)
+        for granularity in ('day', 'week', 'month', 'quarter'):
+            self.assertUsesIndexes(lambda: get_time_series(self.user, d0, self.today, granularity))
+
+    def test_monthly_series(self):
+        self.assertUsesIndexes(lambda: get_monthly_series(self.user))
+
+    def test_expense_by_category(self):
+        self.assertUsesIndexes(lambda: list(get_expense_by_category(self.user)))
+        self.assertUsesIndexes(lambda: detect_leaks(self.user))
+        self.assertUsesIndexes(lambda: list(get_expense_by_category_range(
+            self.user, self.today - datetime.timedelta(days=30), self.today)))
+
+    def test_budget_alerts(self):
+        self.assertUsesIndexes(lambda: get_budget_alerts(self.user))
+
+    def test_patrimoine_summary(self):
+        self.assertUsesIndexes(lambda: get_patrimoine_summary(self.user))
+
+    def test_journal_keyset_page(self):
+        from .pagination import paginate
+        first = paginate(Transaction.objects.filter(user=self.user), per_page=5)
+        self.assertUsesIndexes(lambda: paginate(
+            Transaction.objects.filter(user=self.user).select_related('category'), first.next_cursor, per_page=5))
+
+    def test_journal_listing(self):
+        self.assertUsesIndexes(lambda: list(
+            Transaction.objects.filter(user=self.user, type='expense', date__gte=self.today.replace(day=1))[:25]))
+
+
+class RequestMemoTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='alice', password='pass123')
+
+    def _in_request(self, fn):
+        from .memo import RequestMemoMiddleware, current
+        seen = {}
+
+        def view(request):
+            fn()
+            seen['memo'] = current()
+            return HttpResponse()
+
+        RequestMemoMiddleware(view)(RequestFactory().get('/'))
+        return seen['memo']
+
+    def test_repeated_calls_hit_memo(self):
+        def render():
+            with self.assertNumQueries(1):
+                get_monthly_stats(self.user)
+                get_monthly_stats(self.user)
+        memo = self._in_request(render)
+        self.assertEqual((memo.hits, memo.misses), (1, 1))
+
+    def test_write_invalidates_memo(self):
+        def render():
+            get_monthly_stats(self.user)
+            Transaction.objects.create(user=self.user, amount=9000, type='income',
+                                       description='Prime', date=datetime.date.today())
+            self.assertEqual(int(get_monthly_stats(self.user)['incomes']), 9000)
+        memo = self._in_request(render)
+        self.assertEqual(memo.misses, 2)
+
+    def test_no_memo_outside_request(self):
+        from .memo import current
+        get_monthly_stats(self.user)
+        self.assertIsNone(current())
+
+
+class LedgerCacheTest(TestCase):
+
+    def setUp(self):
+        self.user  = User.objects.create_user(username='alice', password='pass123')
+        self.cat   = Category.objects.create(name='Loisirs', slug='loisirs')
+        self.today = datetime.date.today()
+
+    def test_second_call_served_from_cache(self):
+        get_monthly_stats(self.user)
+        with self.assertNumQueries(0):
+            get_monthly_stats(self.user)
+
+    def test_transaction_write_invalidates(self):
+        self.assertEqual(get_monthly_stats(self.user)['incomes'], 0)
+        tx = Transaction.objects.create(user=self.user, amount=40000, type='income', description='Prime', date=self.today)
+        self.assertEqual(int(get_monthly_stats(self.user)['incomes']), 40000)
+        tx.delete()
+        self.assertEqual(get_monthly_stats(self.user)['incomes'], 0)
+
+    def test_budget_and_patrimoine_writes_invalidate(self):
+        Transaction.objects.create(user=self.user, amount=90000, type='expense', description='Sortie',
+                                   category=self.cat, date=self.today)
+        self.assertEqual(get_budget_alerts(self.user), [])
+        BudgetLimit.objects.create(user=self.user, category=self.cat, amount=100000)
+        self.assertEqual(len(get_budget_alerts(self.user)), 1)
+        self.assertEqual(get_patrimoine_summary(self.user)['net'], 0)
+        PatrimoineEntry.objects.create(user=self.user, ptype='actif', label='Moto', valeur=500000, date=self.today)
+        self.assertEqual(int(get_patrimoine_summary(self.user)['net']), 500000)
+
+    def test_cache_is_per_user(self):
+        bob = User.objects.create_user(username='bob', password='pass123')
+        Transaction.objects.create(user=self.user, amount=1000, type='income', description='A', date=self.today)
+        get_monthly_stats(self.user)
+        self.assertEqual(get_monthly_stats(bob)['incomes'], 0)
+
+    def test_hit_ratio_exposed(self):
+        from .stats_cache import hit_ratio
+        before = hit_ratio()
+        get_monthly_stats(self.user)
+        get_monthly_stats(self.user)
+        after = hit_ratio()
+        self.assertEqual(after['hits'] - before['hits'], 1)
+        self.assertEqual(after['misses'] - before['misses'], 1)
+
+
+@override_settings(SYNC_SETTLE_SECONDS=0)
+class DeltaSyncTest(TestCase):
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='alice', password='pass123')
+        self.client.login(username='alice', password='pass123')
+        self.txs = [Transaction.objects.create(
+            user=self.user, amount=1000 * (i + 1), type='expense',
+            description=f'Op {i}', date=datetime.date.today()) for i in range(3)]
+
+    def _sync(self, since=None, **headers):
+        return self.client.get(reverse('transactions:api_sync'), {'since': since} if since else {}, **headers)
+
+    def test_full_then_delta(self):
+        first = self._sync().json()
+        self.assertTrue(first['full'])
+        self.assertEqual(len(first['changes']), 3)
+
+        tx = self.txs[1]
+        tx.description = 'Modifiée'
+        tx.save()
+        deleted_pk = self.txs[2].pk
+        self.txs[2].delete()
+        delta = self._sync(first['since']).json()
+        self.assertFalse(delta['full'])
+        self.assertEqual([c['id'] for c in delta['changes']], [tx.pk])
+        self.assertEqual(delta['changes'][0]['description'], 'Modifiée')
+        self.assertEqual(delta['deleted'], [deleted_pk])
+
+        empty = self._sync(delta['since']).json()
+        self.assertEqual((empty['changes'], empty['deleted']), ([], []))
+
+    def test_not_modified_with_etag(self):
+        import time
+        from unittest import mock
+        since = self._sync().json()['since']
+        r = self._sync(since)
+        # Seconde suivante : le jeton renvoyé, donc l'ETag, ne dépend pas de l'heure
+        later = time.time() + 1.5
+        with mock.patch('django.core.signing.time.time', return_value=later):
+            r2 = self._sync(since, HTTP_IF_NONE_MATCH=r['ETag'])
+        self.assertEqual(r2.status_code, 304)
+        Transaction.objects.create(user=self.user, amount=500, type='income', description='Nouveau',
+                                   date=datetime.date.today())
+        self.assertEqual(self._sync(since, HTTP_IF_NONE_MATCH=r['ETag']).status_code, 200)
+
+    @override_settings(SYNC_PAGE_SIZE=2)
+    def test_paged_full_sync(self):
+        r = self._sync().json()
+        self.assertTrue(r['has_more'])
+        r2 = self._sync(r['since']).json()
+        self.assertFalse(r2['has_more'])
+        self.assertEqual(len(r['changes']) + len(r2['changes']), 3)
+
+    @override_settings(SYNC_SETTLE_SECONDS=3600)
+    def test_recent_writes_resent_until_settled(self):
+        since = self._sync().json()['since']
+        self.assertEqual(len(self._sync(since).json()['changes']), 3)
+
+    def test_other_users_rows_not_synced(self):
+        bob = User.objects.create_user(username='bob', password='pass123')
+        Transaction.objects.create(user=bob, amount=1, type='income', description='Bob', date=datetime.date.today())
+        self.assertEqual(len(self._sync().json()['changes']), 3)
+
+
+class ImportTest(TestCase):
+
+    OFX = (
+        'OFXHEADER:100\nDATA:OFXSGML\n\n<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>\n'
+        '<STMTTRN>\n<TRNTYPE>DEBIT\n<DTPOSTED>20240305120000\n<TRNAMT>-15000.00\n<FITID>1\n'
+        '<NAME>Supermarché\n<MEMO>Carte 1234\n</STMTTRN>\n'
+        '<STMTTRN>\n<TRNTYPE>CREDIT\n<DTPOSTED>20240301\n<TRNAMT>250000\n<FITID>2\n<NAME>Salaire\n</STMTTRN>\n'
+        '<STMTTRN>\n<TRNTYPE>DEBIT\n<DTPOSTED>2024XX01\n<TRNAMT>-1\n<NAME>Cassée\n</STMTTRN>\n'
+        '</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>\n'
+    )
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='alice', password='pass123')
+        self.client.login(username='alice', password='pass123')
+        self.cat = Category.objects.create(name='Alimentation', slug='alimentation')
+
+    def _upload(self, name, content, **extra):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        return self.client.post(reverse('transactions:import'),
+                                {'fichier': SimpleUploadedFile(name, content.encode('utf-8'))}, **extra)
+
+    def test_csv_round_trip(self):
+        Transaction.objects.create(user=self.user, amount=4500, type='expense', description='Riz; 5kg',
+                                   category=self.cat, date=datetime.date(2024, 3, 2), notes='marché')
+        Transaction.objects.create(user=self.user, amount=100000, type='income', description='Salaire',
+                                   source='sms', date=datetime.date(2024, 3, 1))
+        exported = b''.join(self.client.get(reverse('transactions:export_csv')).streaming_content).decode('utf-8')
+
+        bob = User.objects.create_user(username='bob', password='pass123')
+        self.client.login(username='bob', password='pass123')
+        r = self._upload('finai.csv', exported, HTTP_X_REQUESTED_WITH='XMLHttpRequest').json()
+        self.assertEqual((r['created'], r['rejected']), (2, 0))
+
+        fields = ('date', 'type', 'amount', 'description', 'category_id', 'source', 'notes')
+        self.assertEqual(
+            sorted(Transaction.objects.filter(user=bob).values_list(*fields)),
+            sorted(Transaction.objects.filter(user=self.user).values_list(*fields)),
+        )
+        self.assertEqual(rollups.verify(bob), [])
+
+    def test_csv_divers_left_to_rules(self):
+        from .models import CategoryRule
+        Category.objects.create(name='Divers', slug='divers')
+        CategoryRule.objects.create(user=self.user, pattern='eneo', category=self.cat)
+        content = ('Date;Type;Montant (FCFA);Description;Catégorie;Source;Notes\n'
+                   '02/03/2024;Dépense;100;Facture ENEO;Divers;Saisie manuelle;\n')
+        self._upload('x.csv', content)
+        self.assertEqual(Transaction.objects.get(user=self.user).category, self.cat)
+
+    def test_csv_row_errors_reported(self):
+        content = ('Date;Type;Montant (FCFA);Description;Catégorie;Source;Notes\n'
+                   '02/03/2024;Dépense;abc;Riz;Alimentation;Saisie manuelle;\n'
+                   '02/03/2024;Inconnu;100;Riz;Alimentation;Saisie manuelle;\n'
+                   '31/02/2024;Dépense;100;Riz;Alimentation;Saisie manuelle;\n'
+                   '02/03/2024;Dépense;100;;Alimentation;Saisie manuelle;\n'
+                   '03/03/2024;Dépense;2 500;Pain;alimentation;;\n')
+        r = self._upload('x.csv', content, HTTP_X_REQUESTED_WITH='XMLHttpRequest').json()
+        self.assertEqual(r['created'], 1)
+        self.assertEqual([e['line'] for e in r['errors']], [2, 3, 4, 5])
+        tx = Transaction.objects.get(user=self.user)
+        self.assertEqual((tx.amount, tx.category, tx.source), (2500, self.cat, 'import'))
+
+    def test_ofx_statement(self):
+        r = self._upload('releve.ofx', self.OFX, HTTP_X_REQUESTED_WITH='XMLHttpRequest').json()
+        self.assertEqual((r['created'], r['rejected']), (2, 1))
+        debit = Transaction.objects.get(user=self.user, type='expense')
+        self.assertEqual((debit.amount, debit.description, debit.notes, debit.date),
+                         (15000, 'Supermarché', 'Carte 1234', datetime.date(2024, 3, 5)))
+        self.assertEqual(get_monthly_stats(self.user, 2024, 3)['incomes'], 250000)
+
+    def test_batches_use_bulk_insert(self):
+        lines = ['Date;Type;Montant (FCFA);Description;Catégorie;Source;Notes']
+        lines += [f'01/0{1 + i % 3}/2024;Dépense;{100 + i};Op {i};Alimentation;;' for i in range(250)]
+        from .importers import import_records, read_csv
+        with CaptureQueriesContext(connection) as ctx:
+            report = import_records(self.user, read_csv(lines), batch_size=50)
+        self.assertEqual(report.created, 250)
+        inserts = [q for q in ctx.captured_queries if q['sql'].startswith('INSERT INTO "transactions_transaction"')]
+        self.assertEqual(len(inserts), 5)
+        self.assertLess(len(ctx.captured_queries), 100)
+        self.assertEqual(rollups.verify(self.user), [])
+
+    def test_management_command(self):
+        import tempfile, os
+        with tempfile.NamedTemporaryFile('w', suffix='.ofx', delete=False, encoding='utf-8') as fh:
+            fh.write(self.OFX)
+        try:
+            out = StringIO()
+            call_command('import_transactions', 'alice', fh.name, stdout=out)
+        finally:
+            os.unlink(fh.name)
+        self.assertIn('2 transaction(s) importée(s), 1 rejetée(s)', out.getvalue())
+
+    def test_upload_redirects_with_message(self):
+        r = self._upload('releve.ofx', self.OFX, follow=True)
+        self.assertContains(r, '2 transaction(s) importée(s)')
+
+
+class SmsBatchTest(TestCase):
+
+    SMS = [
+        'Vous avez reçu 25000 FCFA de DUPOND Jean via MTN MoMo',
+        'Transfert de 5000 FCFA vers Awa effectué. Orange Money',
+    ]
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='alice', password='pass123')
+        self.client.login(username='alice', password='pass123')
+
+    def _post(self, items):
+        return self.client.post(reverse('transactions:add_sms_batch'), json.dumps({'sms': items}),
+                                content_type='application/json')
+
+    def test_batch_creates_and_dedupes(self):
+        items = self.SMS + ['Bonjour', '  Vous avez reçu 25000 FCFA de DUPOND  Jean via MTN MoMo ']
+        r = self._post(items).json()
+        self.assertEqual((r['created'], r['duplicate'], r['error']), (2, 1, 1))
+        statuses = [x['status'] for x in r['results']]
+        self.assertEqual(statuses, ['created', 'created', 'error', 'duplicate'])
+        self.assertEqual(r['results'][3]['id'], r['results'][0]['id'])
+
+        again = self._post(self.SMS).json()
+        self.assertEqual((again['created'], again['duplicate']), (0, 2))
+        self.assertEqual(Transaction.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(rollups.verify(self.user), [])
+
+    def test_batch_ids_without_returning_insert(self):
+        # MySQL : bulk_create ne renseigne pas les clés primaires
+        from unittest import mock
+        with mock.patch.object(type(connection.features), 'can_return_rows_from_bulk_insert',
+                               new_callable=mock.PropertyMock, return_value=False):
+            r = self._post(self.SMS + [self.SMS[0]]).json()
+        ids = [x['id'] for x in r['results']]
+        self.assertNotIn(None, ids)
+        self.assertEqual(ids[2], ids[0])
+        self.assertEqual(Transaction.objects.get(pk=ids[1]).raw_sms, self.SMS[1])
+
+    def test_batch_is_one_insert(self):
+        items = [f'Vous avez reçu {1000 + i} FCFA de Client {i} via MTN MoMo' for i in range(30)]
+        with CaptureQueriesContext(connection) as ctx:
+            r = self._post(items).json()
+        self.assertEqual(r['created'], 30)
+        inserts = [q for q in ctx.captured_queries if q['sql'].startswith('INSERT INTO "transactions_transaction"')]
+        self.assertEqual(len(inserts), 1)
+
+    def test_same_sms_allowed_for_other_user(self):
+        self._post(self.SMS[:1])
+        bob = User.objects.create_user(username='bob', password='pass123')
+        self.client.login(username='bob', password='pass123')
+        self.assertEqual(self._post(self.SMS[:1]).json()['created'], 1)
+
+    def test_rejects_bad_payload(self):
+        self.assertEqual(self._post([]).status_code, 400)
+        self.assertEqual(self.client.post(reverse('transactions:add_sms_batch'), 'x',
+                                          content_type='application/json').status_code, 400)
+
+    def test_bad_items_do_not_abort_batch(self):
+        items = [
+            {'sms': self.SMS[0], 'date': 'garbage'},
+            {'sms': self.SMS[0], 'date': '2026-02-30'},
+            {'sms': 12345},
+            {'sms': self.SMS[1], 'date': '2024-03-06', 'category': ['x']},
+        ]
+        r = self._post(items)
+        self.assertEqual(r.status_code, 200)
+        results = r.json()['results']
+        self.assertEqual([x['status'] for x in results], ['error', 'error', 'error', 'created'])
+        self.assertEqual(results[0]['message'], 'Date invalide')
+        self.assertEqual(results[2]['message'], 'SMS invalide')
+        self.assertEqual(Transaction.objects.get(pk=results[3]['id']).date, datetime.date(2024, 3, 6))
+
+    def test_add_from_sms_is_idempotent(self):
+        payload = {'amount': 25000, 'type': 'income', 'description': 'Reçu', 'raw_sms': self.SMS[0]}
+        url = reverse('transactions:add_from_sms')
+        first = self.client.post(url, json.dumps(payload), content_type='application/json').json()
+        second = self.client.post(url, json.dumps(payload), content_type='application/json').json()
+        self.assertEqual(second, {'status': 'duplicate', 'id': first['id']})
+        self.assertEqual(Transaction.objects.filter(user=self.user).count(), 1)
+
+    def test_edit_keeps_historical_duplicate(self):
+        # Doublon antérieur à la contrainte : la migration l'a laissé sans empreinte
+        first = Transaction.objects.create(user=self.user, amount=25000, type='income', description='Reçu',
+                                           date=datetime.date.today(), source='sms', raw_sms=self.SMS[0])
+        dup = Transaction.objects.create(user=self.user, amount=25000, type='income', description='Reçu',
+                                         date=datetime.date.today(), source='sms', raw_sms=self.SMS[1])
+        Transaction.objects.filter(pk=dup.pk).update(raw_sms=self.SMS[0], sms_hash=None)
+        r = self.client.post(reverse('transactions:edit', args=[dup.pk]),
+                             {'amount': 26000, 'type': 'income', 'description': 'Corrigé',
+                              'date': datetime.date.today()},
+                             HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(r.status_code, 200)
+        dup.refresh_from_db()
+        self.assertEqual((dup.amount, dup.sms_hash), (26000, None))
+
+        first.raw_sms = self.SMS[0] + ' '
+        first.save()
+        dup.raw_sms = self.SMS[1]
+        dup.save()
+        self.assertIsNotNone(Transaction.objects.get(pk=first.pk).sms_hash)
+        self.assertEqual(Transaction.objects.get(pk=dup.pk).sms_hash, sms_digest(self.SMS[1]))
+
+
+class SmsParserTest(TestCase):
+
+    def test_corpus_accuracy(self):
+        from django.conf import settings
+        from . import sms
+        corpus = sms.load_corpus(settings.BASE_DIR / 'fixtures' / 'sms_corpus.json')
+        ok, misses = sms.evaluate(corpus)
+        self.assertEqual(misses, [])
+
+    def test_operator_fields_and_timestamp(self):
+        r = parse_sms('Vous avez transféré 10000 FCFA à MARIE NGONO (237650000002) le 2024-03-06 09:15:00. '
+                      'Frais: 100 FCFA. Votre nouveau solde est de 114900 FCFA. ID de transaction: 7412589631.')
+        self.assertEqual((r['amount'], r['fees'], r['balance'], r['reference']), (10000, 100, 114900, '7412589631'))
+        self.assertEqual((r['datetime'], r['date']), ('2024-03-06T09:15:00', '2024-03-06'))
+        self.assertEqual(r['description'], 'Envoyé à MARIE NGONO')
+        self.assertGreaterEqual(r['confidence'], 0.8)
+
+    def test_low_confidence_without_operator(self):
+        r = parse_sms('Votre compte a été débité de 7000 FCFA pour le paiement de votre facture.')
+        self.assertEqual((r['type'], r['network']), ('expense', 'Mobile Money'))
+        self.assertLess(r['confidence'], 0.8)
+        self.assertEqual(r['date'], datetime.date.today().isoformat())
+
+    def test_promotion_is_not_a_transaction(self):
+        self.assertIsNone(parse_sms("Orange: profitez de 2 Go a 500 FCFA jusqu'au 31/03. Tapez #150#"))
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command('benchmark_sms', '--repeat', '1', '--min-accuracy', '100', stdout=out)
+        self.assertIn('Exactitude   : 100.0%', out.getvalue())
+        self.assertIn('messages/s', out.getvalue())
+
+
+class SmsWebhookTest(TestCase):
+
+    SMS = ('Vous avez reçu 25000 FCFA de JEAN MBARGA le 2024-03-05 14:22:10. Votre nouveau solde est de '
+           '125000 FCFA. ID de transaction: 7412589630. MTN MoMo')
+
+    def setUp(self):
+        from .models import SmsDevice
+        self.client = Client()
+        self.user = User.objects.create_user(username='alice', password='pass123')
+        self.device = SmsDevice.objects.create(user=self.user, name='Android')
+
+    def _post(self, payload, **headers):
+        headers.setdefault('HTTP_AUTHORIZATION', f'Bearer {self.device.token}')
+        return self.client.post(reverse('transactions:sms_webhook'), json.dumps(payload),
+                                content_type='application/json', **headers)
+
+    def test_rejects_bad_credentials(self):
+        self.assertEqual(self._post({'sms': self.SMS}, HTTP_AUTHORIZATION='Bearer nope.nope').status_code, 401)
+        self.assertEqual(self._post({'sms': self.SMS}, HTTP_AUTHORIZATION=f'Bearer {self.device.key_id}.x').status_code, 401)
+
+    def test_hmac_signature(self):
+        import hmac, hashlib, time
+        body  = json.dumps({'id': 'a1', 'sms': self.SMS}).encode()
+        stamp = str(int(time.time()))
+        sig   = hmac.new(self.device.secret.encode(), stamp.encode() + b'.' + body, hashlib.sha256).hexdigest()
+        url   = reverse('transactions:sms_webhook')
+        ok = self.client.post(url, body, content_type='application/json', HTTP_X_FINAI_KEY=self.device.key_id,
+                              HTTP_X_FINAI_TIMESTAMP=stamp, HTTP_X_FINAI_SIGNATURE=sig)
+        self.assertEqual(ok.status_code, 202)
+        tampered = self.client.post(url, body + b' ', content_type='application/json',
+                                    HTTP_X_FINAI_KEY=self.device.key_id,
+                                    HTTP_X_FINAI_TIMESTAMP=stamp, HTTP_X_FINAI_SIGNATURE=sig)
+        self.assertEqual(tampered.status_code, 401)
+
+    def test_enqueue_is_idempotent_then_drained(self):
+        from .models import SmsInbox
+        batch = {'messages': [{'id': 'a1', 'sms': self.SMS},
+                              {'id': 'a2', 'sms': 'Bonjour, ceci n’est pas un paiement.'},
+                              {'id': 'a1', 'sms': self.SMS}]}
+        r = self._post(batch)
+        self.assertEqual(r.status_code, 202)
+        self.assertEqual((r.json()['accepted'], r.json()['duplicate']), (2, 1))
+        self.assertEqual(self._post(batch).json()['accepted'], 0)
+        self.assertFalse(Transaction.objects.exists())
+
+        out = StringIO()
+        call_command('drain_sms_inbox', stdout=out)
+        tx = Transaction.objects.get(user=self.user)
+        self.assertEqual((tx.amount, tx.date), (25000, datetime.date(2024, 3, 5)))
+        statuses = dict(SmsInbox.objects.values_list('idempotency_key', 'status'))
+        self.assertEqual(statuses, {'a1': 'created', 'a2': 'error'})
+        self.assertEqual(SmsInbox.objects.get(idempotency_key='a1').transaction, tx)
+
+        # Même SMS sous une autre clé : doublon côté journal
+        self._post({'id': 'a3', 'sms': self.SMS})
+        call_command('drain_sms_inbox', stdout=StringIO())
+        self.assertEqual(SmsInbox.objects.get(idempotency_key='a3').status, 'duplicate')
+        self.assertEqual(Transaction.objects.count(), 1)
+
+    @override_settings(SMS_INBOX_MAX_PENDING=2)
+    def test_backpressure_when_queue_full(self):
+        self._post({'messages': [{'id': 'a', 'sms': self.SMS}, {'id': 'b', 'sms': self.SMS + ' '}]})
+        r = self._post({'id': 'c', 'sms': self.SMS})
+        self.assertEqual(r.status_code, 429)
+        self.assertIn('Retry-After', r)
+
+    @override_settings(SMS_WEBHOOK_RATE_PER_MINUTE=2)
+    def test_rate_limit_per_device(self):
+        from django.core.cache import cache
+        cache.clear()
+        codes = [self._post({'id': f'k{i}', 'sms': self.SMS}).status_code for i in range(3)]
+        self.assertEqual(codes, [202, 202, 429])
+
+    def test_stale_claims_are_retried(self):
+        from .models import SmsInbox
+        from . import inbox
+        self._post({'id': 'a1', 'sms': self.SMS})
+        SmsInbox.objects.update(status='processing',
+                                claimed_at=datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc))
+        self.assertEqual(inbox.drain(), {'created': 1})
+
+
+class CategoryClassifierTest(TestCase):
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='alice', password='pass123')
+        self.client.login(username='alice', password='pass123')
+        self.food = Category.objects.create(name='Alimentation', slug='alimentation')
+        self.home = Category.objects.create(name='Logement', slug='logement')
+        today = datetime.date.today()
+        for desc, cat in (('Paiement ENEO', self.home), ('Facture ENEO mars', self.home),
+                          ('Loyer appartement', self.home), ('Marché Mokolo', self.food),
+                          ('Supermarché Mahima', self.food), ('Boulangerie Mahima', self.food)):
+            Transaction.objects.create(user=self.user, amount=1000, type='expense', description=desc,
+                                       category=cat, date=today)
+
+    def test_predicts_from_user_history(self):
+        from .classifier import predict
+        self.assertEqual(predict(self.user, 'Paiement ENEO avril'), self.home.pk)
+        self.assertEqual(predict(self.user, 'Mahima courses'), self.food.pk)
+        self.assertIsNone(predict(self.user, 'Cinéma'))
+
+    def test_learns_incrementally(self):
+        from .classifier import predict
+        from .models import CategoryModel
+        self.assertIsNone(predict(self.user, 'Taxi moto'))
+        learned = CategoryModel.objects.get(user=self.user).samples
+        Transaction.objects.create(user=self.user, amount=500, type='expense', description='Taxi moto',
+                                   category=self.food, date=datetime.date.today())
+        self.assertEqual(predict(self.user, 'Taxi moto'), self.food.pk)
+        self.assertEqual(CategoryModel.objects.get(user=self.user).samples, learned + 1)
+
+    def test_edits_and_deletes_are_unlearned(self):
+        from .classifier import predict
+        from .models import CategoryModel
+        self.assertEqual(predict(self.user, 'Loyer'), self.home.pk)
+        loyer = Transaction.objects.get(description='Loyer appartement')
+        loyer.category = self.food
+        loyer.save()
+        self.assertEqual(predict(self.user, 'Loyer'), self.food.pk)
+        self.assertEqual(CategoryModel.objects.get(user=self.user).samples, 6)
+        loyer.delete()
+        self.assertIsNone(predict(self.user, 'Loyer'))
+        self.assertEqual(CategoryModel.objects.get(user=self.user).samples, 5)
+
+    def test_global_fallback_for_new_user(self):
+        from .classifier import predict, forget
+        call_command('train_classifier', stdout=StringIO())
+        self.addCleanup(forget)
+        bob = User.objects.create_user(username='bob', password='pass123')
+        self.assertEqual(predict(bob, 'Facture ENEO'), self.home.pk)
+
+    def test_model_round_trip(self):
+        from .classifier import Classifier
+        clf = Classifier()
+        clf.learn('Paiement ENEO', self.home.pk)
+        self.assertEqual(Classifier.loads(clf.dumps()).predict('ENEO')[0], self.home.pk)
+
+    def test_sms_parse_and_import_use_prediction(self):
+        sms = 'Paiement de 5000 FCFA à ENEO effectué le 2024-03-07 18:00:01. MTN MoMo'
+        r = self.client.post(reverse('transactions:parse_sms'), json.dumps({'sms': sms}),
+                             content_type='application/json').json()
+        self.assertEqual(r['data']['category'], 'logement')
+        r = self.client.post(reverse('transactions:add_sms_batch'), json.dumps({'sms': [sms]}),
+                             content_type='application/json').json()
+        self.assertEqual(Transaction.objects.get(pk=r['results'][0]['id']).category, self.home)
+
+    def test_prediction_latency(self):
+        import time
+        from .classifier import Predictor
+        guess = Predictor(self.user)
+        start = time.perf_counter()
+        for _ in range(1000):
+            guess('Paiement ENEO avril')
+        self.assertLess((time.perf_counter() - start) / 1000, 0.001)
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command('benchmark_classifier', '--holdout', '2', '--llm', '3', stdout=out)
+        self.assertIn('µs/prédiction', out.getvalue())
+        self.assertIn('IA — indisponible', out.getvalue())
+
+
+class CategoryRuleTest(TestCase):
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='alice', password='pass123')
+        self.client.login(username='alice', password='pass123')
+        self.food    = Category.objects.create(name='Alimentation', slug='alimentation')
+        self.home    = Category.objects.create(name='Logement', slug='logement')
+        self.leisure = Category.objects.create(name='Loisirs', slug='loisirs')
+        # Historique qui ferait classer « ENEO » en logement
+        for desc in ('Paiement ENEO', 'Facture ENEO mars'):
+            Transaction.objects.create(user=self.user, amount=1000, type='expense', description=desc,
+                                       category=self.home, date=datetime.date.today())
+
+    def _rule(self, pattern, category, priority=100):
+        from .models import CategoryRule
+        return CategoryRule.objects.create(user=self.user, pattern=pattern, category=category, priority=priority)
+
+    def test_matcher_priority_longest_and_accents(self):
+        from .rules import Matcher
+        m = Matcher([('canal', self.home.pk, 100), ('Canal+', self.leisure.pk, 100),
+                     ('électricité', self.home.pk, 100), ('mahima', self.food.pk, 10)])
+        self.assertEqual(m.match('Abonnement CANAL+'), self.leisure.pk)
+        self.assertEqual(m.match('Canal olympia'), self.home.pk)
+        self.assertEqual(m.match('Facture ELECTRICITE'), self.home.pk)
+        self.assertEqual(m.match('Electricité Mahima'), self.food.pk)
+        self.assertIsNone(m.match('Taxi'))
+
+    def test_matcher_overlapping_keywords_follow_priority(self):
+        from .rules import Matcher
+        m = Matcher([('canal plus', self.food.pk, 100), ('plus', self.leisure.pk, 1),
+                     ('mtn momo', self.food.pk, 100), ('momo', self.home.pk, 5)])
+        self.assertEqual(m.match('Abonnement Canal Plus'), self.leisure.pk)
+        self.assertEqual(m.match('Retrait MTN MoMo'), self.home.pk)
+
+    def test_rule_overrides_classifier_on_import(self):
+        from .importers import import_records, read_csv
+        self._rule('eneo', self.leisure)
+        sms = 'Paiement de 5000 FCFA à ENEO effectué le 2024-03-07 18:00:01. MTN MoMo'
+        r = self.client.post(reverse('transactions:add_sms_batch'), json.dumps({'sms': [sms]}),
+                             content_type='application/json').json()
+        self.assertEqual(Transaction.objects.get(pk=r['results'][0]['id']).category, self.leisure)
+        lines = ['Date;Type;Montant (FCFA);Description;Catégorie;Source;Notes',
+                 '01/03/2024;Dépense;2000;Facture ENEO;;Import;']
+        import_records(self.user, read_csv(lines))
+        self.assertEqual(Transaction.objects.get(description='Facture ENEO').category, self.leisure)
+
+    def test_rule_change_recompiles_matcher(self):
+        from .rules import Categorizer
+        rule = self._rule('mokolo', self.food)
+        self.assertEqual(Categorizer(self.user)('Marché Mokolo'), self.food.pk)
+        rule.category = self.leisure
+        rule.save()
+        self.assertEqual(Categorizer(self.user)('Marché Mokolo'), self.leisure.pk)
+        rule.delete()
+        self.assertIsNone(Categorizer(self.user)('Marché Mokolo'))
+
+    def test_rules_version_read_from_database(self):
+        from .rules import Categorizer
+        from .models import CategoryRule
+        self.assertIsNone(Categorizer(self.user)('Marché Mokolo'))
+        # Écriture sans signal (autre processus, bulk_create) : la version lue en base change quand même
+        CategoryRule.objects.bulk_create([CategoryRule(user=self.user, pattern='mokolo', category=self.food)])
+        self.assertEqual(Categorizer(self.user)('Marché Mokolo'), self.food.pk)
+
+    def test_apply_to_history(self):
+        old = Transaction.objects.create(user=self.user, amount=700, type='expense', description='Canal+ mars',
+                                         date=datetime.date.today())
+        self._rule('canal', self.leisure)
+        self.client.post(reverse('transactions:apply_rules'), {'only_uncategorized': '1'})
+        old.refresh_from_db()
+        self.assertEqual(old.category, self.leisure)
+        self.assertEqual(Transaction.objects.filter(category=self.home).count(), 2)
+        self.assertEqual(rollups.verify(self.user), [])
+
+        from .rules import apply_to_history
+        self._rule('eneo', self.food)
+        self.assertEqual(apply_to_history(self.user), 2)
+        self.assertEqual(Transaction.objects.filter(category=self.food).count(), 2)
+        self.assertEqual(rollups.verify(self.user), [])
+
+    def test_rule_views(self):
+        self.client.post(reverse('transactions:add_rule'),
+                         {'pattern': 'Mahima', 'category': self.food.pk, 'priority': '5'})
+        rule = self.user.category_rules.get()
+        self.assertEqual((rule.pattern, rule.category, rule.priority), ('Mahima', self.food, 5))
+        self.client.post(reverse('transactions:add_rule'),
+                         {'pattern': 'Mahima', 'category': self.food.pk, 'priority': '-3'})
+        self.assertEqual(self.user.category_rules.get().priority, 0)
+        r = self.client.get(reverse('transactions:categories'))
+        self.assertContains(r, 'Mahima')
+        bob = User.objects.create_user(username='bob', password='pass123')
+        self.client.force_login(bob)
+        self.assertEqual(self.client.post(reverse('transactions:delete_rule', args=[rule.pk])).status_code, 404)
+
+
+class JournalSearchTest(TestCase):
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='alice', password='pass123')
+        self.client.login(username='alice', password='pass123')
+        self.food = Category.objects.create(name='Alimentation', slug='alimentation')
+        self.home = Category.objects.create(name='Logement', slug='logement')
+        today = datetime.date.today()
+        self.rows = {}
+        for desc, amount, cat, source, notes in (
+                ('Facture ENEO mars', 15000, self.home, 'sms', ''),
+                ('Facture Camwater', 8000, self.home, 'manual', 'électricité incluse'),
+                ('Supermarché Mahima', 30000, self.food, 'manual', ''),
+                ('Boulangerie', 1500, None, 'import', 'pain et croissants')):
+            self.rows[desc] = Transaction.objects.create(
+                user=self.user, amount=amount, type='expense', description=desc, category=cat,
+                source=source, notes=notes, date=today)
+        bob = User.objects.create_user(username='bob', password='pass123')
+        Transaction.objects.create(user=bob, amount=1000, type='expense', description='Facture ENEO', date=today)
+
+    def _search(self, **params):
+        from .search import SearchFilters, facets
+        filters = SearchFilters.from_query(params)
+        found   = filters.apply(Transaction.objects.filter(user=self.user))
+        return sorted(found.values_list('description', flat=True)), facets(self.user, filters)
+
+    def test_text_prefix_and_accents(self):
+        self.assertEqual(self._search(q='fact')[0], ['Facture Camwater', 'Facture ENEO mars'])
+        self.assertEqual(self._search(q='facture eneo')[0], ['Facture ENEO mars'])
+        self.assertEqual(self._search(q='electricite')[0], ['Facture Camwater'])
+        self.assertEqual(self._search(q='supermarche')[0], ['Supermarché Mahima'])
+        self.assertEqual(self._search(q='"croiss* (')[0], ['Boulangerie'])
+
+    def test_index_follows_writes(self):
+        tx = self.rows['Boulangerie']
+        tx.description = 'Pâtisserie'
+        tx.save()
+        self.assertEqual(self._search(q='boulangerie')[0], [])
+        self.assertEqual(self._search(q='patisserie')[0], ['Pâtisserie'])
+        Transaction.objects.filter(pk=tx.pk).update(notes='')
+        self.assertEqual(self._search(q='croissants')[0], [])
+        Transaction.objects.bulk_create([Transaction(user=self.user, amount=500, type='expense',
+                                                     description='Taxi moto', date=datetime.date.today())])
+        self.assertEqual(self._search(q='taxi')[0], ['Taxi moto'])
+        tx.delete()
+        self.assertEqual(self._search(q='patisserie')[0], [])
+
+    def test_facets(self):
+        found, f = self._search(q='facture', category='logement')
+        self.assertEqual(len(found), 2)
+        self.assertEqual({c['value']: c['count'] for c in f['category']}, {'logement': 2})
+        self.assertEqual({s['value']: s['count'] for s in f['source']}, {'sms': 1, 'manual': 1})
+        found, f = self._search(amount_min='5000', amount_max='25000')
+        self.assertEqual(found, ['Facture Camwater', 'Facture ENEO mars'])
+        # La facette montant ignore son propre filtre
+        self.assertEqual([b['count'] for b in f['amount']], [1, 2, 1])
+        self.assertEqual({c['value']: c['count'] for c in f['category']}, {'logement': 2})
+        self.assertEqual(self._search(category='aucune')[0], ['Boulangerie'])
+
+    def test_journal_view(self):
+        r = self.client.get(reverse('transactions:journal'), {'q': 'facture', 'source': 'sms'})
+        self.assertContains(r, 'Facture ENEO mars')
+        self.assertNotContains(r, 'Facture Camwater')
+        self.assertEqual(r.context['total_count'], 1)
+        self.assertTrue(any(f['active'] for f in r.context['facets']['source']))
+
+    def test_search_uses_index(self):
+        from .search import SearchFilters
+        if connection.vendor != 'sqlite':
+            self.skipTest('plan vérifié sous SQLite')
+        qs  = SearchFilters(q='facture').apply(Transaction.objects.filter(user=self.user))
+        sql, params = qs.query.sql_with_params()
+        with connection.cursor() as cur:
+            cur.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            plan = ' | '.join(row[-1] for row in cur.fetchall())
+        self.assertIn('VIRTUAL TABLE INDEX', plan)
+        self.assertNotIn('SCAN transactions_transaction', plan)
+
+
+class RecurringSeriesTest(TestCase):
+
+    def setUp(self):
+        self.user  = User.objects.create_user(username='alice', password='pass123')
+        self.home  = Category.objects.create(name='Logement', slug='logement')
+        self.today = datetime.date(2024, 6, 10)
+        months = ('janvier', 'février', 'mars', 'avril', 'mai', 'juin')
+        for m, name in enumerate(months, 1):
+            Transaction.objects.create(user=self.user, amount=15000 + m * 100, type='expense',
+                                       description=f'Facture ENEO {name} 2024', category=self.home,
+                                       date=datetime.date(2024, m, 5))
+            Transaction.objects.create(user=self.user, amount=250000, type='income', description='Salaire',
+                                       date=datetime.date(2024, m, 28))
+        for day in (3, 17, 40, 96):
+            Transaction.objects.create(user=self.user, amount=2000, type='expense', description='Taxi',
+                                       date=datetime.date(2024, 1, 1) + datetime.timedelta(days=day))
+
+    def _run(self, **kwargs):
+        from . import recurring
+        return recurring.scan(self.user, today=self.today, **kwargs)
+
+    def test_series_key(self):
+        from .recurring import series_key
+        self.assertEqual(series_key('Facture ENEO mars 2024 réf. 12345'), 'facture eneo ref')
+        self.assertEqual(series_key('Facture Éneo AVRIL'), 'facture eneo')
+
+    def test_detects_monthly_series(self):
+        from .models import RecurringSeries
+        self.assertEqual(self._run(), 2)
+        eneo = RecurringSeries.objects.get(user=self.user, type='expense')
+        self.assertEqual((eneo.key, eneo.period, eneo.occurrences), ('facture eneo', 'monthly', 6))
+        self.assertEqual(eneo.amount, 15500)
+        self.assertEqual(eneo.category, self.home)
+        self.assertEqual(eneo.next_date, datetime.date(2024, 7, 5))
+        salary = RecurringSeries.objects.get(user=self.user, type='income')
+        self.assertEqual(salary.next_date, datetime.date(2024, 7, 28))
+        self.assertFalse(RecurringSeries.objects.filter(key='taxi').exists())
+
+    def test_incremental(self):
+        from .recurring import users_to_scan
+        self._run()
+        self.assertNotIn(self.user, users_to_scan())
+        with self.assertNumQueries(2):
+            self.assertEqual(self._run(), 0)
+        Transaction.objects.create(user=self.user, amount=900, type='expense', description='Cinéma',
+                                   date=self.today)
+        self.assertIn(self.user, users_to_scan())
+        self.assertEqual(self._run(), 0)
+
+    def test_materialize_and_settle(self):
+        from .recurring import materialize
+        self._run()
+        self.assertEqual(materialize(self.user, horizon=80, today=self.today), 4)
+        planned = Transaction.objects.filter(user=self.user, source='recurring').order_by('date')
+        self.assertEqual([(t.type, t.date) for t in planned], [
+            ('planned_expense', datetime.date(2024, 7, 5)),
+            ('planned_income', datetime.date(2024, 7, 28)),
+            ('planned_expense', datetime.date(2024, 8, 5)),
+            ('planned_income', datetime.date(2024, 8, 28)),
+        ])
+        self.assertEqual(materialize(self.user, horizon=80, today=self.today), 0)
+        self.assertEqual(rollups.verify(self.user), [])
+
+        # La facture réelle de juillet remplace l'échéance planifiée
+        Transaction.objects.create(user=self.user, amount=15800, type='expense', description='Facture ENEO juillet',
+                                   category=self.home, date=datetime.date(2024, 7, 6))
+        self.today = datetime.date(2024, 7, 6)
+        self._run()
+        self.assertEqual(sorted(planned.values_list('date', flat=True)),
+                         [datetime.date(2024, 7, 28), datetime.date(2024, 8, 5), datetime.date(2024, 8, 28)])
+        self.assertEqual(rollups.verify(self.user), [])
+
+    def test_stopped_series_not_planned(self):
+        from .models import RecurringSeries
+        from .recurring import materialize
+        self._run()
+        self.assertEqual(materialize(self.user, today=datetime.date(2024, 12, 1)), 0)
+        self.assertFalse(RecurringSeries.objects.filter(user=self.user, is_active=True).exists())
+
+    def test_command(self):
+        out = StringIO()
+        call_command('plan_recurring', stdout=out)
+        self.assertIn('1 utilisateur(s) analysé(s)', out.getvalue())
+        out = StringIO()
+        call_command('plan_recurring', stdout=out)
+        self.assertIn('0 utilisateur(s) analysé(s)', out.getvalue())
+
+    def test_two_amount_bands_same_period(self):
+        from .models import RecurringSeries
+        for m in range(1, 7):
+            Transaction.objects.create(user=self.user, amount=100000, type='expense', description='Loyer',
+                                       date=datetime.date(2024, m, 1))
+            if m < 6:
+                Transaction.objects.create(user=self.user, amount=20000, type='expense', description='Loyer',
+                                           date=datetime.date(2024, m, 15))
+        self._run()
+        loyer = RecurringSeries.objects.get(user=self.user, key='loyer')
+        self.assertEqual((loyer.period, loyer.amount), ('monthly', 100000))
+        self._run(full=True)
+        self.assertEqual(RecurringSeries.objects.filter(user=self.user, key='loyer').count(), 1)
+
+    def test_command_skips_failing_user(self):
+        from unittest import mock
+        from . import recurring
+        bob = User.objects.create_user(username='bob', password='pass123')
+        Transaction.objects.create(user=bob, amount=1000, type='expense', description='Taxi',
+                                   date=datetime.date(2024, 1, 3))
+        scan = recurring.scan
+
+        def flaky(user, **kwargs):
+            if user == self.user:
+                raise RuntimeError('panne')
+            return scan(user, **kwargs)
+
+        out = StringIO()
+        with mock.patch.object(recurring, 'scan', side_effect=flaky):
+            call_command('plan_recurring', stdout=out)
+        self.assertIn("alice : RuntimeError('panne')", out.getvalue())
+        self.assertIn('1 utilisateur(s) analysé(s), 0 série(s) mise(s) à jour, 1 en erreur', out.getvalue())
+
+
+class CashflowTest(TestCase):
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='alice', password='pass123')
+        self.client.login(username='alice', password='pass123')
+        self.today = datetime.date.today()
+        d = self.today - datetime.timedelta(days=10)
+        self.rows = [
+            Transaction.objects.create(user=self.user, amount=100000, type='income', description='Salaire', date=d),
+            Transaction.objects.create(user=self.user, amount=20000, type='expense', description='Loyer', date=d),
+            Transaction.objects.create(user=self.user, amount=5000, type='expense', description='Marché',
+                                       date=d + datetime.timedelta(days=2)),
+            Transaction.objects.create(user=self.user, amount=30000, type='planned_expense', description='ENEO',
+                                       date=self.today + datetime.timedelta(days=3)),
+        ]
+        other = User.objects.create_user(username='bob', password='pass123')
+        Transaction.objects.create(user=other, amount=999, type='income', description='Autre', date=d)
+
+    def test_running_balances(self):
+        from .cashflow import running_balances
+        salary, rent, market, _ = self.rows
+        with self.assertNumQueries(4):
+            balances = running_balances(self.user, [rent.pk, market.pk])
+        self.assertEqual(balances, {rent.pk: 80000, market.pk: 75000})
+        self.assertEqual(running_balances(self.user, [salary.pk]), {salary.pk: 100000})
+
+    def test_running_balances_opening_from_rollups(self):
+        from .cashflow import running_balances
+        _, _, market, _ = self.rows
+        # Mois antérieurs (agrégats), début du mois de la page (somme bornée), puis la page
+        older = Transaction.objects.create(user=self.user, amount=40000, type='income', description='Prime',
+                                           date=datetime.date(2020, 1, 15))
+        Transaction.objects.create(user=self.user, amount=1000, type='expense', description='Taxi',
+                                   date=datetime.date(2020, 3, 1))
+        march = Transaction.objects.create(user=self.user, amount=2000, type='expense', description='Pain',
+                                           date=datetime.date(2020, 3, 20))
+        Transaction.objects.filter(pk=older.pk).update(amount=1)   # le cumul antérieur vient des agrégats
+        self.assertEqual(running_balances(self.user, [march.pk, market.pk]),
+                         {march.pk: 37000, market.pk: 112000})
+
+    def test_journal_balance_column(self):
+        r = self.client.get(reverse('transactions:journal'), {'type': 'expense'})
+        balances = {t.description: t.balance for t in r.context['transactions']}
+        # Le filtre de la page ne change pas le cumul
+        self.assertEqual(balances, {'Marché': 75000, 'Loyer': 80000})
+        self.assertContains(r, 'Solde 75000 F')
+
+    def test_calendar(self):
+        from .cashflow import get_cashflow_calendar
+        start = self.today - datetime.timedelta(days=11)
+        with override_settings(FINAI_STATS_CACHE=False), self.assertNumQueries(4):
+            cal = get_cashflow_calendar(self.user, start, self.today + datetime.timedelta(days=5))
+        days = {d['date']: d for d in cal['days']}
+        self.assertEqual(cal['opening'], 0)
+        self.assertEqual(len(cal['days']), 17)
+        first = days[(start + datetime.timedelta(days=1)).isoformat()]
+        self.assertEqual((first['income'], first['expense'], first['balance']), (100000, 20000, 80000))
+        self.assertEqual(days[self.today.isoformat()]['balance'], 75000)
+        future = days[(self.today + datetime.timedelta(days=3)).isoformat()]
+        self.assertEqual((future['planned_expense'], future['balance'], future['projected']), (30000, 45000, True))
+
+    def test_api(self):
+        r = self.client.get(reverse('transactions:api_cashflow'),
+                            {'from': (self.today - datetime.timedelta(days=3)).isoformat()}).json()
+        self.assertEqual(r['opening'], 75000)
+        self.assertEqual(r['days'][-1]['balance'], 45000)
+        self.assertEqual(self.client.get(reverse('transactions:api_cashflow'), {'from': 'x'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('transactions:api_cashflow'),
+                                         {'from': '2020-01-01', 'to': '2024-01-01'}).status_code, 400)
+
+
+class NetWorthTest(TestCase):
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='alice', password='pass123')
+        self.client.login(username='alice', password='pass123')
+        self.month = datetime.date.today().replace(day=1)
+
+    def _months_ago(self, n):
+        idx = self.month.year * 12 + self.month.month - 1 - n
+        return datetime.date(idx // 12, idx % 12 + 1, 1)
+
+    def test_snapshots_follow_entries(self):
+        from .models import NetWorthSnapshot
+        from .networth import history
+        land = PatrimoineEntry.objects.create(user=self.user, ptype='actif', category='immobilier',
+                                              label='Terrain', valeur=900000, date=self._months_ago(2))
+        PatrimoineEntry.objects.create(user=self.user, ptype='passif', label='Prêt', valeur=300000,
+                                       date=self._months_ago(1))
+        # Entrée datée dans le futur : comptée dès le mois courant
+        PatrimoineEntry.objects.create(user=self.user, ptype='actif', label='Prime', valeur=50000,
+                                       date=self.month + datetime.timedelta(days=70))
+        self.assertEqual([(p['month'], p['net']) for p in history(self.user)], [
+            (self._months_ago(2), 900000), (self._months_ago(1), 600000), (self.month, 650000),
+        ])
+        land.delete()
+        self.assertEqual([(p['month'], p['passifs'], p['net']) for p in history(self.user)], [
+            (self._months_ago(1), 300000, -300000), (self.month, 300000, -250000),
+        ])
+        self.assertEqual(NetWorthSnapshot.objects.filter(user=self.user).count(), 2)
+
+    def test_rebuild_without_conflict_upsert(self):
+        # MySQL : pas de bulk_create(update_conflicts=…, unique_fields=…)
+        from unittest import mock
+        from .networth import rebuild, history
+        PatrimoineEntry.objects.create(user=self.user, ptype='actif', label='Terrain', valeur=900000,
+                                       date=self._months_ago(1))
+        with mock.patch.object(connection.features, 'supports_update_conflicts_with_target', False):
+            entry = PatrimoineEntry.objects.create(user=self.user, ptype='passif', label='Prêt',
+                                                   valeur=100000, date=self.month)
+            entry.valeur = 200000
+            entry.save()
+            self.assertEqual(rebuild(self.user), 2)
+        self.assertEqual([p['net'] for p in history(self.user)], [900000, 700000])
+
+    def test_breakdown_single_query(self):
+        from .services import get_patrimoine_breakdown
+        PatrimoineEntry.objects.create(user=self.user, ptype='actif', category='immobilier',
+                                       label='Terrain', valeur=900000, date=self.month)
+        PatrimoineEntry.objects.create(user=self.user, ptype='actif', category='immobilier',
+                                       label='Maison', valeur=100000, date=self.month)
+        with override_settings(FINAI_STATS_CACHE=False), self.assertNumQueries(1):
+            data = get_patrimoine_breakdown(self.user)
+        self.assertEqual(int(data['actifs']), 1000000)
+        self.assertEqual([(c['category'], int(c['total']), c['count']) for c in data['cat_actifs']],
+                         [('immobilier', 1000000, 2)])
+
+    def test_page_and_api(self):
+        PatrimoineEntry.objects.create(user=self.user, ptype='actif', label='Terrain', valeur=900000,
+                                       date=self._months_ago(1))
+        r = self.client.get(reverse('transactions:patrimoine'))
+        self.assertEqual(json.loads(r.context['nw_values']), [900000, 900000])
+        self.assertContains(r, 'c-networth')
+        data = self.client.get(reverse('transactions:api_networth'), {'mois': 1}).json()
+        self.assertEqual(data['history'], [{'month': self.month.isoformat(), 'actifs': 900000,
+                                            'passifs': 0, 'net': 900000}])
+
+    def test_command_backfills(self):
+        from .models import NetWorthSnapshot
+        PatrimoineEntry.objects.create(user=self.user, ptype='actif', label='Terrain', valeur=900000,
+                                       date=self._months_ago(3))
+        NetWorthSnapshot.objects.all().delete()
+        out = StringIO()
+        call_command('snapshot_networth', stdout=out)
+        self.assertIn('4 instantané(s)', out.getvalue())
+        self.assertEqual(NetWorthSnapshot.objects.filter(user=self.user).count(), 4)
+        with self.assertRaises(CommandError):
+            call_command('snapshot_networth', user='inconnu', stdout=StringIO())
@@ -9,17 +9,27 @@ urlpatterns = [
     path('modifier/<int:pk>/',             views.edit_transaction,   name='edit'),
     path('supprimer/<int:pk>/',            views.delete_transaction, name='delete'),
     path('exporter/csv/',                  views.export_csv,         name='export_csv'),
+    path('importer/',                      views.import_transactions, name='import'),
     path('analyse/',                       views.analyse,            name='analyse'),
     path('budgets/',                       views.budgets,            name='budgets'),
     path('budgets/supprimer/<int:pk>/',    views.delete_budget,      name='delete_budget'),
     path('categories/',                    views.manage_categories,  name='categories'),
     path('categories/supprimer/<int:pk>/', views.delete_category,    name='delete_category'),
+    path('categories/regles/ajouter/',     views.add_rule,           name='add_rule'),
+    path('categories/regles/supprimer/<int:pk>/', views.delete_rule, name='delete_rule'),
+    path('categories/regles/appliquer/',   views.apply_rules,        name='apply_rules'),
     path('patrimoine/',                    views.patrimoine,         name='patrimoine'),
     path('patrimoine/ajouter/',            views.add_patrimoine,     name='add_patrimoine'),
     path('patrimoine/supprimer/<int:pk>/', views.delete_patrimoine,  name='delete_patrimoine'),
     path('api/parse-sms/',                 views.parse_sms_view,     name='parse_sms'),
     path('api/add-sms/',                   views.add_from_sms,       name='add_from_sms'),
+    path('api/add-sms/lot/',               views.add_sms_batch,      name='add_sms_batch'),
+    path('api/sms/webhook/',               views.sms_webhook,        name='sms_webhook'),
+    path('api/sms/appareils/',             views.sms_devices,        name='sms_devices'),
     path('api/liste/',                     views.api_list,           name='api_list'),
+    path('api/sync/',                      views.api_sync,           name='api_sync'),
+    path('api/tresorerie/',                views.api_cashflow,       name='api_cashflow'),
+    path('api/patrimoine/historique/',     views.api_networth,       name='api_networth'),
     path('api/push/subscribe/',            views.push_subscribe,     name='push_subscribe'),
     path('api/push/check/',                views.push_check,         name='push_check'),
 ]
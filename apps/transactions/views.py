@@ -1,14 +1,17 @@
 import csv
+import hashlib
 import json
-from datetime import date
+from datetime import date, timedelta
+from urllib.parse import urlencode
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponseNotModified, StreamingHttpResponse
 from django.views.decorators.http import require_POST
+from django.views.decorators.csrf import csrf_exempt
+from django.db import IntegrityError
 from django.contrib import messages
-from django.core.paginator import Paginator
 from django.utils.text import slugify
-from .models import Transaction, Category, BudgetLimit, PatrimoineEntry
+from .models import Transaction, Category, BudgetLimit, PatrimoineEntry, CategoryRule
 from .forms import TransactionForm, BudgetLimitForm
 from .services import parse_sms as sms_parse
 
@@ -27,27 +30,40 @@ def _is_mobile(request):
 
 @login_required
 def journal(request):
-    qs = Transaction.objects.filter(user=request.user).select_related('category')
-
+    from .cashflow import running_balances
+    from .pagination import paginate
+    from .search import SearchFilters, facets
+    from .services import count_transactions
     type_filter = request.GET.get('type', '')
     date_from   = request.GET.get('date_from', '')
     date_to     = request.GET.get('date_to', '')
+    d_from = d_to = None
 
-    if type_filter:
-        qs = qs.filter(type=type_filter)
     if date_from:
         try:
-            qs = qs.filter(date__gte=date.fromisoformat(date_from))
+            d_from = date.fromisoformat(date_from)
         except ValueError:
             date_from = ''
     if date_to:
         try:
-            qs = qs.filter(date__lte=date.fromisoformat(date_to))
+            d_to = date.fromisoformat(date_to)
         except ValueError:
             date_to = ''
 
-    paginator = Paginator(qs, 25)
-    page      = paginator.get_page(request.GET.get('page', 1))
+    filters = SearchFilters.from_query(request.GET, date_from=d_from, date_to=d_to)
+    qs      = filters.apply(Transaction.objects.filter(user=request.user).select_related('category'))
+    page    = paginate(qs, request.GET.get('cursor'))
+    # Solde après chaque opération réelle de la page : une requête (fenêtre SQL) pour toute la page
+    balances = running_balances(request.user, [t.pk for t in page if not t.is_planned])
+    for t in page:
+        t.balance = balances.get(t.pk)
+    if filters.is_search:
+        # Recherche : facettes comptées sur le résultat, total = somme de la facette type
+        search_facets = facets(request.user, filters)
+        total_count   = sum(f['count'] for f in search_facets['type'] if not type_filter or f['value'] == type_filter)
+    else:
+        search_facets = None
+        total_count   = count_transactions(request.user, type_filter, d_from, d_to)
     template  = 'transactions/journal_pwa.html' if _is_mobile(request) else 'transactions/journal.html'
     return render(request, template, {
         'transactions': page,
@@ -56,17 +72,31 @@ def journal(request):
         'type_filter':  type_filter,
         'date_from':    date_from,
         'date_to':      date_to,
-        'total_count':  paginator.count,
+        'filters':      filters,
+        'facets':       search_facets and _facet_links(filters, search_facets),
+        'filter_qs':    urlencode(filters.params()),
+        'total_count':  total_count,
     })
 
 
+def _facet_links(filters, search_facets):
+    """Ajoute à chaque valeur de facette l'URL qui la sélectionne (ou la désélectionne)."""
+    for name in ('type', 'category', 'source'):
+        for f in search_facets[name]:
+            f['active'] = getattr(filters, name) == f['value']
+            f['url']    = '?' + urlencode(filters.params(**{name: '' if f['active'] else f['value']}))
+    for f in search_facets['amount']:
+        f['active'] = (filters.amount_min, filters.amount_max) == (f['min'], f['max'])
+        bounds      = ('', '') if f['active'] else (f['min'] or '', f['max'] or '')
+        f['url']    = '?' + urlencode(filters.params(amount_min=bounds[0], amount_max=bounds[1]))
+    search_facets['clear'] = '?' + urlencode(filters.params(q='', category='', source='', amount_min='', amount_max=''))
+    return search_facets
+
+
 @login_required
 def analyse(request):
     """Analyse financière sur plage de dates personnalisée."""
-    from .services import (
-        get_range_stats, get_expense_by_category_range,
-        get_daily_series, get_monthly_series,
-    )
+    from .services import get_range_stats, get_expense_by_category_range, get_time_series
     today        = date.today()
     default_from = today.replace(day=1).isoformat()
     default_to   = today.isoformat()
@@ -84,14 +114,9 @@ def analyse(request):
     if date_from > date_to:
         date_from, date_to = date_to, date_from
 
-    days     = (date_to - date_from).days + 1
     stats    = get_range_stats(request.user, date_from, date_to)
     cat_rows = list(get_expense_by_category_range(request.user, date_from, date_to))
-
-    if days <= 60:
-        series = get_daily_series(request.user, date_from, date_to)
-    else:
-        series = get_monthly_series(request.user, months=min(24, days // 28 + 1))
+    series   = get_time_series(request.user, date_from, date_to)
 
     txs = (Transaction.objects
            .filter(user=request.user, date__gte=date_from, date__lte=date_to,
@@ -167,9 +192,11 @@ def delete_transaction(request, pk):
 @login_required
 @require_POST
 def parse_sms_view(request):
+    from .rules import Categorizer
     data   = json.loads(request.body)
     result = sms_parse(data.get('sms', ''))
     if result:
+        result['category'] = Categorizer(request.user).slug(result['description'], result['raw_sms'])
         return JsonResponse({'status': 'ok', 'data': result})
     return JsonResponse({'status': 'error', 'message': 'SMS non reconnu'}, status=400)
 
@@ -177,25 +204,100 @@ def parse_sms_view(request):
 @login_required
 @require_POST
 def add_from_sms(request):
+    from .models import sms_digest
     data     = json.loads(request.body)
-    category = Category.objects.filter(slug=data.get('category', 'divers')).first()
-    tx = Transaction.objects.create(
-        user        = request.user,
-        amount      = data['amount'],
-        type        = data['type'],
-        description = data['description'],
-        category    = category,
-        date        = data.get('date', date.today()),
-        source      = 'sms',
-        raw_sms     = data.get('raw_sms', ''),
-    )
+    raw_sms  = data.get('raw_sms', '')
+    digest   = sms_digest(raw_sms)
+    existing = digest and Transaction.objects.filter(user=request.user, sms_hash=digest).first()
+    if existing:
+        return JsonResponse({'status': 'duplicate', 'id': existing.id})
+
+    if data.get('category'):
+        category = Category.objects.filter(slug=data['category']).first()
+    else:
+        from .rules import Categorizer
+        category_id = Categorizer(request.user)(data.get('description', ''), raw_sms)
+        category = Category.objects.filter(pk=category_id or 0).first() or \
+            Category.objects.filter(slug='divers').first()
+    try:
+        tx = Transaction.objects.create(
+            user        = request.user,
+            amount      = data['amount'],
+            type        = data['type'],
+            description = data['description'],
+            category    = category,
+            date        = data.get('date', date.today()),
+            source      = 'sms',
+            raw_sms     = raw_sms,
+        )
+    except IntegrityError:
+        # Même SMS soumis deux fois en parallèle
+        existing = Transaction.objects.get(user=request.user, sms_hash=digest)
+        return JsonResponse({'status': 'duplicate', 'id': existing.id})
     return JsonResponse({'status': 'ok', 'id': tx.id})
 
 
 @login_required
-def api_list(request):
-    txs = Transaction.objects.filter(user=request.user).select_related('category')[:100]
-    return JsonResponse({'transactions': [{
+@require_POST
+def add_sms_batch(request):
+    """Lot de SMS : analyse, dédoublonnage par empreinte et insertion en une requête."""
+    from .importers import import_sms, SMS_BATCH_MAX
+    try:
+        items = json.loads(request.body).get('sms')
+    except (ValueError, AttributeError):
+        items = None
+    if not isinstance(items, list) or not items:
+        return JsonResponse({'status': 'error', 'message': 'Liste de SMS attendue'}, status=400)
+    if len(items) > SMS_BATCH_MAX:
+        return JsonResponse({'status': 'error', 'message': f'{SMS_BATCH_MAX} SMS maximum par lot'}, status=400)
+
+    results = import_sms(request.user, items)
+    counts  = {s: sum(1 for r in results if r['status'] == s) for s in ('created', 'duplicate', 'error')}
+    return JsonResponse({'status': 'ok', **counts, 'results': results})
+
+
+@csrf_exempt
+@require_POST
+def sms_webhook(request):
+    """Réception machine-à-machine : acquittement immédiat, analyse différée (drain_sms_inbox)."""
+    from .inbox import authenticate, throttle, enqueue, InboxError
+    device = authenticate(request)
+    if device is None:
+        return JsonResponse({'status': 'error', 'message': 'Authentification invalide'}, status=401)
+    try:
+        throttle(device)
+        try:
+            payload = json.loads(request.body)
+        except ValueError:
+            raise InboxError('JSON invalide')
+        result = enqueue(device, payload)
+    except InboxError as exc:
+        response = JsonResponse({'status': 'error', 'message': str(exc)}, status=exc.status)
+        if exc.retry_after:
+            response['Retry-After'] = str(exc.retry_after)
+        return response
+    return JsonResponse({'status': 'queued', **result}, status=202)
+
+
+@login_required
+def sms_devices(request):
+    """Appareils de transfert SMS : liste (GET) ou création (POST, jeton renvoyé une fois)."""
+    from .models import SmsDevice
+    if request.method == 'POST':
+        data   = json.loads(request.body or '{}')
+        device = SmsDevice.objects.create(user=request.user, name=(data.get('name') or 'Téléphone')[:100])
+        return JsonResponse({'status': 'ok', 'key_id': device.key_id, 'token': device.token}, status=201)
+    devices = request.user.sms_devices.order_by('-created_at')
+    return JsonResponse({'devices': [{
+        'key_id':    d.key_id,
+        'name':      d.name,
+        'is_active': d.is_active,
+        'last_seen': d.last_seen.isoformat() if d.last_seen else None,
+    } for d in devices]})
+
+
+def _tx_payload(t):
+    return {
         'id':          t.id,
         'amount':      int(t.amount),
         'signed':      int(t.signed_amount),
@@ -207,14 +309,86 @@ def api_list(request):
         'date':        t.date.isoformat(),
         'planned':     t.is_planned,
         'source':      t.source,
-    } for t in txs]})
+    }
+
+
+@login_required
+def api_list(request):
+    txs = Transaction.objects.filter(user=request.user).select_related('category')[:100]
+    return JsonResponse({'transactions': [_tx_payload(t) for t in txs]})
+
+
+@login_required
+def api_cashflow(request):
+    """Calendrier de trésorerie : ``?from=AAAA-MM-JJ&to=AAAA-MM-JJ`` (défaut : J−30 à J+30)."""
+    from .cashflow import get_cashflow_calendar, MAX_DAYS
+    today = date.today()
+    try:
+        d_from = date.fromisoformat(request.GET['from']) if request.GET.get('from') else today - timedelta(days=30)
+        d_to   = date.fromisoformat(request.GET['to']) if request.GET.get('to') else today + timedelta(days=30)
+    except ValueError:
+        return JsonResponse({'error': 'Date invalide (format AAAA-MM-JJ)'}, status=400)
+    if d_to < d_from or (d_to - d_from).days >= MAX_DAYS:
+        return JsonResponse({'error': f'Plage invalide (au plus {MAX_DAYS} jours)'}, status=400)
+    return JsonResponse(get_cashflow_calendar(request.user, d_from, d_to))
+
+
+@login_required
+def api_sync(request):
+    """Synchro différentielle : ``?since=<jeton>`` ; 304 si rien n'a changé (If-None-Match)."""
+    from .sync import changes_since
+    delta    = changes_since(request.user, request.GET.get('since'))
+    response = JsonResponse({
+        'changes':  [dict(_tx_payload(t), updated_at=t.updated_at.isoformat()) for t in delta['changed']],
+        'deleted':  delta['deleted'],
+        'since':    delta['since'],
+        'has_more': delta['has_more'],
+        'full':     delta['full'],
+    })
+    etag = '"{}"'.format(hashlib.md5(response.content).hexdigest())
+    if etag in [t.strip() for t in request.headers.get('If-None-Match', '').split(',')]:
+        response = HttpResponseNotModified()
+    response['ETag']          = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+class _Echo:
+    """Pseudo-fichier : ``csv.writer`` renvoie la ligne formatée au lieu de l'écrire."""
+    def write(self, value):
+        return value
+
+
+def _csv_stream(rows, categories, batch=500):
+    writer  = csv.writer(_Echo(), delimiter=';')
+    types   = dict(Transaction.TYPE_CHOICES)
+    sources = dict(Transaction.SOURCE_CHOICES)
+    yield '\ufeff' + writer.writerow(
+        ['Date', 'Type', 'Montant (FCFA)', 'Description', 'Catégorie', 'Source', 'Notes'])
+    lines = []
+    for d, type_, amount, description, category_id, source, notes in rows:
+        lines.append(writer.writerow([
+            d.strftime('%d/%m/%Y'),
+            types.get(type_, type_),
+            int(amount),
+            description,
+            categories.get(category_id, 'Divers'),
+            sources.get(source, source),
+            notes,
+        ]))
+        if len(lines) >= batch:
+            yield ''.join(lines)
+            lines = []
+    if lines:
+        yield ''.join(lines)
 
 
 @login_required
 def export_csv(request):
+    """Export CSV en flux : mémoire constante quel que soit le volume du journal."""
     date_from = request.GET.get('date_from', '')
     date_to   = request.GET.get('date_to',   '')
-    qs = Transaction.objects.filter(user=request.user).select_related('category').order_by('-date')
+    qs = Transaction.objects.filter(user=request.user).order_by('-date', '-created_at', '-id')
     if date_from:
         try:
             qs = qs.filter(date__gte=date.fromisoformat(date_from))
@@ -226,30 +400,42 @@ def export_csv(request):
         except ValueError:
             pass
 
-    response = HttpResponse(content_type='text/csv; charset=utf-8')
+    categories = dict(Category.objects.values_list('id', 'name'))
+    rows = (qs.values_list('date', 'type', 'amount', 'description', 'category_id', 'source', 'notes')
+              .iterator(chunk_size=2000))
+    response = StreamingHttpResponse(_csv_stream(rows, categories), content_type='text/csv; charset=utf-8')
     response['Content-Disposition'] = 'attachment; filename="finai_transactions.csv"'
-    response.write('\ufeff')
-    writer = csv.writer(response, delimiter=';')
-    writer.writerow(['Date', 'Type', 'Montant (FCFA)', 'Description', 'Catégorie', 'Source', 'Notes'])
-    for tx in qs:
-        writer.writerow([
-            tx.date.strftime('%d/%m/%Y'),
-            tx.get_type_display(),
-            int(tx.amount),
-            tx.description,
-            tx.category.name if tx.category else 'Divers',
-            tx.get_source_display(),
-            tx.notes,
-        ])
     return response
 
 
+@login_required
+@require_POST
+def import_transactions(request):
+    """Import d'un fichier CSV (format de l'export) ou d'un relevé OFX."""
+    from .importers import import_file
+    upload = request.FILES.get('fichier')
+    if not upload:
+        if _is_ajax(request):
+            return JsonResponse({'success': False, 'error': 'Aucun fichier reçu.'}, status=400)
+        messages.error(request, 'Aucun fichier reçu.')
+        return redirect('transactions:journal')
+
+    report = import_file(request.user, upload, name=upload.name)
+    if _is_ajax(request):
+        return JsonResponse({'success': True, **report.as_dict()})
+    if report.created:
+        messages.success(request, f'✅ {report.created} transaction(s) importée(s).')
+    if report.rejected:
+        detail = ' · '.join(f'ligne {line} : {msg}' for line, msg in report.errors[:3])
+        messages.warning(request, f'{report.rejected} ligne(s) ignorée(s) — {detail}')
+    return redirect('transactions:journal')
+
+
 # ── Limites budgétaires ────────────────────────────────────────────────────────
 
 @login_required
 def budgets(request):
-    limits = BudgetLimit.objects.filter(user=request.user).select_related('category')
-    form   = BudgetLimitForm()
+    form = BudgetLimitForm()
     if request.method == 'POST':
         form = BudgetLimitForm(request.POST)
         if form.is_valid():
@@ -263,22 +449,14 @@ def budgets(request):
                 limit.save()
             messages.success(request, 'Limite enregistrée.')
             return redirect('transactions:budgets')
-    from .services import get_expense_by_category
-    spent_map = {
-        r['category__slug']: int(r['total'])
-        for r in get_expense_by_category(request.user)
-    }
-    budget_rows = []
-    for lim in limits:
-        spent = spent_map.get(lim.category.slug, 0)
-        pct   = int(spent / lim.amount * 100) if lim.amount > 0 else 0
-        budget_rows.append({
-            'limit': lim,
-            'spent': spent,
-            'pct':   min(pct, 100),
-            'over':  pct >= 100,
-            'warn':  80 <= pct < 100,
-        })
+    from .services import get_budget_consumption
+    budget_rows = [{
+        'limit': row['limit'],
+        'spent': row['spent'],
+        'pct':   min(row['pct'], 100),
+        'over':  row['pct'] >= 100,
+        'warn':  80 <= row['pct'] < 100,
+    } for row in get_budget_consumption(request.user)]
     template = 'transactions/budgets_pwa.html' if _is_mobile(request) else 'transactions/budgets.html'
     return render(request, template, {
         'budget_rows': budget_rows,
@@ -300,30 +478,41 @@ def delete_budget(request, pk):
 
 @login_required
 def patrimoine(request):
-    from .services import get_patrimoine_summary
-    from django.db.models import Sum as DSum
-
-    entries = PatrimoineEntry.objects.filter(user=request.user).order_by('-date')
-    summary = get_patrimoine_summary(request.user)
+    from .services import get_patrimoine_breakdown
+    from .networth import history
 
-    actifs  = entries.filter(ptype='actif')
-    passifs = entries.filter(ptype='passif')
-
-    cat_actifs  = list(actifs.values('category').annotate(total=DSum('valeur')).order_by('-total'))
-    cat_passifs = list(passifs.values('category').annotate(total=DSum('valeur')).order_by('-total'))
+    # Chiffres : une requête groupée ; listes : une lecture des entrées, réparties en mémoire
+    summary = get_patrimoine_breakdown(request.user)
+    entries = list(PatrimoineEntry.objects.filter(user=request.user).order_by('-date'))
+    actifs  = [e for e in entries if e.is_actif]
+    passifs = [e for e in entries if not e.is_actif]
+    trend   = history(request.user, months=120)
 
     template = 'transactions/patrimoine_pwa.html' if _is_mobile(request) else 'transactions/patrimoine.html'
     return render(request, template, {
         'summary':    summary,
         'actifs':     actifs,
         'passifs':    passifs,
-        'cat_labels': json.dumps([e['category'] for e in cat_actifs] or ['Aucun']),
-        'cat_totals': json.dumps([int(e['total']) for e in cat_actifs] or [0]),
-        'pas_labels': json.dumps([e['category'] for e in cat_passifs] or ['Aucun']),
-        'pas_totals': json.dumps([int(e['total']) for e in cat_passifs] or [0]),
+        'cat_labels': json.dumps([c['label'] for c in summary['cat_actifs']] or ['Aucun']),
+        'cat_totals': json.dumps([int(c['total']) for c in summary['cat_actifs']] or [0]),
+        'pas_labels': json.dumps([c['label'] for c in summary['cat_passifs']] or ['Aucun']),
+        'pas_totals': json.dumps([int(c['total']) for c in summary['cat_passifs']] or [0]),
+        'nw_labels':  json.dumps([f"{p['month']:%m/%Y}" for p in trend]),
+        'nw_values':  json.dumps([p['net'] for p in trend]),
     })
 
 
+@login_required
+def api_networth(request):
+    """Évolution mensuelle du patrimoine net (instantanés) : ``?mois=24``."""
+    from .networth import history
+    try:
+        months = max(1, min(int(request.GET.get('mois', 120)), 600))
+    except ValueError:
+        months = 120
+    return JsonResponse({'history': [{**p, 'month': p['month'].isoformat()} for p in history(request.user, months)]})
+
+
 @login_required
 @require_POST
 def add_patrimoine(request):
@@ -421,8 +610,10 @@ def manage_categories(request):
 
     categories = Category.objects.all().order_by('name')
     template = 'transactions/categories_pwa.html' if _is_mobile(request) else 'transactions/categories.html'
+    rules = CategoryRule.objects.filter(user=request.user).select_related('category')
     return render(request, template, {
         'categories': categories,
+        'rules':      rules,
         'icons':      CATEGORY_ICONS,
         'colors':     CATEGORY_COLORS,
     })
@@ -437,6 +628,45 @@ def delete_category(request, pk):
     return redirect('transactions:categories')
 
 
+@login_required
+@require_POST
+def add_rule(request):
+    pattern  = request.POST.get('pattern', '').strip()
+    category = Category.objects.filter(pk=request.POST.get('category') or None).first()
+    try:
+        priority = int(request.POST.get('priority') or 100)
+    except ValueError:
+        priority = 100
+    priority = min(max(priority, 0), 32767)      # PositiveSmallIntegerField
+    if not pattern or category is None:
+        messages.error(request, 'Le mot-clé et la catégorie sont requis.')
+    else:
+        _, created = CategoryRule.objects.update_or_create(
+            user=request.user, pattern=pattern[:100],
+            defaults={'category': category, 'priority': priority},
+        )
+        messages.success(request, f'Règle « {pattern} » → {category.name} {"créée" if created else "mise à jour"}.')
+    return redirect('transactions:categories')
+
+
+@login_required
+@require_POST
+def delete_rule(request, pk):
+    rule = get_object_or_404(CategoryRule, pk=pk, user=request.user)
+    rule.delete()
+    messages.success(request, 'Règle supprimée.')
+    return redirect('transactions:categories')
+
+
+@login_required
+@require_POST
+def apply_rules(request):
+    from .rules import apply_to_history
+    count = apply_to_history(request.user, only_uncategorized=bool(request.POST.get('only_uncategorized')))
+    messages.success(request, f'{count} transaction(s) recatégorisée(s).')
+    return redirect('transactions:categories')
+
+
 # ── Push Notifications API ─────────────────────────────────────────────────────
 
 @login_required
@@ -0,0 +1,14 @@
+import os
+from pathlib import Path
+from dotenv import load_dotenv
+from django.core.asgi import get_asgi_application
+
+# Charger le .env depuis la racine du projet
+load_dotenv(Path(__file__).resolve().parent.parent / '.env')
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'finai.settings.production')
+
+# Déploiement optionnel (la production O2switch reste en WSGI via Passenger) : les vues du
+# conseiller IA asynchrones n'immobilisent plus un worker pendant un appel lent à l'API.
+# gunicorn finai.asgi:application -k uvicorn.workers.UvicornWorker
+application = get_asgi_application()
@@ -27,6 +27,7 @@ INSTALLED_APPS = [
     'apps.dashboard',
     'apps.transactions',
     'apps.ai_advisor',
+    'apps.jobs',
 ]
 
 MIDDLEWARE = [
@@ -36,12 +37,14 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'apps.transactions.memo.RequestMemoMiddleware',             # services mémoïsés par requête
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
 ROOT_URLCONF      = 'finai.urls'
 WSGI_APPLICATION  = 'finai.wsgi.application'
+ASGI_APPLICATION  = 'finai.asgi.application'
 
 TEMPLATES = [{
     'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -66,6 +69,22 @@ DATABASES = {
     }
 }
 
+# ── Cache ─────────────────────────────────────────────────────────────────────
+# LocMem en développement ; Redis en production (voir production.py)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'finai',
+    }
+}
+# Stats par utilisateur mises en cache, invalidées par version du journal
+FINAI_STATS_CACHE         = True
+FINAI_STATS_CACHE_TIMEOUT = 60 * 60 * 24  # borne mémoire, pas de fraîcheur
+
+# ── Synchronisation PWA (api/sync/) ───────────────────────────────────────────
+SYNC_PAGE_SIZE      = 500
+SYNC_SETTLE_SECONDS = 5   # marge pour les écritures validées après leur horodatage
+
 # ── Auth ──────────────────────────────────────────────────────────────────────
 AUTH_USER_MODEL      = 'accounts.User'
 LOGIN_URL            = '/auth/connexion/'
@@ -101,6 +120,23 @@ ANTHROPIC_API_KEY = os.getenv('ANTHROPIC_API_KEY', '')
 # claude-haiku-4-5-20251001 : le moins cher, ~160 FCFA / 1000 transactions
 AI_MODEL      = 'claude-haiku-4-5-20251001'
 AI_MAX_TOKENS = 1024
+# Réponses IA resservies tant que le contexte (stats, score, fuites, profil) ne change pas (ai_cache.py) :
+# fraîches pendant max_age, puis servies pendant « stale » secondes le temps d'être recalculées
+AI_CACHE = {
+    'predictions':   {'max_age': 6 * 3600,      'stale': 42 * 3600},
+    'weekly_report': {'max_age': 7 * 24 * 3600, 'stale': 0},
+}
+# Au-delà de ce score, l'analyse regex d'un SMS suffit : pas d'appel IA
+SMS_AI_MIN_CONFIDENCE = 0.8
+# Catégorisation locale (classifier.py) : probabilité minimale pour proposer une catégorie
+CLASSIFIER_MIN_CONFIDENCE = 0.6
+
+# ── Webhook SMS (applications de transfert Android) ───────────────────────────
+SMS_WEBHOOK_MAX_BATCH       = 200   # messages par requête
+SMS_WEBHOOK_RATE_PER_MINUTE = 60    # requêtes par appareil
+SMS_WEBHOOK_RETRY_AFTER     = 30    # secondes, quand la file est pleine
+SMS_WEBHOOK_MAX_SKEW        = 300   # tolérance d'horloge des signatures HMAC
+SMS_INBOX_MAX_PENDING       = 2000  # messages en attente par utilisateur
 
 # ── Web Push Notifications (VAPID) ────────────────────────────────────────────
 # Générez vos clés avec : python manage.py generate_vapid_keys
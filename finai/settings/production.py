@@ -120,10 +120,15 @@ LOGGING = {
 }
 
 # ── Cache ─────────────────────────────────────────────────────────────────────
-# Décommentez si Redis est disponible :
-# CACHES = {
-#     'default': {
-#         'BACKEND': 'django.core.cache.backends.redis.RedisCache',
-#         'LOCATION': os.getenv('REDIS_URL', 'redis://127.0.0.1:6379/1'),
-#     }
-# }
+# Activé si REDIS_URL est défini (ex. redis://127.0.0.1:6379/1)
+REDIS_URL = os.getenv('REDIS_URL', '')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+# Sans Redis, chaque worker a son propre LocMem et ne voit pas les versions de
+# journal incrémentées par les autres : le cache des stats est alors désactivé.
+FINAI_STATS_CACHE = bool(REDIS_URL)